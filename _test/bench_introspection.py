@@ -0,0 +1,110 @@
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine
+
+import utils.alchemy_db_client as db_client
+from utils.engine_registry import MAX_OVERFLOW, POOL_SIZE
+
+# name -> (schemas, tables per schema, columns per table)
+LAYOUTS = {
+    'single': (1, 2000, 20),
+    'few': (4, 500, 20),
+    'many': (40, 50, 20),
+    'sprawling': (400, 5, 20),
+}
+WORKER_COUNTS = (1, 2, 4, 8)
+ROUNDS = 3
+# Simulated catalog cost: one network round trip per query plus server time per column row
+ROUND_TRIP_MS = 2.0
+COLUMN_ROW_US = 5.0
+
+
+class SimulatedCatalog:
+    """
+    Stand-in for a multi-schema PostgreSQL/Hologres catalog. The unit split and the worker
+    pool run unchanged against a real pooled SQLite engine sized like the engine registry,
+    while the catalog queries themselves sleep for a round trip plus a per-row cost, the way
+    a remote catalog keeps a connection waiting.
+    """
+
+    def __init__(self, directory: str, schemas: int, tables: int, columns: int, failing_schema: str | None = None):
+        self.counts = {f"schema_{s:03d}": tables for s in range(schemas)}
+        self.columns = columns
+        self.failing_schema = failing_schema
+        self.engine = create_engine(
+            f"sqlite:///{Path(directory) / 'catalog.db'}", pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW
+        )
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql("DROP TABLE IF EXISTS schema_counts")
+            conn.exec_driver_sql("CREATE TABLE schema_counts (schema_name TEXT, table_count INT)")
+            conn.exec_driver_sql("INSERT INTO schema_counts VALUES (?, ?)", list(self.counts.items()))
+        db_client.PG_SCHEMAS_SQL = "SELECT schema_name, table_count FROM schema_counts ORDER BY table_count DESC, schema_name"
+        db_client._fetch_schema_bulk = self.fetch_bulk
+
+    def fetch_bulk(self, conn, db_type, database='', tables=None, schemas=None):
+        selected = schemas if schemas is not None else list(self.counts)
+        if self.failing_schema in selected:
+            raise db_client.SQLAlchemyError(f"permission denied for schema {self.failing_schema}")
+        schema = {
+            f"{name}.t{t:04d}": {'comment': '', 'columns': [
+                {'name': f"c{c}", 'comment': '', 'type': 'BIGINT'} for c in range(self.columns)
+            ]}
+            for name in sorted(selected) for t in range(self.counts[name])
+        }
+        # Tables, columns and references queries
+        time.sleep((3 * ROUND_TRIP_MS + len(schema) * self.columns * COLUMN_ROW_US / 1000) / 1000)
+        return schema
+
+
+def run(catalog: SimulatedCatalog, workers: int, chunk_tables: int) -> tuple[float, dict]:
+    best, schema = float('inf'), {}
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        schema = db_client._fetch_schema_parallel(catalog.engine, 'hologres', max_workers=workers, chunk_tables=chunk_tables)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, schema
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Scaling of parallel schema introspection with schema count")
+    parser.add_argument('--chunk-tables', type=int, default=db_client.INTROSPECTION_CHUNK_TABLES,
+                        help="tables per unit of work")
+    args = parser.parse_args()
+    original_fetch, original_sql = db_client._fetch_schema_bulk, db_client.PG_SCHEMAS_SQL
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'layout':<10} {'schemas':>7} {'tables':>7} " + ' '.join(f"{f'w={w} ms':>10}" for w in WORKER_COUNTS)
+              + f" {'speedup':>8}")
+        try:
+            for name, (schemas, tables, columns) in LAYOUTS.items():
+                catalog = SimulatedCatalog(directory, schemas, tables, columns)
+                timings, reference = [], None
+                for workers in WORKER_COUNTS:
+                    ms, schema = run(catalog, workers, args.chunk_tables)
+                    if reference is None:
+                        reference = schema
+                    elif list(schema) != list(reference):
+                        raise AssertionError(f"{name}: w={workers} read a different schema than w=1")
+                    timings.append(ms)
+                print(f"{name:<10} {schemas:>7} {schemas * tables:>7} " + ' '.join(f"{ms:>10.1f}" for ms in timings)
+                      + f" {timings[0] / min(timings):>7.1f}x")
+                catalog.engine.dispose()
+
+            # Warn and continue: one unreadable schema drops only its own tables
+            catalog = SimulatedCatalog(directory, 40, 50, 20, failing_schema='schema_007')
+            schema = db_client._fetch_schema_parallel(catalog.engine, 'hologres', max_workers=4, chunk_tables=50)
+            missing = 40 * 50 - len(schema)
+            print(f"partial failure: {len(schema)} tables read, {missing} skipped")
+            catalog.engine.dispose()
+        finally:
+            db_client._fetch_schema_bulk, db_client.PG_SCHEMAS_SQL = original_fetch, original_sql
+
+
+if __name__ == '__main__':
+    main()
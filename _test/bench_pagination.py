@@ -0,0 +1,67 @@
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, text
+
+from utils.pagination import build_page_sql
+
+SQL = 'SELECT id, user_id, amount, channel FROM fact_orders WHERE amount >= 0'
+KEY = [('id', False)]
+ROUNDS = 3
+
+
+def load(path: str, rows: int) -> None:
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE fact_orders (id INTEGER PRIMARY KEY, user_id INT, amount REAL, channel TEXT)")
+    con.executemany("INSERT INTO fact_orders VALUES (?, ?, ?, ?)", (
+        (i, i % 9973, (i % 100000) / 100, f"channel_{i % 13}") for i in range(rows)
+    ))
+    con.commit()
+    con.close()
+
+
+def best_ms(func) -> float:
+    best = float('inf')
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cost of page N with keyset predicates versus OFFSET")
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--page-size', type=int, default=1000)
+    args = parser.parse_args()
+    pages = [page for page in (1, 10, 100, 500, 1000) if (page - 1) * args.page_size < args.rows]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = str(Path(directory) / 'pages.db')
+        load(path, args.rows)
+        engine = create_engine(f'sqlite:///{path}')
+        with engine.connect() as conn:
+            print(f"{'page':>6} {'keyset ms':>10} {'offset ms':>10}")
+            for page in pages:
+                # Key value of the last row of the previous page, as carried by the page token
+                after = [(page - 1) * args.page_size - 1] if page > 1 else None
+                keyset_sql, params = build_page_sql(SQL, 'postgresql', KEY, args.page_size, after)
+                offset_sql = f"{SQL} ORDER BY id LIMIT {args.page_size} OFFSET {(page - 1) * args.page_size}"
+                keyset = conn.execute(text(keyset_sql), params).fetchall()
+                offset = conn.execute(text(offset_sql)).fetchall()
+                if [row[0] for row in keyset[:args.page_size]] != [row[0] for row in offset]:
+                    raise AssertionError(f"page {page}: keyset and OFFSET pages differ")
+                keyset_ms = best_ms(lambda: conn.execute(text(keyset_sql), params).fetchall())
+                offset_ms = best_ms(lambda: conn.execute(text(offset_sql)).fetchall())
+                print(f"{page:>6} {keyset_ms:>10.2f} {offset_ms:>10.2f}")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.result_encoders import ArrowEncoder, CsvEncoder, JsonEncoder, encode_batches
+
+BATCH_SIZE = 1000
+
+
+def make_batches(rows: int) -> tuple[list[str], list[list[tuple]]]:
+    """Synthetic fact-table rows: ids, amounts, timestamps and a short label"""
+    keys = ['order_id', 'user_id', 'amount', 'discount', 'created_at', 'channel']
+    start = datetime(2025, 1, 1)
+    data = [
+        (i, i % 9973, Decimal(f"{i % 100000}.{i % 100:02d}"), (i % 7) / 10,
+         start + timedelta(seconds=i), f"channel_{i % 13}")
+        for i in range(rows)
+    ]
+    return keys, [data[i:i + BATCH_SIZE] for i in range(0, rows, BATCH_SIZE)]
+
+
+def json_path(keys: list[str], batches: list[list[tuple]]) -> bytes:
+    """Mirror of the former text/json result path: one dict per row and a per-cell default callback"""
+    def serializer(obj):
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        if isinstance(obj, Decimal):
+            return float(obj)
+        raise TypeError(f"Unserializable type {type(obj)}")
+
+    rows = [dict(zip(keys, row)) for batch in batches for row in batch]
+    return json.dumps(rows, ensure_ascii=False, default=serializer).encode('utf-8')
+
+
+def bench(name: str, func, *args) -> None:
+    started = time.perf_counter()
+    payload = func(*args)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"{name:<10} {elapsed:>10.1f} ms {len(payload) / 1024:>12.1f} KiB")
+
+
+if __name__ == "__main__":
+    for rows in (1000, 100000):
+        keys, batches = make_batches(rows)
+        print(f"{rows} rows")
+        bench('json (old)', json_path, keys, batches)
+        bench('json', lambda: encode_batches(JsonEncoder(keys), batches))
+        bench('json rows', lambda: encode_batches(JsonEncoder(keys, 'rows', 'string'), batches))
+        bench('csv', lambda: encode_batches(CsvEncoder(keys), batches))
+        bench('arrow', lambda: encode_batches(ArrowEncoder(keys, 'arrow'), batches))
+        bench('parquet', lambda: encode_batches(ArrowEncoder(keys, 'parquet'), batches))
+        print('=' * 40)
@@ -0,0 +1,82 @@
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, text
+
+from utils.alchemy_db_client import QueryResult
+from utils.result_encoders import CsvEncoder, JsonEncoder, encode_batches
+
+# name -> (rows, columns)
+SHAPES = {
+    'tall': (200000, 8),
+    'wide': (10000, 120),
+}
+
+
+def load(path: str, rows: int, columns: int) -> None:
+    con = sqlite3.connect(path)
+    con.execute("DROP TABLE IF EXISTS result_rows")
+    con.execute(f"CREATE TABLE result_rows ({', '.join(f'c{c} INT' if c % 2 else f'c{c} TEXT' for c in range(columns))})")
+    con.executemany(f"INSERT INTO result_rows VALUES ({', '.join('?' * columns)})", (
+        tuple(r * columns + c if c % 2 else f"v{r % 1000}" for c in range(columns)) for r in range(rows)
+    ))
+    con.commit()
+    con.close()
+
+
+def measure(build) -> tuple[float, float, object]:
+    """Peak traced MB and seconds of building a result, plus the result itself"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024, elapsed, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Memory and formatting cost of row dicts versus QueryResult tuples")
+    parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'shape':<6} {'layout':<12} {'peak MB':>8} {'fetch s':>8} {'json s':>7} {'csv s':>7}")
+        for name, (rows, columns) in SHAPES.items():
+            path = str(Path(directory) / f'{name}.db')
+            load(path, rows, columns)
+            engine = create_engine(f'sqlite:///{path}')
+            with engine.connect() as conn:
+                # What execute_sql returned before: a dict per row, read back through values() by the formatters
+                peak, fetch_s, dicts = measure(lambda: [
+                    dict(zip(result.keys(), row)) for result in [conn.execute(text("SELECT * FROM result_rows"))] for row in result
+                ])
+                keys = list(dicts[0].keys())
+                started = time.perf_counter()
+                encode_batches(JsonEncoder(keys), [[tuple(row.values()) for row in dicts]])
+                json_s = time.perf_counter() - started
+                started = time.perf_counter()
+                encode_batches(CsvEncoder(keys), [[tuple(row.values()) for row in dicts]])
+                csv_s = time.perf_counter() - started
+                print(f"{name:<6} {'row dicts':<12} {peak:>8.1f} {fetch_s:>8.2f} {json_s:>7.2f} {csv_s:>7.2f}")
+                del dicts
+
+                peak, fetch_s, result = measure(lambda: QueryResult.fetch(conn.execute(text("SELECT * FROM result_rows"))))
+                started = time.perf_counter()
+                encode_batches(JsonEncoder(result.keys), result.batches())
+                json_s = time.perf_counter() - started
+                started = time.perf_counter()
+                encode_batches(CsvEncoder(result.keys), result.batches())
+                csv_s = time.perf_counter() - started
+                print(f"{name:<6} {'QueryResult':<12} {peak:>8.1f} {fetch_s:>8.2f} {json_s:>7.2f} {csv_s:>7.2f}")
+            engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.sql_analyzer import analyze_sql
+
+ROUNDS = 200
+
+
+def make_sql(columns: int, joins: int, in_list: int) -> str:
+    """Shape of a long LLM-written report query: wide CASE projections, many joins and a literal list"""
+    projections = ',\n  '.join(
+        f"CASE WHEN t0.c{i} > {i} THEN 'high -- {i};' ELSE 'low' END AS \"指标_{i}\"" for i in range(columns)
+    )
+    join_clauses = '\n'.join(
+        f"LEFT JOIN public.dim_{i} d{i} ON d{i}.id = t0.dim_{i}_id /* join {i} */" for i in range(joins)
+    )
+    values = ', '.join(str(i) for i in range(in_list))
+    return (
+        f"WITH recent AS (SELECT * FROM public.fact_orders WHERE ds >= '2025-01-01')\n"
+        f"SELECT\n  {projections}\nFROM recent t0\n{join_clauses}\n"
+        f"WHERE t0.status IN ({values}) AND t0.note NOT LIKE '%drop table%'\n"
+        f"ORDER BY 1 LIMIT 100;"
+    )
+
+
+def legacy_risk_check(sql: str) -> bool:
+    """The regex check the tokenizer replaced, kept here as the baseline"""
+    risk_keywords = {"DROP", "DELETE", "TRUNCATE", "ALTER", "UPDATE", "INSERT"}
+    sql = re.sub(r'/\*.*?\*/', '', sql, flags=re.DOTALL)
+    sql = re.sub(r'--.*', '', sql)
+    for stmt in re.split(r';\s*', sql):
+        stmt = stmt.strip()
+        if not stmt:
+            continue
+        match = re.match(r'\s*([^\s]+)', stmt, re.IGNORECASE)
+        if match and match.group(1).upper() in risk_keywords:
+            return True
+    return False
+
+
+def bench(name: str, func, sql: str) -> None:
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        func(sql)
+    elapsed = (time.perf_counter() - started) / ROUNDS * 1e6
+    print(f"{name:<16} {elapsed:>10.1f} us {elapsed / (len(sql) / 1024):>10.1f} us/KiB")
+
+
+if __name__ == "__main__":
+    uncached = analyze_sql.__wrapped__
+    for columns, joins, in_list in ((5, 2, 10), (40, 10, 200), (200, 30, 2000)):
+        sql = make_sql(columns, joins, in_list)
+        analysis = uncached(sql, 'hologres')
+        print(f"{len(sql) / 1024:.1f} KiB, {len(analysis.tables)} tables, read_only={analysis.read_only}")
+        bench('legacy regex', legacy_risk_check, sql)
+        bench('analyze_sql', lambda text: uncached(text, 'hologres'), sql)
+        bench('analyze (cached)', lambda text: analyze_sql(text, 'hologres'), sql)
+        print('=' * 40)
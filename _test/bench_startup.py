@@ -0,0 +1,118 @@
+import argparse
+import json
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+# What loading the tools imports; the tool modules themselves also need a working dify_plugin
+STARTUP_MODULES = [
+    'utils.alchemy_db_client', 'utils.deadline', 'utils.tracing', 'utils.query_guard', 'utils.result_cache',
+    'utils.pagination', 'utils.result_encoders', 'utils.sql_analyzer', 'utils.prompt_loader', 'utils.schema_retriever',
+    'utils.sql_cache', 'utils.sql_stream', 'utils.warmup',
+]
+TOOL_MODULES = ['tools.hologres_excute_sql', 'tools.hologres_text2data', 'tools.hologres_text2result']
+_IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+# Runs in a fresh interpreter: time the one-off work of the first tool calls, optionally after warm_up()
+FIRST_CALL_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+{imports}
+timings = {{}}
+if {warm}:
+    from utils.warmup import warm_up
+    timings['warm_up'] = warm_up({db_types!r})['duration_ms']
+
+def timed(name, func):
+    for attempt in ('first', 'second'):
+        started = time.perf_counter()
+        func()
+        timings[f'{{name}}_{{attempt}}'] = round((time.perf_counter() - started) * 1000, 2)
+
+from utils.prompt_loader import get_prompt_loader
+from utils.warmup import preload_dialect
+from sqlalchemy import create_engine
+context = {{'meta_data': 'T:orders(id:i, amount:f)', 'query': 'total amount', 'db_type': 'hologres'}}
+timed('prompt', lambda: get_prompt_loader().get_prompt('hologres', dict(context)))
+for db_type in {db_types!r}:
+    try:
+        timed(f'dialect_{{db_type}}', lambda: preload_dialect(db_type))
+    except ImportError as e:
+        print(f"Warning: {{db_type}} driver missing: {{e}}", file=sys.stderr)
+timed('engine', lambda: create_engine('sqlite://').connect().close())
+print(json.dumps(timings))
+"""
+
+
+def import_report(modules: list[str]) -> tuple[float, list[tuple[str, float, float]]]:
+    """Run python -X importtime on modules, return total ms and (module, self ms, cumulative ms) per import"""
+    code = f"import sys; sys.path.insert(0, {str(ROOT)!r}); " + '; '.join(f"import {module}" for module in modules)
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+    entries = []
+    total = 0.0
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        entries.append((name, int(self_us) / 1000, int(cumulative_us) / 1000))
+        if not indent:
+            total += int(cumulative_us) / 1000
+    return total, entries
+
+
+def first_calls(modules: list[str], db_types: list[str], warm: bool) -> dict[str, float]:
+    script = FIRST_CALL_SCRIPT.format(
+        root=str(ROOT), imports='\n'.join(f"import {module}" for module in modules), warm=warm, db_types=db_types
+    )
+    completed = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip())
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Plugin import time and first-call latency, cold and warmed up")
+    parser.add_argument('--top', type=int, default=15, help="heaviest imports to list")
+    parser.add_argument('--db-types', default='hologres,mysql', help="dialects whose first load is timed")
+    args = parser.parse_args()
+    db_types = [db_type for db_type in args.db_types.split(',') if db_type]
+
+    modules = STARTUP_MODULES
+    try:
+        import_report(TOOL_MODULES)
+        modules = STARTUP_MODULES + TOOL_MODULES
+    except RuntimeError as e:
+        print(f"Warning: tool modules not importable, reporting utils only: {e}")
+
+    total, entries = import_report(modules)
+    by_package: dict[str, float] = {}
+    for name, self_ms, _ in entries:
+        by_package[name.split('.')[0]] = by_package.get(name.split('.')[0], 0.0) + self_ms
+    print(f"startup imports: {total:.1f} ms")
+    print(f"{'package':<28} {'self ms':>9}")
+    for package, ms in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<28} {ms:>9.1f}")
+    print(f"\n{'module':<48} {'self ms':>9} {'cumul ms':>9}")
+    for name, self_ms, cumulative_ms in sorted(entries, key=lambda entry: -entry[1])[:args.top]:
+        print(f"{name:<48} {self_ms:>9.1f} {cumulative_ms:>9.1f}")
+    lazy = [name for name in ('jinja2', 'asyncio', 'pyarrow', 'psycopg2', 'pymysql', 'pymssql') if name not in by_package]
+    print(f"\nnot loaded at startup: {', '.join(lazy) or '-'}")
+
+    cold = first_calls(modules, db_types, warm=False)
+    warmed = first_calls(modules, db_types, warm=True)
+    print(f"\n{'first call':<28} {'cold ms':>9} {'warmed ms':>10}")
+    for name in cold:
+        if name.endswith('_first'):
+            print(f"{name[:-len('_first')]:<28} {cold[name]:>9.2f} {warmed.get(name, 0.0):>10.2f}")
+    if 'warm_up' in warmed:
+        print(f"{'(warm-up, in background)':<28} {'':>9} {warmed['warm_up']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
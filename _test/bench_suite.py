@@ -0,0 +1,298 @@
+import argparse
+import json
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, event
+
+import utils.alchemy_db_client as db_client
+from utils.alchemy_db_client import execute_sql_stream, fit_schema_dsl, format_schema_dsl, get_db_schema
+from utils.prompt_loader import PromptLoader
+from utils.result_encoders import CsvEncoder, HtmlEncoder, JsonEncoder, encode_batches
+from utils.schema_cache import schema_cache
+from utils.schema_retriever import DEFAULT_TOKEN_BUDGET, estimate_tokens, prune_schema
+
+try:
+    from tools.hologres_text2data import HologresText2dataTool
+except Exception as e:
+    # The end to end stage needs a working dify_plugin installation
+    print(f"Warning: text2data benchmark skipped: {e}")
+    HologresText2dataTool = None
+
+# name -> (tables, columns per table, comment length)
+QUICK_SCHEMAS = {
+    'small': (10, 12, 20),
+    'medium': (1000, 20, 40),
+    'wide': (100, 300, 40),
+    'long_comments': (1000, 20, 400),
+}
+FULL_SCHEMAS = {**QUICK_SCHEMAS, 'large': (10000, 20, 40), 'huge': (50000, 15, 40)}
+QUICK_ROWS = (1000, 100000)
+FULL_ROWS = (1000, 100000, 1000000)
+ROUNDS = 5
+BATCH_SIZE = 1000
+QUESTION = 'total order amount by channel for customers registered last month'
+BASELINE = Path(__file__).parent / 'bench_baseline.json'
+# A measurement regresses when it exceeds the baseline by more than the fraction plus the
+# absolute slack, which keeps sub-millisecond timings from flapping: metric -> (fraction, slack)
+TOLERANCES = {'ms': (0.5, 2.0), 'peak_mib': (0.25, 0.5), 'tokens': (0.05, 0)}
+
+COLUMN_TYPES = ['BIGINT', 'VARCHAR(64)', 'DECIMAL(18,2)', 'DATETIME', 'INT', 'TEXT', 'TINYINT(1)']
+WORDS = ['order', 'customer', 'amount', 'channel', 'region', 'status', 'created', 'product', 'store', 'refund']
+
+
+class StandInDatabase:
+    """
+    SQLite files standing in for a MySQL server: an attached information_schema database
+    answers the MySQL catalog queries, CRC32/CONCAT are registered as SQL functions so the
+    schema-change probe runs too, and the main database holds result tables.
+    """
+
+    def __init__(self, directory: str):
+        self.main_path = str(Path(directory) / 'main.db')
+        self.catalog_path = str(Path(directory) / 'information_schema.db')
+        self.engine = create_engine(f'sqlite:///{self.main_path}')
+        event.listen(self.engine, 'connect', self._on_connect)
+        # Every connection get_db_schema and execute_sql_stream open goes to the stand-in
+        db_client._get_engine = lambda *args, **kwargs: self.engine
+
+    def _on_connect(self, dbapi_connection, _record) -> None:
+        dbapi_connection.execute("ATTACH DATABASE ? AS information_schema", (self.catalog_path,))
+        dbapi_connection.create_function('CRC32', 1, lambda value: zlib.crc32(str(value).encode('utf-8')))
+        dbapi_connection.create_function('CONCAT', -1, lambda *values: ''.join(str(v) for v in values if v is not None))
+        dbapi_connection.create_function(
+            'CONCAT_WS', -1, lambda sep, *values: sep.join(str(v) for v in values if v is not None)
+        )
+
+    def load_catalog(self, tables: int, columns: int, comment_length: int, seed: int = 0) -> None:
+        rng = random.Random(seed)
+        con = sqlite3.connect(self.catalog_path)
+        con.executescript("""
+            DROP TABLE IF EXISTS TABLES; DROP TABLE IF EXISTS COLUMNS; DROP TABLE IF EXISTS KEY_COLUMN_USAGE;
+            CREATE TABLE TABLES (TABLE_SCHEMA TEXT, TABLE_NAME TEXT, TABLE_TYPE TEXT, TABLE_COMMENT TEXT);
+            CREATE TABLE COLUMNS (TABLE_SCHEMA TEXT, TABLE_NAME TEXT, COLUMN_NAME TEXT, ORDINAL_POSITION INT,
+                COLUMN_TYPE TEXT, COLUMN_COMMENT TEXT);
+            CREATE TABLE KEY_COLUMN_USAGE (TABLE_SCHEMA TEXT, TABLE_NAME TEXT, REFERENCED_TABLE_NAME TEXT);
+        """)
+
+        def comment() -> str:
+            text = ' '.join(rng.choice(WORDS) for _ in range(comment_length // 7 + 1))
+            return text[:comment_length]
+
+        table_rows, column_rows, reference_rows = [], [], []
+        for t in range(tables):
+            name = f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{t}"
+            table_rows.append(('bench', name, 'BASE TABLE', comment()))
+            for c in range(columns):
+                column_rows.append(('bench', name, f"{rng.choice(WORDS)}_{c}", c + 1, rng.choice(COLUMN_TYPES), comment()))
+            if t and t % 5 == 0:
+                reference_rows.append(('bench', name, table_rows[t - 1][1]))
+        con.executemany("INSERT INTO TABLES VALUES (?, ?, ?, ?)", table_rows)
+        con.executemany("INSERT INTO COLUMNS VALUES (?, ?, ?, ?, ?, ?)", column_rows)
+        con.executemany("INSERT INTO KEY_COLUMN_USAGE VALUES (?, ?, ?)", reference_rows)
+        con.execute("CREATE INDEX columns_by_table ON COLUMNS (TABLE_SCHEMA, TABLE_NAME, ORDINAL_POSITION)")
+        con.commit()
+        con.close()
+        self.engine.dispose()
+
+    def load_rows(self, rows: int) -> None:
+        con = sqlite3.connect(self.main_path)
+        con.executescript("""
+            DROP TABLE IF EXISTS fact_orders;
+            CREATE TABLE fact_orders (order_id INT, user_id INT, amount DECIMAL(18,2), discount REAL,
+                created_at TIMESTAMP, channel TEXT);
+        """)
+        con.executemany("INSERT INTO fact_orders VALUES (?, ?, ?, ?, ?, ?)", (
+            (order_id, user_id, str(amount), discount, created_at.isoformat(' '), channel)
+            for order_id, user_id, amount, discount, created_at, channel in make_rows(rows)
+        ))
+        con.commit()
+        con.close()
+
+
+def make_rows(rows: int):
+    """Synthetic fact-table rows with Decimal amounts, datetimes, NULLs and text"""
+    start = datetime(2025, 1, 1)
+    for i in range(rows):
+        yield (i, i % 9973, Decimal(f"{i % 100000}.{i % 100:02d}"), None if i % 11 == 0 else (i % 7) / 10,
+               start + timedelta(seconds=i), f"channel_{i % 13}")
+
+
+def measure(func, rounds: int = ROUNDS) -> dict[str, float]:
+    """Best-of-rounds latency, then peak Python heap of one more run under tracemalloc"""
+    best = float('inf')
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'ms': round(best * 1000, 2), 'peak_mib': round(peak / 1024 / 1024, 2)}
+
+
+def bench_schema(db: StandInDatabase, name: str, tables: int, columns: int, comment_length: int) -> dict[str, dict]:
+    db.load_catalog(tables, columns, comment_length)
+    connection = ('mysql', 'localhost', 3306, 'bench', 'bench', 'bench')
+    rounds = 1 if tables * columns > 200000 else ROUNDS
+    results = {}
+
+    results['catalog_fetch'] = measure(lambda: get_db_schema(*connection, use_cache=False), rounds)
+    schema = get_db_schema(*connection, use_cache=False)
+    schema_cache.invalidate()
+    get_db_schema(*connection)
+    results['catalog_cached'] = measure(lambda: get_db_schema(*connection))
+    # A zero TTL runs the change probe on every call, as after the TTL expires
+    results['catalog_probe'] = measure(lambda: get_db_schema(*connection, cache_ttl=0), rounds)
+
+    dsl = format_schema_dsl(schema, with_type=True, with_comment=True)
+    results['format_dsl'] = {**measure(lambda: format_schema_dsl(schema, with_type=True, with_comment=True), rounds),
+                             'tokens': estimate_tokens(dsl)}
+    pruned = prune_schema(schema, QUESTION, token_budget=DEFAULT_TOKEN_BUDGET)
+    results['prune'] = {**measure(lambda: prune_schema(schema, QUESTION, token_budget=DEFAULT_TOKEN_BUDGET)),
+                        'tables': len(pruned)}
+    fitted, fitted_tokens = fit_schema_dsl(pruned, DEFAULT_TOKEN_BUDGET, query=QUESTION)
+    results['fit_dsl'] = {**measure(lambda: fit_schema_dsl(pruned, DEFAULT_TOKEN_BUDGET, query=QUESTION)),
+                          'tokens': fitted_tokens}
+
+    def render(loader: PromptLoader) -> str:
+        return loader.get_prompt('mysql', {'db_type': 'MYSQL', 'meta_data': fitted, 'compact_schema': True}, limit=100)
+
+    loader = PromptLoader()
+    prompt = render(loader)
+    results['prompt_cold'] = {**measure(lambda: render(PromptLoader()), 1), 'tokens': estimate_tokens(prompt)}
+    results['prompt_warm'] = measure(lambda: render(loader))
+    results['text2data'] = bench_text2data(connection)
+    return {f"schema/{name}/{stage}": value for stage, value in results.items()}
+
+
+def bench_text2data(connection: tuple) -> dict[str, float] | None:
+    """End to end SQL generation against a fake model session, skipped without dify_plugin"""
+    if HologresText2dataTool is None:
+        return None
+    tool = HologresText2dataTool.__new__(HologresText2dataTool)
+    tool.session = FakeSession()
+    parameters = dict(zip(('db_type', 'host', 'port', 'db_name', 'username', 'password'), connection))
+    parameters.update(
+        query=QUESTION, result_format='text', use_sql_cache=False,
+        model={'provider': 'fake', 'model': 'fake', 'mode': 'chat', 'completion_params': {}}
+    )
+    return measure(lambda: list(tool._invoke(parameters)))
+
+
+class FakeSession:
+    """Model session streaming a canned answer in small chunks, with storage kept in memory"""
+    ANSWER = "```sql\nSELECT channel, SUM(amount) FROM fact_orders GROUP BY channel LIMIT 100;\n```\nThis sums amounts."
+
+    class _Llm:
+        def invoke(self, model_config, prompt_messages, stream=False, **kwargs):
+            def message(content):
+                return type('Message', (), {'content': content})()
+            if not stream:
+                return type('Result', (), {'message': message(FakeSession.ANSWER)})()
+
+            def chunks():
+                for i in range(0, len(FakeSession.ANSWER), 8):
+                    delta = type('Delta', (), {'message': message(FakeSession.ANSWER[i:i + 8])})()
+                    yield type('Chunk', (), {'delta': delta})()
+            return chunks()
+
+    class _Storage(dict):
+        def get(self, key):
+            return self[key]
+
+        def set(self, key, value):
+            self[key] = value
+
+    def __init__(self):
+        self.model = type('Model', (), {'llm': self._Llm()})()
+        self.storage = self._Storage()
+
+
+def bench_rows(db: StandInDatabase, rows: int) -> dict[str, dict]:
+    keys = ['order_id', 'user_id', 'amount', 'discount', 'created_at', 'channel']
+    data = list(make_rows(rows))
+    batches = [data[i:i + BATCH_SIZE] for i in range(0, rows, BATCH_SIZE)]
+    rounds = 1 if rows >= 1000000 else ROUNDS
+    results = {
+        'csv': measure(lambda: encode_batches(CsvEncoder(keys), batches), rounds),
+        'html': measure(lambda: encode_batches(HtmlEncoder(keys), batches), rounds),
+        'json': measure(lambda: encode_batches(JsonEncoder(keys), batches), rounds),
+        'json_rows': measure(lambda: encode_batches(JsonEncoder(keys, 'rows', 'string'), batches), rounds),
+    }
+    db.load_rows(rows)
+
+    def fetch() -> int:
+        with execute_sql_stream('mysql', 'localhost', 3306, 'bench', 'bench', 'bench',
+                                "SELECT * FROM fact_orders", max_rows=None, max_bytes=None) as result:
+            return sum(len(batch) for batch in result.batches())
+
+    results['fetch'] = measure(fetch, rounds)
+    return {f"rows/{rows}/{stage}": value for stage, value in results.items()}
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict]) -> list[str]:
+    """Measurements exceeding their baseline beyond the tolerances"""
+    regressions = []
+    for case, value in results.items():
+        expected = baseline.get(case)
+        if not value or not expected:
+            continue
+        for metric, (fraction, slack) in TOLERANCES.items():
+            if metric in value and metric in expected and value[metric] > expected[metric] * (1 + fraction) + slack:
+                regressions.append(f"{case} {metric}: {value[metric]} > baseline {expected[metric]}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark of schema, prompt and result paths")
+    parser.add_argument('--full', action='store_true', help="include 10k/50k table schemas and 1M rows")
+    parser.add_argument('--save-baseline', action='store_true', help=f"write the results to {BASELINE.name}")
+    parser.add_argument('--output', help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results: dict[str, dict] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        db = StandInDatabase(directory)
+        for name, shape in (FULL_SCHEMAS if args.full else QUICK_SCHEMAS).items():
+            results.update(bench_schema(db, name, *shape))
+        for rows in (FULL_ROWS if args.full else QUICK_ROWS):
+            results.update(bench_rows(db, rows))
+        db.engine.dispose()
+
+    print(f"{'case':<40} {'ms':>10} {'peak MiB':>10} {'tokens':>8}")
+    for case, value in results.items():
+        if value is None:
+            print(f"{case:<40} {'skipped':>10}")
+            continue
+        print(f"{case:<40} {value['ms']:>10.2f} {value['peak_mib']:>10.2f} {value.get('tokens', ''):>8}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    if args.save_baseline:
+        BASELINE.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+        print(f"Baseline written to {BASELINE}")
+    elif not BASELINE.exists():
+        print(f"Error: no baseline at {BASELINE}, run with --save-baseline to record one")
+        sys.exit(2)
+    else:
+        baseline = json.loads(BASELINE.read_text())
+        for case in results.keys() - baseline.keys():
+            print(f"Warning: {case} has no baseline, run with --save-baseline to record it")
+        regressions = compare(results, baseline)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,78 @@
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.sql_analyzer import analyze_sql
+
+ITERATIONS = 5000
+
+FRAGMENTS = [
+    'SELECT', 'select', 'FROM', 'WHERE', 'JOIN', 'WITH', 'AS', 'INTO', 'DELETE', 'UPDATE', 'INSERT', 'DROP',
+    '(', ')', ',', ';', '.', '::', '--', '/*', '*/', "'", '"', '`', '[', ']', '$$', '$a$', 'E', 'N', '\\',
+    't', 'public', 'x', '1', '2.5e3', ':p', '%s', '?', '@v', '#', '中文', ' ', '\n', '\t', '=', '<>', '*'
+]
+READ_QUERIES = [
+    "SELECT a, b FROM public.orders o WHERE o.id = {lit}",
+    "WITH r AS (SELECT * FROM sales WHERE note = {lit}) SELECT count(*) FROM r",
+    "SELECT x FROM t1 JOIN t2 ON t1.id = t2.id WHERE t2.tag IN ({lit}, {lit})"
+]
+WRITE_QUERIES = [
+    "DELETE FROM t WHERE a = {lit}",
+    "WITH x AS (DELETE FROM t RETURNING *) SELECT * FROM x",
+    "WITH x AS (SELECT 1) UPDATE t SET a = {lit}",
+    "SELECT a INTO new_table FROM t",
+    "SELECT 1; DROP TABLE t",
+    "SELECT * FROM (SELECT 1) s; INSERT INTO t VALUES ({lit})",
+    "EXPLAIN ANALYZE DELETE FROM t",
+    "SELECT nextval('seq')",
+    "/* harmless */ TRUNCATE TABLE t"
+]
+# Write keywords smuggled into places where they must not count
+DECOYS = ["'; DROP TABLE t; --'", "'-- DELETE FROM t'", "$$; DELETE FROM t; $$", "E'\\'; UPDATE t SET a = 1; --'"]
+
+
+def soup(rng: random.Random) -> str:
+    return ''.join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 60)))
+
+
+def perturb(rng: random.Random, sql: str) -> str:
+    """Change whitespace, add comments and flip keyword case without changing the query"""
+    words = []
+    for word in sql.split(' '):
+        if word.upper() in ('SELECT', 'FROM', 'WHERE', 'JOIN', 'AS', 'WITH', 'ON', 'IN') and rng.random() < 0.5:
+            word = word.swapcase()
+        words.append(word)
+    separators = [' ', '  ', '\n', '\t', ' /* c */ ', ' -- c\n']
+    return ''.join(word + rng.choice(separators) for word in words).strip()
+
+
+def check(condition: bool, message: str, sql: str) -> None:
+    if not condition:
+        raise AssertionError(f"{message}: {sql!r}")
+
+
+if __name__ == "__main__":
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    rng = random.Random(seed)
+    for _ in range(ITERATIONS):
+        # Arbitrary input never raises, and normalizing twice changes nothing
+        sql = soup(rng)
+        dialect = rng.choice(['hologres', 'mysql', 'sqlserver'])
+        analysis = analyze_sql.__wrapped__(sql, dialect)
+        if dialect == 'hologres':
+            again = analyze_sql.__wrapped__(analysis.normalized, dialect)
+            check(again.normalized == analysis.normalized, "normalization is not idempotent", sql)
+
+        # Literals and comments cannot hide a write or fake one
+        query = rng.choice(READ_QUERIES).format(lit=rng.choice(DECOYS))
+        analysis = analyze_sql.__wrapped__(query, 'hologres')
+        check(analysis.read_only, "read-only query classified as write", query)
+        variant = analyze_sql.__wrapped__(perturb(rng, query), 'hologres')
+        check(variant.fingerprint == analysis.fingerprint, "fingerprint changed with formatting", query)
+        check(variant.tables == analysis.tables, "tables changed with formatting", query)
+
+        query = rng.choice(WRITE_QUERIES).format(lit=rng.choice(DECOYS))
+        check(not analyze_sql.__wrapped__(perturb(rng, query), 'hologres').read_only, "write classified as read-only", query)
+    print(f"{ITERATIONS} iterations passed with seed {seed}")
@@ -0,0 +1,53 @@
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.deadline import Watchdog, cancel_query
+
+
+class FakeMssqlConnection:
+    """Stands in for _mssql.MSSQLConnection, the object that can actually cancel"""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+
+class FakePymssqlConnection:
+    """Like pymssql.Connection: no cancel() of its own, the _mssql connection in _conn"""
+
+    def __init__(self):
+        self._conn = FakeMssqlConnection()
+
+
+def test_sqlserver_cancel_reaches_the_mssql_connection():
+    connection = FakePymssqlConnection()
+    assert not hasattr(connection, 'cancel')
+    cancel_query(None, connection, 'sqlserver')
+    assert connection._conn.cancelled.is_set()
+
+
+def test_watchdog_cancels_a_sqlserver_statement_past_its_timeout():
+    connection = FakePymssqlConnection()
+    watch = Watchdog().watch(0.01, lambda: cancel_query(None, connection, 'sqlserver'))
+    assert connection._conn.cancelled.wait(5)
+    assert watch.fired
+
+
+def test_cancelled_watch_never_fires():
+    connection = FakePymssqlConnection()
+    watch = Watchdog().watch(0.05, lambda: cancel_query(None, connection, 'sqlserver'))
+    watch.cancel()
+    assert not connection._conn.cancelled.wait(0.2)
+    assert not watch.fired
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,45 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine, text
+
+from utils.pagination import build_page_sql
+
+KEY = [('id', False)]
+
+
+def page_ids(sql: str, after: list | None = None) -> list[int]:
+    engine = create_engine('sqlite://')
+    with engine.connect() as conn:
+        conn.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY)"))
+        conn.execute(text("INSERT INTO t (id) VALUES " + ', '.join(f"({i})" for i in range(10))))
+        page_sql, params = build_page_sql(sql, 'postgresql', KEY, 3, after)
+        return [row[0] for row in conn.execute(text(page_sql), params)]
+
+
+def test_plain_query():
+    assert page_ids("select id from t") == [0, 1, 2, 3]
+    assert page_ids("select id from t;", after=[2]) == [3, 4, 5, 6]
+
+
+def test_trailing_line_comment():
+    assert page_ids("select id from t -- all rows") == [0, 1, 2, 3]
+    assert page_ids("select id from t -- all rows", after=[5]) == [6, 7, 8, 9]
+
+
+def test_terminator_followed_by_comments():
+    assert page_ids("select id from t; -- done") == [0, 1, 2, 3]
+    assert page_ids("select id from t;\n/* generated */\n-- done\n", after=[7]) == [8, 9]
+
+
+def test_semicolon_inside_a_string_is_kept():
+    assert page_ids("select id from t where ';' <> 'x' -- ok;") == [0, 1, 2, 3]
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,79 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.plugin_storage import INDEX_KEY, StorageBudget, storage_budget
+from utils.schema_cache import SchemaCache
+from utils.sql_cache import SqlCache
+
+
+class FakeStorage(dict):
+    """Dict with the get/set/delete interface of Dify plugin storage; get raises for a missing key"""
+
+    def get(self, key):
+        return self[key]
+
+    def set(self, key, value):
+        self[key] = value
+
+    def delete(self, key):
+        del self[key]
+
+
+def snapshot_bytes(storage: FakeStorage) -> int:
+    return sum(len(value) for key, value in storage.items() if key != INDEX_KEY)
+
+
+def test_oldest_snapshots_are_evicted_to_stay_within_budget():
+    storage = FakeStorage()
+    budget = StorageBudget(budget=1000, snapshot_limit=400)
+    for name in ('a', 'b', 'c', 'd'):
+        assert budget.set(storage, name, b'x' * 300)
+    assert set(storage) - {INDEX_KEY} == {'b', 'c', 'd'}
+    assert snapshot_bytes(storage) == budget.usage(storage) == 900
+    assert budget.evictions == 1
+
+
+def test_rewriting_a_key_replaces_its_size():
+    storage = FakeStorage()
+    budget = StorageBudget(budget=1000, snapshot_limit=600)
+    budget.set(storage, 'a', b'x' * 500)
+    budget.set(storage, 'b', b'x' * 400)
+    budget.set(storage, 'a', b'x' * 550)
+    assert set(storage) - {INDEX_KEY} == {'a', 'b'}
+    assert budget.usage(storage) == 950
+
+
+def test_oversized_snapshot_is_not_stored():
+    storage = FakeStorage()
+    budget = StorageBudget(budget=1000, snapshot_limit=400)
+    budget.set(storage, 'a', b'x' * 300)
+    assert not budget.set(storage, 'big', b'x' * 401)
+    assert set(storage) - {INDEX_KEY} == {'a'}
+
+
+def test_schema_and_sql_caches_share_the_quota():
+    storage = FakeStorage()
+    tables = {f'public.t{i}': {'comment': f'table {i}', 'columns': [{'name': 'id', 'type': 'INT', 'comment': ''}]} for i in range(50)}
+    saved_budget = storage_budget.budget
+    try:
+        schema_cache = SchemaCache()
+        schema_cache.get_schema(('db', 0), lambda: {name: 'v1' for name in tables}, lambda names: dict(tables), storage)
+        # Room for two schema snapshots and a little more
+        storage_budget.budget = 2 * snapshot_bytes(storage) + 100
+        for database in (1, 2):
+            schema_cache.get_schema(('db', database), lambda: {name: 'v1' for name in tables}, lambda names: dict(tables), storage)
+        SqlCache().put('scope', 'how many rows in t1', 'SELECT count(*) FROM public.t1', tables, storage)
+        assert any(key.startswith('sqlcache:') for key in storage)
+        assert sum(1 for key in storage if key.startswith('schema:')) == 1
+        assert snapshot_bytes(storage) <= storage_budget.budget
+    finally:
+        storage_budget.budget = saved_budget
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,75 @@
+import sys
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pyarrow as pa
+
+from utils.result_encoders import ArrowEncoder, CsvEncoder, DECIMAL_SCALE, HtmlEncoder, JsonEncoder
+
+
+def read_column(encoder: ArrowEncoder, index: int = 0) -> pa.ChunkedArray:
+    return pa.ipc.open_stream(encoder.getvalue()).read_all().column(index)
+
+
+def test_later_batch_with_more_decimal_digits():
+    # avg()/sum() over unconstrained numeric: the first batch does not show the widest scale
+    encoder = ArrowEncoder(['amount', 'id'])
+    encoder.write([(Decimal('1.5'), 1)])
+    encoder.write([(Decimal('1.25'), 2)])
+    column = read_column(encoder)
+    assert column.type == pa.decimal128(38, DECIMAL_SCALE)
+    assert column.to_pylist() == [Decimal('1.5'), Decimal('1.25')]
+
+
+def test_digits_beyond_the_wide_scale_are_rounded():
+    encoder = ArrowEncoder(['ratio'])
+    encoder.write([(Decimal('0.5'),)])
+    encoder.write([(Decimal('0.33333333333333333333333'),)])
+    assert read_column(encoder).to_pylist()[1] == Decimal('0.333333333333333333')
+
+
+def test_declared_scale_wins_over_first_batch():
+    encoder = ArrowEncoder(['price'], scales=[2])
+    encoder.write([(Decimal('1.5'),)])
+    encoder.write([(Decimal('2.75'),), (None,)])
+    column = read_column(encoder)
+    assert column.type == pa.decimal128(38, 2)
+    assert column.to_pylist() == [Decimal('1.50'), Decimal('2.75'), None]
+
+
+def test_large_integers_keep_their_digits():
+    encoder = ArrowEncoder(['total'])
+    encoder.write([(Decimal('123456789012345678901234567890'),)])
+    encoder.write([(Decimal('1.5'),)])
+    assert read_column(encoder).to_pylist() == [Decimal('123456789012345678901234567890'), Decimal('1.5')]
+
+
+def test_json_payload_matches_encoded_rows():
+    for layout in ('objects', 'rows'):
+        encoder = JsonEncoder(['id', 'amount'], layout)
+        encoder.write([(1, Decimal('1.5')), (2, None)])
+        encoder.write([(3, Decimal('2.25'))])
+        rows = [[1, 1.5], [2, None], [3, 2.25]]
+        expected = [dict(zip(['id', 'amount'], row)) for row in rows] if layout == 'objects' else {'columns': ['id', 'amount'], 'rows': rows}
+        assert encoder.payload() == expected
+
+
+def test_size_tracks_the_encoded_output():
+    batches = [[(i, f'name {i}') for i in range(start, start + 50)] for start in (0, 50, 100)]
+    for encoder in (JsonEncoder(['id', 'name']), JsonEncoder(['id', 'name'], 'rows'), CsvEncoder(['id', 'name']), HtmlEncoder(['id', 'name'])):
+        sizes = []
+        for batch in batches:
+            encoder.write(batch)
+            sizes.append(encoder.size)
+        assert sizes == sorted(sizes) and sizes[0] > 0
+        # Exact up to the closing brackets, which are only written at the end
+        assert 0 <= len(encoder.getvalue()) - encoder.size < 100
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name}: ok")
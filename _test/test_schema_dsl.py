@@ -0,0 +1,36 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.alchemy_db_client import MAX_COMMENT_LENGTH, _group_table_names, fit_schema_dsl
+
+
+def test_numeric_suffixes_sort_by_value():
+    assert _group_table_names([f"t{i}" for i in range(1, 11)]) == "t{1..10}[10]"
+
+
+def test_gaps_are_not_written_as_a_range():
+    assert _group_table_names(["t1", "t2", "t7"]) == "t1|t2|t7"
+    assert _group_table_names(["t1", "t2", "t3", "t7", "t8", "t9", "t12"]) == "t{1..3}[3]|t{7..9}[3]|t12"
+
+
+def test_zero_padded_suffixes_keep_their_width():
+    names = [f"events_{i:04d}" for i in range(1, 32)] + ["events_0040"]
+    assert _group_table_names(names) == "events_{0001..0031}[31]|events_0040"
+
+
+def test_comments_are_kept_whole_when_the_schema_fits():
+    comment = "Order lifecycle status: pending, paid, shipped, delivered or refunded"
+    schema = {'public.orders': {'comment': '', 'columns': [{'name': 'status', 'type': 'TEXT', 'comment': comment}]}}
+    dsl, _ = fit_schema_dsl(schema, 1000, with_comment=True)
+    assert comment in dsl
+    dsl, _ = fit_schema_dsl(schema, 20, with_comment=True)
+    assert comment not in dsl and comment[:MAX_COMMENT_LENGTH - 1] in dsl
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name}: ok")
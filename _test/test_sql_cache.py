@@ -0,0 +1,75 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.sql_cache import SqlCache
+
+SCHEMA = {
+    'public.users': {'comment': '', 'columns': [{'name': 'status', 'comment': '', 'type': 'TEXT'}]},
+    'public.orders': {'comment': '', 'columns': [{'name': 'shipped_at', 'comment': '', 'type': 'TIMESTAMP'}]},
+}
+# Cached question, lookup that means something else
+OPPOSITE_PAIRS = [
+    ("list all active users ordered by signup date", "list all inactive users ordered by signup date"),
+    ("orders shipped last month by region", "orders not shipped last month by region"),
+    ("上个月已发货的订单", "上个月未发货的订单"),
+]
+
+
+def cache_with(question: str, sql: str = "SELECT 1 FROM public.users") -> SqlCache:
+    cache = SqlCache()
+    cache.put('scope', question, sql, SCHEMA)
+    return cache
+
+
+def test_exact_hit_ignores_case_and_punctuation():
+    cache = cache_with("List all active users ordered by signup date")
+    assert cache.get('scope', "list all active users, ordered by signup date?", SCHEMA) == "SELECT 1 FROM public.users"
+
+
+def test_fuzzy_matching_is_off_by_default():
+    cache = cache_with("list all active users ordered by signup date")
+    assert cache.get('scope', "please list all active users ordered by the signup date", SCHEMA) is None
+
+
+def test_opposite_questions_never_hit():
+    for cached, asked in OPPOSITE_PAIRS:
+        cache = cache_with(cached)
+        assert cache.get('scope', asked, SCHEMA) is None, asked
+        assert cache.get('scope', asked, SCHEMA, fuzzy=True) is None, asked
+
+
+def test_fuzzy_hit_differs_only_in_stopwords():
+    cache = cache_with("list all active users ordered by signup date")
+    sql = cache.get('scope', "please list all the active users ordered by signup date", SCHEMA, fuzzy=True)
+    assert sql == "SELECT 1 FROM public.users"
+    assert cache.stats()['fuzzy_hits'] == 1
+
+
+def test_fuzzy_hit_needs_the_same_numbers():
+    cache = cache_with("top 10 orders shipped last month by region")
+    assert cache.get('scope', "the top 20 orders shipped last month by region", SCHEMA, fuzzy=True) is None
+
+
+def test_table_missing_from_a_restricted_schema_is_a_miss_not_an_invalidation():
+    cache = cache_with("how many users", "SELECT count(*) FROM public.users")
+    orders_only = {'public.orders': SCHEMA['public.orders']}
+    assert cache.get('scope', "how many users", orders_only) is None
+    assert cache.stats()['invalidations'] == 0
+    assert cache.get('scope', "how many users", SCHEMA) == "SELECT count(*) FROM public.users"
+
+
+def test_changed_table_invalidates():
+    cache = cache_with("how many users", "SELECT count(*) FROM public.users")
+    changed = dict(SCHEMA, **{'public.users': {'comment': '', 'columns': [{'name': 'state', 'comment': '', 'type': 'TEXT'}]}})
+    assert cache.get('scope', "how many users", changed) is None
+    assert cache.stats()['invalidations'] == 1
+    assert cache.get('scope', "how many users", SCHEMA) is None
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name}: ok")
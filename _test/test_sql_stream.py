@@ -0,0 +1,50 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.sql_stream import extract_sql_from_stream, starts_with_query
+
+
+def extract_all_chunkings(answer: str) -> set[tuple[str, bool]]:
+    """Results of extracting the answer streamed in chunks of every size"""
+    results = set()
+    for size in range(1, len(answer) + 1):
+        results.add(extract_sql_from_stream(answer[i:i + size] for i in range(0, len(answer), size)))
+    return results
+
+
+def test_fence_on_its_own_line():
+    assert extract_all_chunkings("Here it is:\n```sql\nSELECT id FROM users;\n```\nDone.") == {("SELECT id FROM users;", True)}
+    assert extract_all_chunkings("```postgresql\nSELECT 2\n```") == {("SELECT 2", True)}
+
+
+def test_one_line_fence():
+    # The format of the baseline _test/test.py cases
+    assert extract_all_chunkings("```sql SELECT 1```\nThis query selects one.") == {("SELECT 1", True)}
+    assert extract_all_chunkings("xxxxxx ```sql SELECT * FROM users``` xxxxxxx") == {("SELECT * FROM users", True)}
+
+
+def test_unfenced_statement():
+    assert extract_all_chunkings("WITH x AS (SELECT 1) SELECT * FROM x; -- done") == {("WITH x AS (SELECT 1) SELECT * FROM x;", True)}
+    assert extract_all_chunkings("select count(*) from t; ok") == {("select count(*) from t;", True)}
+
+
+def test_prose_opening_with_a_keyword_is_not_sql():
+    for answer in ("With this query you can list users; it is simple.", "Select the users you want; then run it."):
+        assert extract_all_chunkings(answer) == {(answer, False)}
+        assert not starts_with_query(answer)
+
+
+def test_dollar_quoted_bodies_are_skipped():
+    assert extract_all_chunkings("SELECT $$a;b$$ AS v; more") == {("SELECT $$a;b$$ AS v;", True)}
+    assert extract_all_chunkings("SELECT $t$a;$$;b$t$ AS v; more") == {("SELECT $t$a;$$;b$t$ AS v;", True)}
+    # Neither an identifier containing $ nor a $1 parameter opens a body
+    assert extract_all_chunkings("SELECT a$b, $1 FROM t; x") == {("SELECT a$b, $1 FROM t;", True)}
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name}: ok")
@@ -1,6 +1,10 @@
 from dify_plugin import Plugin, DifyPluginEnv
+from utils.deadline import REQUEST_TIMEOUT
+from utils.warmup import start_warmup
 
-plugin = Plugin(DifyPluginEnv(MAX_REQUEST_TIMEOUT=300))
+plugin = Plugin(DifyPluginEnv(MAX_REQUEST_TIMEOUT=REQUEST_TIMEOUT))
 
 if __name__ == '__main__':
+    # Optional, compiles templates and opens default pools while the plugin already serves
+    start_warmup()
     plugin.run()
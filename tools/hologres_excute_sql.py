@@ -1,25 +1,34 @@
 from dify_plugin import Tool
 from typing import Any
-from collections.abc import Generator
+from collections.abc import Generator, Iterable
 from dify_plugin.entities.tool import ToolInvokeMessage
-from utils.alchemy_db_client import execute_sql
+from utils.alchemy_db_client import connection_key, execute_sql_stream, open_connection, MAX_RESULT_ROWS, QueryResult, StreamedResult
+from utils.sql_analyzer import DATA_CHANGING_WRITES, analyze_sql, split_statements
+from utils.deadline import Deadline, QueryTimeoutError
+from utils.tracing import annotate, span, start_trace
+from utils.query_guard import GuardPolicy, MAX_ESTIMATED_COST, MAX_ESTIMATED_ROWS, query_guard
+from utils.result_cache import ResultRecorder, result_cache
+from utils.pagination import PageToken, PageTracker, build_page_sql, parse_page_key, PAGE_SIZE
+from utils.result_encoders import ArrowEncoder, COLUMNAR_FORMATS, CsvEncoder, HtmlEncoder, JsonEncoder, encode_batches
+import itertools
 import json
 from datetime import datetime, date
 from decimal import Decimal
-import csv
-from io import StringIO
 
 class HologresExcuteSqlTool(Tool):
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        with start_trace('hologres_excute_sql', tool_parameters) as trace:
+            yield from self._execute(tool_parameters)
+        if trace is not None and trace.mode == 'output':
+            yield self.create_json_message({"trace": trace.to_dict()})
+
+    def _execute(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        deadline = Deadline()
         # Get the SQL statement passed in
         sql = tool_parameters.get("sql")
         if not sql:
             raise ValueError("SQL statement cannot be empty")
         
-        # Improved risk detection
-        if self._contains_risk_commands(sql):
-            raise ValueError("SQL statement contains risks")
-
         # Get database connection parameters
         db_type = tool_parameters.get("db_type")
         host = tool_parameters.get("host")
@@ -30,111 +39,352 @@ class HologresExcuteSqlTool(Tool):
 
         if not all([db_type, host, port, database, username, password]):
             raise ValueError("Database connection parameters cannot be empty")
+
+        # Token-level risk detection, string literals and comments cannot hide or fake a write
+        if self._contains_risk_commands(sql, db_type):
+            raise ValueError("SQL statement contains risks")
         
-        try:
-            # Execute SQL statement (query or non-query)
-            result = execute_sql(
-                db_type, host, int(port), database, 
-                username, password, sql, ""
-            )
-            # Handle empty results
-            if isinstance(result, list) and not result:  # Empty query result
-                yield self.create_text_message("No data found")
-            elif isinstance(result, dict) and "rowcount" in result and result["rowcount"] == 0:  # No affected rows
-                yield self.create_text_message("No data affected")
-
-            result_format = tool_parameters.get("result_format", "json")
-            
-            if result_format == 'json':
-                yield self.create_json_message({
-                        "status": "success",
-                        "result": result
-                    }  
+        result_format = tool_parameters.get("result_format", "json")
+        max_rows = int(tool_parameters.get("max_rows") or MAX_RESULT_ROWS)
+
+        if tool_parameters.get("run_concurrently"):
+            yield from self._run_concurrently(sql, tool_parameters, max_rows, deadline)
+            return
+
+        run_sql, params, token = sql, None, None
+        page = self._page_request(sql, tool_parameters)
+        if page is not None:
+            digest, key, token, page_size = page
+            run_sql, params = build_page_sql(sql, db_type, key, page_size, token.after if token else None)
+            # The page query fetches one row more than this, which marks the page as cut
+            max_rows = page_size
+
+        def paged(result: Any) -> Any:
+            """Track the last row of a page so the next page's token can be built"""
+            if page is None:
+                return result
+            return PageTracker(result, digest, key, token.page if token else 1)
+
+        cache_key = self._result_cache_key(sql, tool_parameters)
+        if cache_key is not None:
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                yield from self._stream_result(
+                    paged(cached), result_format, {"status": "hit", "age_seconds": round(cached.age, 1)},
+                    **self._json_options(tool_parameters)
                 )
-            elif result_format == 'csv':
-                yield from self._handle_csv(result)
-            elif result_format == 'html':
-                yield from self._handle_html(result)
-            else:
-                if result is not None:
-                    message_text = json.dumps(
-                        result, 
-                        ensure_ascii=False, 
-                        default=self._custom_serializer  # Key modification point
-                    )
+                return
+
+        try:
+            conn = open_connection(db_type, host, int(port), database, username, password)
+            try:
+                # Later pages run the statement the first page was checked with, only the key values change
+                if token is None:
+                    guarded_sql = self._guard_sql(conn, run_sql, tool_parameters)
                 else:
-                    message_text = "No data found"
-                yield self.create_text_message(message_text)
+                    guarded_sql = run_sql
+                timeout = self._statement_timeout(tool_parameters, deadline)
+            except BaseException:
+                conn.close()
+                raise
+            # Execute SQL statement (query or non-query) on a server-side cursor
+            with execute_sql_stream(
+                db_type, host, int(port), database,
+                username, password, guarded_sql, params,
+                max_rows=max_rows, conn=conn, timeout=timeout
+            ) as result:
+                if guarded_sql != run_sql:
+                    yield self.create_text_message(self._guard_notice(tool_parameters))
+                if cache_key is None or not result.returns_rows:
+                    yield from self._stream_result(paged(result), result_format, **self._json_options(tool_parameters))
+                else:
+                    recorder = ResultRecorder(result, result_cache.max_entry_bytes)
+                    yield from self._stream_result(
+                        paged(recorder), result_format, {"status": "miss", "age_seconds": 0},
+                        **self._json_options(tool_parameters)
+                    )
+                    if recorder.complete and recorder.rows is not None:
+                        result_cache.put(
+                            cache_key, result.keys, recorder.rows, result.truncated,
+                            float(tool_parameters['result_cache_ttl'])
+                        )
+        except QueryTimeoutError:
+            raise
         except Exception as e:
             raise ValueError(f"Database operation failed: {str(e)}")
 
-    def _handle_html(self, data: list[dict[str, Any]] | dict[str, Any] | None) -> Generator[ToolInvokeMessage, None, None]:
+    def _stream_result(
+            self,
+            result: StreamedResult | QueryResult,
+            result_format: str,
+            cache_info: dict[str, Any] | None = None,
+            json_layout: str = 'objects',
+            decimal_mode: str = 'float'
+    ) -> Generator[ToolInvokeMessage, None, None]:
+        """
+        Convert a statement result into messages of the requested format.
+        Every formatter reads the column names once from result.keys and the rows as tuple batches.
+        :param cache_info: Result cache lookup to report, None when the cache is off
+        :param json_layout: Row layout of the json and text formats, see JSON_LAYOUTS
+        :param decimal_mode: How the json and text formats write Decimal values, see DECIMAL_MODES
+        """
+        # Rows are fetched while they are serialized, so one span covers both
+        with span('fetch', format=result_format):
+            yield from self._format_result(
+                result, result_format, cache_info, JsonEncoder(result.keys, json_layout, decimal_mode),
+                result if isinstance(result, PageTracker) else None
+            )
+            annotate(rows=result.row_count)
+
+    def _format_result(
+            self,
+            result: StreamedResult | QueryResult,
+            result_format: str,
+            cache_info: dict[str, Any] | None,
+            json_encoder: JsonEncoder,
+            page: PageTracker | None = None
+    ) -> Generator[ToolInvokeMessage, None, None]:
+        if not result.returns_rows:
+            yield from self._handle_rowcount(result.rowcount, result_format)
+            return
+
+        batches = result.batches()
+        first_batch = next(batches, None)
+        if first_batch is None:  # Empty query result
+            yield self.create_text_message("No data found")
+            if result_format in ('csv', 'html', 'arrow', 'parquet'):
+                return
+            batches = iter(())
+        else:
+            batches = itertools.chain([first_batch], batches)
+
+        if result_format == 'csv':
+            encoder = CsvEncoder(result.keys)
+        elif result_format == 'html':
+            encoder = HtmlEncoder(result.keys)
+        elif result_format in COLUMNAR_FORMATS:
+            encoder = ArrowEncoder(result.keys, result_format, result.scales)
+        else:
+            encoder = json_encoder
+        measure_output = getattr(result, 'measure_output', None)
+        if measure_output is not None:
+            # The byte cap applies to what the rows encode to; replayed cache entries are complete already
+            measure_output(lambda: encoder.size)
+
+        if result_format == 'json':
+            for batch in batches:
+                json_encoder.write(batch)
+            message = {
+                "status": "success",
+                "result": json_encoder.payload()
+            }
+            if page is not None:
+                message["page"] = page.info()
+            elif result.truncated:
+                message["truncated"] = True
+            if cache_info is not None:
+                message["cache"] = cache_info
+            yield self.create_json_message(message)
+        elif result_format == 'csv':
+            yield from self._handle_csv(encoder, batches)
+        elif result_format == 'html':
+            yield from self._handle_html(encoder, batches)
+        elif result_format in COLUMNAR_FORMATS:
+            yield from self._handle_columnar(encoder, batches)
+        else:
+            yield self.create_text_message(encode_batches(json_encoder, batches).decode('utf-8'))
+
+        if page is not None:
+            if result_format != 'json':
+                next_token = page.next_token()
+                yield self.create_text_message(
+                    f"Page {page.page}, {result.row_count} rows, next page_token: {next_token}" if next_token
+                    else f"Page {page.page}, {result.row_count} rows, last page"
+                )
+        elif result.truncated:
+            yield self.create_text_message(
+                f"Result truncated to the first {result.row_count} rows, add a LIMIT or narrow the query to see the rest"
+            )
+        if cache_info is not None and result_format != 'json':
+            yield self.create_text_message(
+                f"Result cache {cache_info['status']}, entry age {cache_info['age_seconds']}s"
+            )
+
+    def _page_request(self, sql: str, tool_parameters: dict[str, Any]) -> tuple[str, list[tuple[str, bool]], PageToken | None, int] | None:
+        """
+        Read the pagination parameters
+        :return: Tuple of (SQL digest, ordering key, token of the requested page or None for the first,
+                 page size), or None when the result is not paginated
+        """
+        page_key = tool_parameters.get("page_key")
+        page_token = tool_parameters.get("page_token")
+        if not page_key and not page_token:
+            return None
+        analysis = analyze_sql(sql, tool_parameters["db_type"])
+        if not analysis.read_only or len(analysis.statements) != 1:
+            raise ValueError("Pagination needs a single read-only query")
+        token = PageToken.decode(page_token, analysis.digest) if page_token else None
+        key = token.key if token is not None else parse_page_key(page_key)
+        page_size = int(tool_parameters.get("page_size") or PAGE_SIZE)
+        if page_size <= 0:
+            raise ValueError("page_size must be a positive number")
+        return analysis.digest, key, token, page_size
+
+    def _result_cache_key(self, sql: str, tool_parameters: dict[str, Any]) -> tuple | None:
+        """Cache key of a read-only statement when the result cache is enabled, otherwise None"""
+        if float(tool_parameters.get('result_cache_ttl') or 0) <= 0:
+            return None
+        db_type = tool_parameters['db_type']
+        analysis = analyze_sql(sql, db_type)
+        if not analysis.read_only:
+            return None
+        connection = connection_key(
+            db_type, tool_parameters['host'], int(tool_parameters['port']),
+            tool_parameters['db_name'], tool_parameters['username'], tool_parameters['password']
+        )
+        # Every option that changes what the statement returns is part of the key
+        return result_cache.make_key(
+            connection, analysis.digest, None,
+            int(tool_parameters.get('max_rows') or MAX_RESULT_ROWS),
+            tool_parameters.get('cost_guard') or 'off',
+            tool_parameters.get('max_estimated_cost'), tool_parameters.get('max_estimated_rows'),
+            tool_parameters.get('page_key'), tool_parameters.get('page_size'), tool_parameters.get('page_token')
+        )
+
+    def _statement_timeout(self, tool_parameters: dict[str, Any], deadline: Deadline) -> float:
+        """Seconds the statement may run: statement_timeout, cut to what is left of the request budget"""
+        return deadline.budget(float(tool_parameters.get("statement_timeout") or 0))
+
+    def _run_concurrently(
+            self,
+            sql: str,
+            tool_parameters: dict[str, Any],
+            max_rows: int,
+            deadline: Deadline
+    ) -> Generator[ToolInvokeMessage, None, None]:
+        """Run every statement, once per parameter set, concurrently and report the results in input order"""
+        # asyncio and the worker pool are only loaded by calls that run statements concurrently
+        from utils.async_executor import execute_many, MAX_CONCURRENCY
+
+        db_type = tool_parameters["db_type"]
+        statements = split_statements(sql, db_type)
+        param_sets = self._parse_param_sets(tool_parameters.get("param_sets"))
+        # Every statement is checked against the cost guard in its worker, before it runs
+        policy = self._guard_policy(tool_parameters)
+        with span('execute_many', statements=len(statements), param_sets=len(param_sets or [None])):
+            results = execute_many(
+                db_type, tool_parameters["host"], int(tool_parameters["port"]), tool_parameters["db_name"],
+                tool_parameters["username"], tool_parameters["password"], statements, param_sets,
+                max_concurrency=int(tool_parameters.get("max_concurrency") or MAX_CONCURRENCY),
+                timeout=float(tool_parameters.get("statement_timeout") or 0) or None,
+                max_rows=max_rows,
+                guard_policy=policy if policy.mode != 'off' else None,
+                deadline=deadline
+            )
+        json_options = self._json_options(tool_parameters)
+        for result in results:
+            if isinstance(result.get("result"), QueryResult):
+                result["result"] = self._json_payload(result["result"], json_options)
+            if "guarded_sql" in result:
+                result["notice"] = self._guard_notice(tool_parameters)
+        failed = sum(1 for result in results if result["status"] != "success")
+        message = {"status": "success" if not failed else "partial" if failed < len(results) else "error", "results": results}
+        if tool_parameters.get("result_format", "json") == "json":
+            yield self.create_json_message(message)
+        else:
+            yield self.create_text_message(json.dumps(message, ensure_ascii=False, default=self._custom_serializer))
+
+    @staticmethod
+    def _parse_param_sets(param_sets: str | None) -> list[dict[str, Any]] | None:
+        """Parse the param_sets parameter, a JSON array of objects bound to :name placeholders"""
+        if not param_sets:
+            return None
+        try:
+            parsed = json.loads(param_sets)
+        except ValueError as e:
+            raise ValueError(f"param_sets is not valid JSON: {str(e)}")
+        if not isinstance(parsed, list) or not all(isinstance(item, dict) for item in parsed):
+            raise ValueError("param_sets must be a JSON array of objects")
+        return parsed
+
+    def _guard_policy(self, tool_parameters: dict[str, Any]) -> GuardPolicy:
+        return GuardPolicy(
+            mode=tool_parameters.get('cost_guard') or 'off',
+            max_cost=float(tool_parameters.get('max_estimated_cost') or MAX_ESTIMATED_COST),
+            max_rows=int(tool_parameters.get('max_estimated_rows') or MAX_ESTIMATED_ROWS)
+        )
+
+    def _guard_sql(self, conn: Any, sql: str, tool_parameters: dict[str, Any]) -> str:
+        """Check the statement's EXPLAIN plan against the cost guard, return the SQL to run"""
+        policy = self._guard_policy(tool_parameters)
+        with span('guard', mode=policy.mode):
+            guarded_sql, _ = query_guard.check(conn, tool_parameters['db_type'], sql, policy)
+        return guarded_sql
+
+    def _json_options(self, tool_parameters: dict[str, Any]) -> dict[str, str]:
+        """Keyword arguments of _stream_result controlling JSON output"""
+        return {
+            'json_layout': tool_parameters.get('json_layout') or 'objects',
+            'decimal_mode': tool_parameters.get('decimal_mode') or 'float'
+        }
+
+    def _json_payload(self, result: QueryResult, json_options: dict[str, str]) -> Any:
+        """Rows of a fetched result as JSON-ready values, in the layout the json format uses"""
+        json_encoder = JsonEncoder(result.keys, json_options['json_layout'], json_options['decimal_mode'])
+        for batch in result.batches():
+            json_encoder.write(batch)
+        return json_encoder.payload()
+
+    def _guard_notice(self, tool_parameters: dict[str, Any]) -> str:
+        max_rows = int(tool_parameters.get('max_estimated_rows') or MAX_ESTIMATED_ROWS)
+        return f"Query exceeded the cost guard thresholds and was limited to {max_rows} rows"
+
+    def _handle_rowcount(self, rowcount: int, result_format: str) -> Generator[ToolInvokeMessage, None, None]:
+        """Report the number of affected rows of a non-query statement"""
+        if rowcount == 0:  # No affected rows
+            yield self.create_text_message("No data affected")
+        result = {"rowcount": rowcount}
+        if result_format == 'json':
+            yield self.create_json_message({
+                "status": "success",
+                "result": result
+            })
+        else:
+            yield self.create_text_message(json.dumps(result))
+
+    def _handle_html(self, encoder: HtmlEncoder, batches: Iterable[list[Any]]) -> Generator[ToolInvokeMessage, None, None]:
         """Generate HTML table message"""
-        html_table = self._to_html_table(data)
-        yield self.create_blob_message(html_table.encode('utf-8'), meta={'mime_type': 'text/html', 'filename': 'result.html'})
+        html_table = encode_batches(encoder, batches)
+        yield self.create_blob_message(html_table, meta={'mime_type': 'text/html', 'filename': 'result.html'})
+
+    def _handle_columnar(
+            self,
+            encoder: ArrowEncoder,
+            batches: Iterable[list[Any]]
+    ) -> Generator[ToolInvokeMessage, None, None]:
+        """Generate Arrow IPC stream or Parquet file message"""
+        yield self.create_blob_message(
+            encode_batches(encoder, batches),
+            meta=dict(COLUMNAR_FORMATS[encoder.result_format])
+        )
 
-    def _handle_csv(self, data: list[dict[str, Any]] | dict[str, Any] | None) -> Generator[ToolInvokeMessage]:
+    def _handle_csv(self, encoder: CsvEncoder, batches: Iterable[list[Any]]) -> Generator[ToolInvokeMessage]:
         """Generate CSV file message"""
-        output = StringIO()
-        # Write BOM (only first 3 bytes)
-        output.write('\ufeff')  # Add BOM
-        writer = csv.writer(output)
-        # Write header
-        writer.writerow(data[0].keys())
-        
-        # Write data rows (handle date serialization)
-        for row in data:
-            processed_row = [
-                self._custom_serializer(val) if isinstance(val, (date, datetime)) else val
-                for val in row.values()
-            ]
-            writer.writerow(processed_row)
-
-        # Note: utf-8-sig encoding automatically includes BOM, recommended to use this method
+        # The encoder writes UTF-8 bytes with a BOM, the same output as utf-8-sig
         yield self.create_blob_message(
-            output.getvalue().encode('utf-8-sig'),  # Key modification point ✅
+            encode_batches(encoder, batches),
             meta={
                 'mime_type': 'text/csv',
                 'filename': 'result.csv',
                 'encoding': 'utf-8-sig'  # Explicitly declare encoding
             }
         )
-    
-    def _to_html_table(self, data: list[dict]) -> str:
-        """Generate standard HTML table"""
-        html = ["<table border='1'>"]
-        html.append("<tr>" + "".join(f"<th>{col}</th>" for col in data[0].keys()) + "</tr>")
-        
-        for row in data:
-            html.append(
-                "<tr>" + 
-                "".join(f"<td>{self._custom_serializer(val)}</td>" for val in row.values()) + 
-                "</tr>"
-            )
-        
-        html.append("</table>")
-        return "".join(html)
-
-    def _contains_risk_commands(self, sql: str) -> bool:
-        import re
-        risk_keywords = {"DROP", "DELETE", "TRUNCATE", "ALTER", "UPDATE", "INSERT"}
-        # Remove comments
-        sql = re.sub(r'/\*.*?\*/', '', sql, flags=re.DOTALL)
-        sql = re.sub(r'--.*', '', sql)
-        # Split statements
-        statements = re.split(r';\s*', sql)
-        for stmt in statements:
-            stmt = stmt.strip()
-            if not stmt:
-                continue
-            # Match first word (case insensitive)
-            match = re.match(r'\s*([^\s]+)', stmt, re.IGNORECASE)
-            if match:
-                first_word = match.group(1).upper()
-                if first_word in risk_keywords:
-                    return True
-        return False
-    
+
+    def _contains_risk_commands(self, sql: str, db_type: str = 'hologres') -> bool:
+        """Whether any statement changes existing data or calls a side-effect function, including writes inside CTEs and SELECT ... INTO"""
+        writes = analyze_sql(sql, db_type).writes
+        return any(write in DATA_CHANGING_WRITES or write.startswith('function ') for write in writes)
+
     def _custom_serializer(self, obj: Any) -> Any:
         """Handle common non-serializable database types"""
         if isinstance(obj, (datetime, date)):
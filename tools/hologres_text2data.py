@@ -2,74 +2,181 @@ from collections.abc import Generator
 from typing import Any
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
-from utils.alchemy_db_client import get_db_schema
-from dify_plugin.entities.model.llm import LLMModelConfig
+from utils.alchemy_db_client import get_db_schema, INTROSPECTION_WORKERS
+from dify_plugin.entities.model.llm import LLMModelConfig, LLMResultChunk
 from dify_plugin.entities.tool import ToolInvokeMessage
 from dify_plugin.entities.model.message import SystemPromptMessage, UserPromptMessage
 
-from utils.prompt_loader import PromptLoader
-from utils.alchemy_db_client import format_schema_dsl
+from utils.prompt_loader import get_prompt_loader
+from utils.alchemy_db_client import fit_schema_dsl, format_schema_dsl
+from utils.schema_retriever import DEFAULT_TOKEN_BUDGET, DEFAULT_TOP_K, prune_schema
+from utils.sql_analyzer import analyze_sql
+from utils.sql_cache import SqlCache, sql_cache
+from utils.sql_stream import extract_sql_from_stream, starts_with_query
+from utils.tracing import annotate, span, start_trace
 
 class HologresText2dataTool(Tool):
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        with start_trace('hologres_text2data', tool_parameters) as trace:
+            excute_sql = self._generate_sql(tool_parameters)
+        if (isinstance(excute_sql, str)):
+            yield from self._sql_message(excute_sql, tool_parameters)
+        else:
+            yield self.create_text_message("LLM returned non-text content, please check the model configuration")
+        if trace is not None and trace.mode == 'output':
+            yield self.create_json_message({"trace": trace.to_dict()})
+
+    def _generate_sql(self, tool_parameters: dict[str, Any]) -> Any:
+        """
+        Produce the SQL answer for the question, from the SQL cache or the model.
+        Stages are timed as the schema, prompt and llm spans of the active trace.
+        :param tool_parameters: Parameters of the tool invocation
+        :return: Model answer, normally a string holding the SQL
+        """
         model_info= tool_parameters.get('model')
-        meta_data = get_db_schema(
-            db_type=tool_parameters['db_type'],
-            host=tool_parameters['host'],
-            port=tool_parameters['port'],
-            database=tool_parameters['db_name'],
-            username=tool_parameters['username'],
-            password=tool_parameters['password'],
-            table_names=tool_parameters.get('table_names', None)  # Use get method with default value None
-        )
-        with_comment = tool_parameters.get('with_comment', False)
-        dsl_text = format_schema_dsl(meta_data, with_type=True, with_comment=with_comment)
-        print(dsl_text)
-        # Initialize template loader
-        prompt_loader = PromptLoader()
-        # Build template context
-        context = {
-            'db_type': tool_parameters['db_type'].upper(),
-            'meta_data': dsl_text
-        }
-        # Load dynamic prompt
-        system_prompt = prompt_loader.get_prompt(
-            db_type=tool_parameters['db_type'],
-            context=context,
-            limit=tool_parameters.get( 'limit', 100 ),
-            user_custom_prompt=tool_parameters.get('custom_prompt', '')
-        )
-        print(f"System prompt:\n{system_prompt}")
-        try:
-            response = self.session.model.llm.invoke(
-                model_config=LLMModelConfig(
-                    provider=model_info.get('provider'),
-                    model=model_info.get('model'),
-                    mode=model_info.get('mode'),
-                    completion_params=model_info.get('completion_params')
-                ),
-                prompt_messages=[
-                    SystemPromptMessage(content=system_prompt),
-                    UserPromptMessage(
-                        content=f"Database type: {tool_parameters['db_type']}\n"
-                                f"User requirement: {tool_parameters['query']}"
+        with span('schema'):
+            meta_data = get_db_schema(
+                db_type=tool_parameters['db_type'],
+                host=tool_parameters['host'],
+                port=tool_parameters['port'],
+                database=tool_parameters['db_name'],
+                username=tool_parameters['username'],
+                password=tool_parameters['password'],
+                table_names=tool_parameters.get('table_names', None),  # Use get method with default value None
+                cache_ttl=tool_parameters.get('schema_cache_ttl'),
+                storage=self.session.storage,  # Persist the schema cache across plugin restarts
+                max_workers=int(tool_parameters.get('introspection_workers') or INTROSPECTION_WORKERS)
+            )
+        with span('prompt'):
+            # Reuse SQL generated earlier for the same question, or a near-identical one when sql_cache_fuzzy is on
+            use_sql_cache = tool_parameters.get('use_sql_cache', True)
+            # Everything that shapes the prompt besides the question, so calls seeing a different schema never share SQL
+            cache_scope = SqlCache.scope_key(
+                tool_parameters['db_type'], tool_parameters['host'], tool_parameters['port'],
+                tool_parameters['db_name'], tool_parameters['username'], model_info,
+                tool_parameters.get('limit', 100), tool_parameters.get('custom_prompt', ''),
+                tool_parameters.get('table_names'), tool_parameters.get('with_comment', False),
+                tool_parameters.get('schema_token_budget'), tool_parameters.get('max_tables'),
+                tool_parameters.get('stream_generation', True)
+            )
+            if use_sql_cache:
+                with span('sql_cache'):
+                    cached_sql = sql_cache.get(
+                        cache_scope, tool_parameters['query'], meta_data, storage=self.session.storage,
+                        fuzzy=bool(tool_parameters.get('sql_cache_fuzzy', False))
+                    )
+                    annotate(hit=cached_sql is not None)
+                if cached_sql is not None:
+                    return cached_sql
+            full_schema = meta_data
+            with_comment = tool_parameters.get('with_comment', False)
+            # The compact DSL is opt-in, without a budget the prompt keeps the legacy format
+            token_budget = int(tool_parameters.get('schema_token_budget') or 0)
+            if not tool_parameters.get('table_names'):
+                # Only carry the tables relevant to the question into the prompt
+                max_tables = tool_parameters.get('max_tables')
+                with span('prune', tables=len(meta_data)):
+                    meta_data = prune_schema(
+                        meta_data,
+                        tool_parameters['query'],
+                        top_k=DEFAULT_TOP_K if max_tables is None else int(max_tables),
+                        token_budget=token_budget or DEFAULT_TOKEN_BUDGET,
+                        with_comment=with_comment
                     )
-                ],
-                stream=False
+            with span('dsl', tables=len(meta_data)):
+                if token_budget > 0:
+                    # Compact DSL that drops comments, types and then columns to stay within the budget
+                    dsl_text, dsl_tokens = fit_schema_dsl(
+                        meta_data, token_budget, with_type=True, with_comment=with_comment, query=tool_parameters['query']
+                    )
+                    annotate(tokens=dsl_tokens)
+                else:
+                    dsl_text = format_schema_dsl(meta_data, with_type=True, with_comment=with_comment)
+                annotate(chars=len(dsl_text))
+            with span('render'):
+                # Shared template loader with precompiled templates and rendered-prompt cache
+                prompt_loader = get_prompt_loader()
+                # Build template context
+                context = {
+                    'db_type': tool_parameters['db_type'].upper(),
+                    'meta_data': dsl_text,
+                    'compact_schema': token_budget > 0
+                }
+                # Load dynamic prompt
+                system_prompt = prompt_loader.get_prompt(
+                    db_type=tool_parameters['db_type'],
+                    context=context,
+                    limit=tool_parameters.get( 'limit', 100 ),
+                    user_custom_prompt=tool_parameters.get('custom_prompt', '')
+                )
+                annotate(chars=len(system_prompt))
+        model_config = LLMModelConfig(
+            provider=model_info.get('provider'),
+            model=model_info.get('model'),
+            mode=model_info.get('mode'),
+            completion_params=model_info.get('completion_params')
+        )
+        prompt_messages = [
+            SystemPromptMessage(content=system_prompt),
+            UserPromptMessage(
+                content=f"Database type: {tool_parameters['db_type']}\n"
+                        f"User requirement: {tool_parameters['query']}"
             )
-        except Exception as e:
-            raise ValueError(f"LLM invocation failed (possibly timed out), please check model availability and retry: {str(e)}")
-        print(response)
-        excute_sql = response.message.content
-        if (isinstance(excute_sql, str)):
-            if (tool_parameters['result_format'] == 'json'):
-                yield self.create_json_message({
-                    "excute_sql": excute_sql
-                })
-            else:
-                yield self.create_text_message(excute_sql)
+        ]
+        with span('llm', model=model_info.get('model')):
+            try:
+                if tool_parameters.get('stream_generation', True):
+                    # Stop reading once the first statement is complete instead of waiting for trailing prose
+                    chunks = self.session.model.llm.invoke(
+                        model_config=model_config,
+                        prompt_messages=prompt_messages,
+                        stream=True
+                    )
+                    excute_sql, cut_short = extract_sql_from_stream(self._chunk_texts(chunks))
+                    annotate(stopped_at_statement_end=cut_short)
+                else:
+                    response = self.session.model.llm.invoke(
+                        model_config=model_config,
+                        prompt_messages=prompt_messages,
+                        stream=False
+                    )
+                    excute_sql = response.message.content
+            except Exception as e:
+                raise ValueError(f"LLM invocation failed (possibly timed out), please check model availability and retry: {str(e)}")
+            if isinstance(excute_sql, str):
+                annotate(chars=len(excute_sql))
+        # Only memoize a single read-only query, stored as the bare SQL so a hit has the same shape whichever path produced it
+        if use_sql_cache and isinstance(excute_sql, str):
+            sql = self._extract_sql_from_text(excute_sql)
+            if sql and self._is_single_query(sql, tool_parameters['db_type']):
+                sql_cache.put(cache_scope, tool_parameters['query'], sql, full_schema, storage=self.session.storage)
+        return excute_sql
+
+    @staticmethod
+    def _is_single_query(sql: str, db_type: str) -> bool:
+        """Whether generated SQL is exactly one read-only SELECT or WITH query"""
+        analysis = analyze_sql(sql, db_type)
+        return len(analysis.statements) == 1 and analysis.read_only and starts_with_query(sql, db_type)
+
+    @staticmethod
+    def _chunk_texts(chunks: Generator[LLMResultChunk]) -> Generator[str]:
+        """Text deltas of a streamed LLM result; closing this generator closes the model stream too"""
+        try:
+            for chunk in chunks:
+                content = chunk.delta.message.content
+                if isinstance(content, str) and content:
+                    yield content
+        finally:
+            chunks.close()
+
+    def _sql_message(self, excute_sql: str, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        """Return the generated SQL in the requested result format"""
+        if (tool_parameters['result_format'] == 'json'):
+            yield self.create_json_message({
+                "excute_sql": excute_sql
+            })
         else:
-            yield self.create_text_message("LLM returned non-text content, please check the model configuration")
+            yield self.create_text_message(excute_sql)
 
     def _extract_sql_from_text(self, text: str) -> str:
         import re
@@ -0,0 +1,91 @@
+from collections.abc import Generator
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+from dify_plugin.entities.tool import ToolInvokeMessage
+from utils.alchemy_db_client import execute_sql_stream, open_connection, MAX_RESULT_ROWS
+from utils.deadline import Deadline, QueryTimeoutError
+from utils.tracing import span, start_trace
+
+from tools.hologres_excute_sql import HologresExcuteSqlTool
+from tools.hologres_text2data import HologresText2dataTool
+
+# Checks out database connections while the schema is loaded and the model generates
+_warmup_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='db-warmup')
+
+class HologresText2resultTool(HologresText2dataTool, HologresExcuteSqlTool):
+    """
+    Generates the SQL for a question and runs it within one tool call.
+    A pooled connection is opened in the background while the schema is loaded and the
+    model generates, and the statement then runs on that connection. Time spent per stage,
+    taken from the trace spans, is reported with the result.
+    """
+
+    def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        # Spans are always collected here, their durations are the reported stage timings
+        with start_trace('hologres_text2result', tool_parameters, collect=True) as trace:
+            sql = yield from self._generate_and_run(tool_parameters)
+        message = {"excute_sql": sql, "timings_ms": {**trace.durations(), "total": round(trace.duration * 1000, 1)}}
+        if trace.mode == 'output':
+            message["trace"] = trace.to_dict()
+        yield self.create_json_message(message)
+
+    def _generate_and_run(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage, None, str]:
+        """Generate the SQL, run it and stream its result, return the statement that ran"""
+        # Generation time comes out of the same request budget the statement runs in
+        deadline = Deadline()
+        connection = _warmup_executor.submit(
+            open_connection,
+            tool_parameters['db_type'], tool_parameters['host'], int(tool_parameters['port']),
+            tool_parameters['db_name'], tool_parameters['username'], tool_parameters['password']
+        )
+        try:
+            answer = self._generate_sql(tool_parameters)
+            sql = self._extract_sql_from_text(answer) if isinstance(answer, str) else ''
+            if not sql:
+                raise ValueError("LLM did not return a SQL statement, please check the model configuration or rephrase the question")
+        except BaseException:
+            self._release(connection)
+            raise
+        if not self._is_single_query(sql, tool_parameters['db_type']):
+            # The user never wrote this statement, anything beyond one read-only query is only shown, not run
+            self._release(connection)
+            yield self.create_text_message(
+                "The generated SQL is not a single read-only query and was not run, "
+                "review it and run it with hologres_excute_sql if it is what you want"
+            )
+            return sql
+
+        result_format = tool_parameters.get('result_format', 'json')
+        max_rows = int(tool_parameters.get('max_rows') or MAX_RESULT_ROWS)
+        try:
+            with span('connect_wait'):
+                conn = connection.result()
+            try:
+                guarded_sql = self._guard_sql(conn, sql, tool_parameters)
+                timeout = self._statement_timeout(tool_parameters, deadline)
+            except BaseException:
+                conn.close()
+                raise
+            with execute_sql_stream(
+                tool_parameters['db_type'], tool_parameters['host'], int(tool_parameters['port']),
+                tool_parameters['db_name'], tool_parameters['username'], tool_parameters['password'],
+                guarded_sql, None, max_rows=max_rows, conn=conn, timeout=timeout
+            ) as result:
+                if guarded_sql != sql:
+                    yield self.create_text_message(self._guard_notice(tool_parameters))
+                    sql = guarded_sql
+                yield from self._stream_result(result, result_format, **self._json_options(tool_parameters))
+        except QueryTimeoutError:
+            raise
+        except Exception as e:
+            raise ValueError(f"Database operation failed: {str(e)}")
+        return sql
+
+    @staticmethod
+    def _release(connection: Future) -> None:
+        """Return a warmed-up connection to the pool once its checkout has finished"""
+        def close(future: Future) -> None:
+            if not future.cancelled() and future.exception() is None:
+                future.result().close()
+        if not connection.cancel():
+            connection.add_done_callback(close)
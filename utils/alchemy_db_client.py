@@ -1,33 +1,28 @@
 from typing import Any
-from sqlalchemy import create_engine, inspect, text
+from collections.abc import Callable, Generator
+import hashlib
+import itertools
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.exc import SQLAlchemyError
 from urllib.parse import quote_plus # For URL encoding
+from utils.deadline import QueryTimeoutError, Watch, cancel_query, is_timeout_error, set_statement_timeout, watchdog
+from utils.engine_registry import engine_registry
+from utils.schema_cache import schema_cache
+from utils.schema_retriever import estimate_tokens, tokenize
+from utils.tracing import annotate, span
 
 # Define version constant
 APP_VERSION = "0.1.1"
 
-def get_db_schema(
-        db_type: str,
-        host: str,
-        port: int,
-        database: str,
-        username: str,
-        password: str,
-        table_names: str | None = None
-) -> dict[str, Any] | None:
+def _get_engine(db_type: str, host: str, port: int, database: str, username: str, password: str) -> Engine:
     """
-    Get database table structure information
-    :param db_type: Database type (mysql/sqlserver/hologres)
-    :param host: Host address
-    :param port: Port number
-    :param database: Database name
-    :param username: Username
-    :param password: Password
-    :param table_names: Tables to query, comma-separated string, if None, query all tables
-    :return: Dictionary containing all table structure information
+    Get a pooled engine from the process-wide registry, creating it on first use
+    :return: Shared SQLAlchemy engine, callers must not dispose it
     """
-    result: dict[str, Any] = {}
-    # Build connection URL
     driver = {
         'mysql': 'pymysql',
         'sqlserver': 'pymssql',
@@ -36,203 +31,992 @@ def get_db_schema(
 
     encoded_username = quote_plus(username)
     encoded_password = quote_plus(password)
-    
+
     # Handle Hologres type, use PostgreSQL connection method
     actual_db_type = db_type.lower()
     if actual_db_type == 'hologres':
         actual_db_type = 'postgresql'
-    
-    # Create database engine
+
     connection_url = f'{actual_db_type}+{driver}://{encoded_username}:{encoded_password}@{host}:{port}/{database}'
-    
+
     # Add application_name parameter with version for PostgreSQL/Hologres
     if db_type.lower() == 'hologres' or db_type.lower() == 'postgresql':
         connection_url += f'?application_name=hologres_text2data_from_dify_v{APP_VERSION}'
-    
-    engine = create_engine(connection_url)
-    inspector = inspect(engine)
-
-    # SQL statements for getting column comments
-    column_comment_sql = {
-        'mysql': f"SELECT COLUMN_COMMENT FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = '{database}' AND TABLE_NAME = :table_name AND COLUMN_NAME = :column_name",
-        'sqlserver': "SELECT CAST(ep.value AS NVARCHAR(MAX)) FROM sys.columns c LEFT JOIN sys.extended_properties ep ON ep.major_id = c.object_id AND ep.minor_id = c.column_id WHERE OBJECT_NAME(c.object_id) = :table_name AND c.name = :column_name",
-        'hologres': """
-                SELECT
-                    d.description AS column_comment
-                FROM
-                    pg_class c
-                    LEFT JOIN pg_namespace n ON c.relnamespace = n.oid
-                    LEFT JOIN pg_attribute a ON c.oid = a.attrelid
-                    LEFT JOIN pg_description d ON a.attrelid = d.objoid AND a.attnum = d.objsubid
-                WHERE
-                    c.relkind IN ('r', 'f', 'v')
-                    AND a.attnum > 0
-                    AND NOT a.attisdropped
-                    AND n.nspname = :schema_name
-                    AND c.relname = :table_name 
-                    AND a.attname = :column_name
-                    AND n.nspname = :schema_name;
-        """
-    }.get(db_type.lower(), "")
 
-    try:
-        # Get all table names
-        all_tables = []
-        
-        # For PostgreSQL/Hologres, consider schema structure
-        if db_type.lower() == 'hologres' or db_type.lower() == 'postgresql':
-            # Get all schemas
-            schemas = inspector.get_schema_names()
-            # Exclude system schemas
-            excluded_schemas = ['pg_catalog', 'information_schema']
-            # For Hologres, exclude additional system schemas
-            if db_type.lower() == 'hologres':
-                excluded_schemas.extend(['hologres', 'hologres_statistic', 'hologres_streaming_mv'])
-            
-            schemas = [s for s in schemas if s not in excluded_schemas and not s.startswith('pg_')]
-            
-            # Get tables for each schema
-            for schema in schemas:
-                # Get regular tables
-                schema_tables = inspector.get_table_names(schema=schema)
-                all_tables.extend([f"{schema}.{table}" for table in schema_tables])
-                
-                # Get views
-                schema_views = inspector.get_view_names(schema=schema)
-                all_tables.extend([f"{schema}.{view}" for view in schema_views])
-                
-                # For Hologres, get partition tables and foreign tables with additional SQL query
-                if db_type.lower() == 'hologres' or db_type.lower() == 'postgresql':
-                    try:
-                        with engine.connect() as conn:
-                            # Query for partition parent tables and foreign tables
-                            special_tables_sql = text("""
-                                SELECT c.relname as table_name
-                                FROM pg_class c
-                                JOIN pg_namespace n ON c.relnamespace = n.oid
-                                WHERE n.nspname = :schema_name
-                                AND c.relkind IN ('p', 'f')  -- 'p' for partition parent tables, 'f' for foreign tables
-                                AND NOT EXISTS (
-                                    SELECT 1 FROM pg_inherits i
-                                    WHERE i.inhrelid = c.oid
-                                )
-                            """)
-                            # Modified: Use different variable name query_result instead of result
-                            query_result = conn.execute(special_tables_sql, {"schema_name": schema})
-                            # Fix: Access the first element of the tuple using index 0, or use keys() to get column names
-                            special_tables = []
-                            for row in query_result:
-                                if hasattr(row, '_mapping'):  # SQLAlchemy 1.4+
-                                    special_tables.append(row._mapping['table_name'])
-                                elif hasattr(row, 'keys'):  # Compatible with older versions
-                                    special_tables.append(row[row.keys().index('table_name')])
-                                else:  # Use index directly
-                                    special_tables.append(row[0])
-                            all_tables.extend([f"{schema}.{table}" for table in special_tables])
-                    except SQLAlchemyError as e:
-                        print(f"Warning: failed to get special tables for schema {schema}: {e}")
-        else:
-            # Other database types remain unchanged
-            all_tables = inspector.get_table_names()
+    key = connection_key(db_type, host, port, database, username, password)
+    return engine_registry.get_engine(key, connection_url)
 
-        # If table_names is specified, filter table names
-        target_tables = all_tables
+def connection_key(db_type: str, host: str, port: int, database: str, username: str, password: str) -> tuple:
+    """Identity of a database connection, keyed on a credential hash so the password itself is never kept"""
+    credential_hash = hashlib.sha256(password.encode('utf-8')).hexdigest()
+    return (db_type.lower(), host, int(port), database, username, credential_hash)
 
-        if table_names:
-            target_tables = [table.strip() for table in table_names.split(',')]
-            # Filter for tables that actually exist
-            target_tables = [table for table in target_tables if table in all_tables]
-        print(f"Retrieving table metadata for {len(target_tables)} tables...")
-        for table_name in target_tables:
-            # Handle table names that may include schema
-            schema_name = 'public'  # Default schema
-            actual_table_name = table_name
-            
-            if '.' in table_name and (db_type.lower() == 'hologres' or db_type.lower() == 'postgresql'):
-                schema_name, actual_table_name = table_name.split('.', 1)
-            
-            # Get table comments
-            table_comment = ""
-            try:
-                table_comment = inspector.get_table_comment(actual_table_name, schema=schema_name).get("text") or ""
-            except SQLAlchemyError as e:
-                raise ValueError(f"Failed to retrieve table comments: {str(e)}")
-
-            table_info = {
-                'comment': table_comment,
+# System schemas that never hold user tables on PostgreSQL/Hologres
+EXCLUDED_PG_SCHEMAS = [
+    'pg_catalog', 'information_schema',
+    'hologres', 'hologres_statistic', 'hologres_streaming_mv'
+]
+
+# Catalog reads one schema fetch runs at once on pooled connections; stays below the engine
+# pool size (POOL_SIZE + MAX_OVERFLOW) so statements of other calls still get a connection
+INTROSPECTION_WORKERS = 4
+# Tables read per unit of a parallel fetch, small schemas are bundled up to this size
+INTROSPECTION_CHUNK_TABLES = 500
+# Worker threads shared by every database, each blocks on one catalog query
+MAX_INTROSPECTION_THREADS = 16
+
+_introspection_executor = ThreadPoolExecutor(max_workers=MAX_INTROSPECTION_THREADS, thread_name_prefix='catalog-fetch')
+
+# Date suffixes marking a table as one shard of a family, events_20240101 or sales_2024_01;
+# the group captures the family prefix, which must end in a letter so ids are not taken for dates
+PG_SHARD_PATTERN = r'^(.*[^0-9_])_?(?:19|20)[0-9]{2}_?(?:0[1-9]|1[0-2])(?:_?(?:0[1-9]|[12][0-9]|3[01]))?$'
+
+# Relations presented to the model. Partition and inheritance children are left out, their parent
+# stands for them; of every family of at least :min_shards date-suffixed tables only the latest
+# shard is kept, with the size of the family. Shared by the tables, columns and probe queries so
+# skipped relations are never fetched nor probed. With :collapse false every relation is kept,
+# for reading tables asked for by name.
+PG_RELATIONS_CTE = """
+    WITH relations AS (
+        SELECT
+            c.oid,
+            c.relkind,
+            c.xmin AS relation_xmin,
+            n.nspname AS schema_name,
+            c.relname AS table_name,
+            substring(c.relname from :shard_pattern) AS shard_family
+        FROM pg_class c
+        JOIN pg_namespace n ON c.relnamespace = n.oid
+        WHERE n.nspname <> ALL(:excluded_schemas)
+        AND n.nspname NOT LIKE 'pg\\_%'
+        -- 'p' for partition parent tables, 'f' for foreign tables
+        AND c.relkind IN ('r', 'v', 'p', 'f')
+        AND (NOT :collapse OR NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid))
+    ),
+    visible AS (
+        SELECT * FROM (
+            SELECT
+                r.*,
+                count(*) OVER family AS shard_count,
+                min(r.table_name) OVER family AS first_shard,
+                row_number() OVER (family ORDER BY r.table_name DESC) AS shard_rank
+            FROM relations r
+            WINDOW family AS (
+                PARTITION BY r.schema_name, r.shard_family,
+                    CASE WHEN r.shard_family IS NULL THEN r.table_name END
+            )
+        ) ranked
+        WHERE NOT :collapse OR ranked.shard_rank = 1 OR ranked.shard_count < :min_shards
+    )
+"""
+
+# Bulk catalog queries: one round trip for tables and one for columns per database
+PG_TABLES_SQL = PG_RELATIONS_CTE + """
+    SELECT
+        v.schema_name,
+        v.table_name,
+        obj_description(v.oid, 'pg_class') AS table_comment,
+        CASE WHEN v.relkind = 'p' THEN pg_get_partkeydef(v.oid) END AS partition_key,
+        p.partition_count,
+        p.first_bound,
+        p.last_bound,
+        CASE WHEN :collapse AND v.shard_count >= :min_shards THEN v.shard_count END AS shard_count,
+        v.first_shard
+    FROM visible v
+    -- Bounds compare as text, which orders the date-like keys partitions are normally cut by
+    LEFT JOIN (
+        SELECT
+            b.parent_oid,
+            count(*) AS partition_count,
+            min(NULLIF(b.bound, 'DEFAULT')) AS first_bound,
+            max(NULLIF(b.bound, 'DEFAULT')) AS last_bound
+        FROM (
+            SELECT i.inhparent AS parent_oid, pg_get_expr(pc.relpartbound, pc.oid) AS bound
+            FROM pg_inherits i
+            JOIN pg_class pc ON pc.oid = i.inhrelid
+            WHERE i.inhparent IN (SELECT oid FROM visible WHERE relkind = 'p')
+        ) b
+        GROUP BY b.parent_oid
+    ) p ON p.parent_oid = v.oid
+    WHERE true
+    {table_filter}
+    ORDER BY v.schema_name, v.table_name
+"""
+
+PG_COLUMNS_SQL = PG_RELATIONS_CTE + """
+    SELECT
+        v.schema_name,
+        v.table_name,
+        a.attname AS column_name,
+        format_type(a.atttypid, a.atttypmod) AS column_type,
+        d.description AS column_comment
+    FROM visible v
+    JOIN pg_attribute a ON a.attrelid = v.oid
+    LEFT JOIN pg_description d
+        ON d.objoid = a.attrelid AND d.objsubid = a.attnum AND d.classoid = 'pg_class'::regclass
+    WHERE a.attnum > 0
+    AND NOT a.attisdropped
+    {table_filter}
+    ORDER BY v.schema_name, v.table_name, a.attnum
+"""
+
+MYSQL_TABLES_SQL = """
+    SELECT TABLE_NAME AS table_name, TABLE_COMMENT AS table_comment
+    FROM information_schema.TABLES
+    WHERE TABLE_SCHEMA = :database AND TABLE_TYPE = 'BASE TABLE'
+    {table_filter}
+    ORDER BY TABLE_NAME
+"""
+
+MYSQL_COLUMNS_SQL = """
+    SELECT TABLE_NAME AS table_name, COLUMN_NAME AS column_name,
+        UPPER(COLUMN_TYPE) AS column_type, COLUMN_COMMENT AS column_comment
+    FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = :database
+    {table_filter}
+    ORDER BY TABLE_NAME, ORDINAL_POSITION
+"""
+
+SQLSERVER_TABLES_SQL = """
+    SELECT t.name AS table_name, CAST(ep.value AS NVARCHAR(MAX)) AS table_comment
+    FROM sys.tables t
+    LEFT JOIN sys.extended_properties ep
+        ON ep.major_id = t.object_id AND ep.minor_id = 0 AND ep.name = 'MS_Description'
+    WHERE t.schema_id = SCHEMA_ID()
+    {table_filter}
+    ORDER BY t.name
+"""
+
+SQLSERVER_COLUMNS_SQL = """
+    SELECT t.name AS table_name, c.name AS column_name,
+        UPPER(ty.name) AS column_type, CAST(ep.value AS NVARCHAR(MAX)) AS column_comment
+    FROM sys.columns c
+    JOIN sys.tables t ON t.object_id = c.object_id
+    JOIN sys.types ty ON ty.user_type_id = c.user_type_id
+    LEFT JOIN sys.extended_properties ep
+        ON ep.major_id = c.object_id AND ep.minor_id = c.column_id AND ep.name = 'MS_Description'
+    WHERE t.schema_id = SCHEMA_ID()
+    {table_filter}
+    ORDER BY t.name, c.column_id
+"""
+
+# Table count per user schema, used to split a PostgreSQL/Hologres fetch into units
+PG_SCHEMAS_SQL = """
+    SELECT n.nspname AS schema_name, count(*) AS table_count
+    FROM pg_class c
+    JOIN pg_namespace n ON c.relnamespace = n.oid
+    WHERE n.nspname <> ALL(:excluded_schemas)
+    AND n.nspname NOT LIKE 'pg\\_%'
+    AND c.relkind IN ('r', 'v', 'p', 'f')
+    AND NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid)
+    GROUP BY n.nspname
+    ORDER BY count(*) DESC, n.nspname
+"""
+
+# Declared foreign keys, used to pull related tables into a pruned prompt
+PG_REFERENCES_SQL = """
+    SELECT DISTINCT
+        sn.nspname AS schema_name,
+        sc.relname AS table_name,
+        tn.nspname || '.' || tc.relname AS ref_table_name
+    FROM pg_constraint con
+    JOIN pg_class sc ON sc.oid = con.conrelid
+    JOIN pg_namespace sn ON sn.oid = sc.relnamespace
+    JOIN pg_class tc ON tc.oid = con.confrelid
+    JOIN pg_namespace tn ON tn.oid = tc.relnamespace
+    WHERE con.contype = 'f'
+    AND sn.nspname <> ALL(:excluded_schemas)
+    {table_filter}
+"""
+
+MYSQL_REFERENCES_SQL = """
+    SELECT DISTINCT TABLE_NAME AS table_name, REFERENCED_TABLE_NAME AS ref_table_name
+    FROM information_schema.KEY_COLUMN_USAGE
+    WHERE TABLE_SCHEMA = :database AND REFERENCED_TABLE_NAME IS NOT NULL
+    {table_filter}
+"""
+
+SQLSERVER_REFERENCES_SQL = """
+    SELECT DISTINCT OBJECT_NAME(fk.parent_object_id) AS table_name,
+        OBJECT_NAME(fk.referenced_object_id) AS ref_table_name
+    FROM sys.foreign_keys fk
+    WHERE fk.schema_id = SCHEMA_ID()
+    {table_filter}
+"""
+
+# Change probes: one cheap signature per table, compared against the cached one
+PG_SIGNATURES_SQL = PG_RELATIONS_CTE + """
+    SELECT
+        v.schema_name,
+        v.table_name,
+        v.relation_xmin::text
+            || ':' || COALESCE((
+                SELECT max(a.xmin::text::bigint)::text FROM pg_attribute a WHERE a.attrelid = v.oid
+            ), '')
+            || ':' || COALESCE((
+                SELECT string_agg(d.xmin::text, ',' ORDER BY d.objsubid)
+                FROM pg_description d
+                WHERE d.objoid = v.oid AND d.classoid = 'pg_class'::regclass
+            ), '')
+            -- Attaching or dropping a partition changes the parent's partition summary
+            || ':' || (
+                SELECT count(*)::text || '/' || COALESCE(max(i.inhrelid::bigint)::text, '')
+                FROM pg_inherits i
+                WHERE i.inhparent = v.oid
+            )
+            || ':' || v.shard_count::text || ':' || v.first_shard AS signature
+    FROM visible v
+"""
+
+MYSQL_SIGNATURES_SQL = """
+    SELECT t.TABLE_NAME AS table_name,
+        CONCAT(CRC32(t.TABLE_COMMENT), ':', COUNT(c.COLUMN_NAME), ':',
+            COALESCE(SUM(CRC32(CONCAT_WS('|', c.ORDINAL_POSITION, c.COLUMN_NAME, c.COLUMN_TYPE, c.COLUMN_COMMENT))), 0)
+        ) AS signature
+    FROM information_schema.TABLES t
+    LEFT JOIN information_schema.COLUMNS c
+        ON c.TABLE_SCHEMA = t.TABLE_SCHEMA AND c.TABLE_NAME = t.TABLE_NAME
+    WHERE t.TABLE_SCHEMA = :database AND t.TABLE_TYPE = 'BASE TABLE'
+    GROUP BY t.TABLE_NAME, t.TABLE_COMMENT
+"""
+
+SQLSERVER_SIGNATURES_SQL = """
+    SELECT t.name AS table_name,
+        CONVERT(VARCHAR(33), t.modify_date, 126) + ':'
+            + CAST(ISNULL(CHECKSUM_AGG(CHECKSUM(ep.minor_id, CAST(ep.value AS NVARCHAR(4000)))), 0) AS VARCHAR(12))
+            AS signature
+    FROM sys.tables t
+    LEFT JOIN sys.extended_properties ep
+        ON ep.major_id = t.object_id AND ep.name = 'MS_Description'
+    WHERE t.schema_id = SCHEMA_ID()
+    GROUP BY t.name, t.modify_date
+"""
+
+# PostgreSQL catalog type names mapped to the names SQLAlchemy reflection reports
+PG_TYPE_NAMES = {
+    'character varying': 'VARCHAR',
+    'character': 'CHAR',
+    'timestamp without time zone': 'TIMESTAMP',
+    'timestamp with time zone': 'TIMESTAMP',
+    'time without time zone': 'TIME',
+    'time with time zone': 'TIME',
+    'double precision': 'DOUBLE PRECISION',
+}
+
+def _normalize_pg_type(type_name: str) -> str:
+    """Turn a format_type() result such as 'character varying(20)' into 'VARCHAR(20)'"""
+    base, sep, modifier = type_name.partition('(')
+    # Array types are reported as e.g. 'integer[]'
+    suffix = ''
+    if not sep and base.endswith('[]'):
+        base, suffix = base[:-2], '[]'
+    base = PG_TYPE_NAMES.get(base.strip(), base.strip().upper())
+    return f"{base}{sep}{modifier}{suffix}"
+
+_PARTITION_BOUND_RE = re.compile(r"^FOR VALUES (?:IN|FROM) \((.*?)\)(?: TO \((.*)\))?$")
+
+def _partition_range(first_bound: str | None, last_bound: str | None) -> str:
+    """Summarize the lowest and highest partition bound, FOR VALUES IN ('20240101') as '20240101'"""
+    first = _PARTITION_BOUND_RE.match(first_bound or '')
+    last = _PARTITION_BOUND_RE.match(last_bound or '')
+    if not first or not last:
+        return ''
+    # A range partition covers up to its TO bound
+    return f"{first.group(1)}..{last.group(2) or last.group(1)}"
+
+def _catalog_statement(
+        sql: str,
+        name_column: str,
+        tables: list[str] | None,
+        schema_column: str | None = None,
+        schemas: list[str] | None = None
+) -> Any:
+    """Build a catalog query, optionally restricted to the given table names and schemas"""
+    filters = []
+    params = []
+    if tables is not None:
+        filters.append(f"AND {name_column} IN :table_names")
+        params.append(bindparam('table_names', expanding=True))
+    if schemas is not None:
+        filters.append(f"AND {schema_column} IN :schema_names")
+        params.append(bindparam('schema_names', expanding=True))
+    statement = text(sql.format(table_filter=' '.join(filters)))
+    return statement.bindparams(*params) if params else statement
+
+def _fetch_schema_bulk(
+        conn: Any,
+        db_type: str,
+        database: str = '',
+        tables: list[str] | None = None,
+        schemas: list[str] | None = None,
+        collapse: bool = True
+) -> dict[str, Any]:
+    """
+    Read tables, columns, types and comments with set-based catalog queries
+    :param conn: Open SQLAlchemy connection
+    :param db_type: Database type (mysql/sqlserver/hologres/postgresql)
+    :param database: Database name, used by MySQL to scope information_schema
+    :param tables: Table names to read, if None, read every table of the database
+    :param schemas: PostgreSQL/Hologres only, restrict the read to these schemas
+    :param collapse: PostgreSQL/Hologres only, leave out partition children and older shards;
+                     False reads tables named in tables whatever they are
+    :return: Dictionary keyed by table name, in the shape consumed by format_schema_dsl,
+             tables with declared foreign keys also carry a 'references' list of referenced table names;
+             on PostgreSQL/Hologres partitioned tables carry a 'partition' summary and the latest shard
+             of a date-sharded family a 'shards' summary, the other partitions and shards are left out
+    """
+    schema: dict[str, Any] = {}
+    if tables is not None and not tables:
+        return schema
+    if db_type in ('hologres', 'postgresql'):
+        params = {
+            'excluded_schemas': EXCLUDED_PG_SCHEMAS,
+            'shard_pattern': PG_SHARD_PATTERN,
+            'min_shards': MIN_SHARD_GROUP,
+            'collapse': collapse
+        }
+        if tables is not None:
+            params['table_names'] = tables
+        if schemas is not None:
+            params['schema_names'] = schemas
+        name_column = "(v.schema_name || '.' || v.table_name)"
+        for row in conn.execute(_catalog_statement(PG_TABLES_SQL, name_column, tables, 'v.schema_name', schemas), params):
+            table_info = schema[f"{row.schema_name}.{row.table_name}"] = {
+                'comment': row.table_comment or "",
                 'columns': []
             }
+            if row.partition_key:
+                table_info['partition'] = {
+                    'key': row.partition_key,
+                    'count': row.partition_count or 0,
+                    'range': _partition_range(row.first_bound, row.last_bound)
+                }
+            if row.shard_count:
+                table_info['shards'] = {'count': row.shard_count, 'first': row.first_shard, 'last': row.table_name}
+        for row in conn.execute(_catalog_statement(PG_COLUMNS_SQL, name_column, tables, 'v.schema_name', schemas), params):
+            table_info = schema.get(f"{row.schema_name}.{row.table_name}")
+            if table_info is not None:
+                table_info['columns'].append({
+                    'name': row.column_name,
+                    'comment': row.column_comment or "",
+                    'type': _normalize_pg_type(row.column_type)
+                })
+        pg_references_name = "(sn.nspname || '.' || sc.relname)"
+        references_statement = _catalog_statement(PG_REFERENCES_SQL, pg_references_name, tables, 'sn.nspname', schemas)
+        for row in conn.execute(references_statement, params):
+            table_info = schema.get(f"{row.schema_name}.{row.table_name}")
+            if table_info is not None:
+                table_info.setdefault('references', []).append(row.ref_table_name)
+        return schema
 
-            for column in inspector.get_columns(actual_table_name, schema=schema_name):
-                # Get column comments
-                column_comment = ""
+    tables_sql, columns_sql, references_sql, name_column, references_name = {
+        'mysql': (MYSQL_TABLES_SQL, MYSQL_COLUMNS_SQL, MYSQL_REFERENCES_SQL, 'TABLE_NAME', 'TABLE_NAME'),
+        'sqlserver': (
+            SQLSERVER_TABLES_SQL, SQLSERVER_COLUMNS_SQL, SQLSERVER_REFERENCES_SQL,
+            't.name', 'OBJECT_NAME(fk.parent_object_id)'
+        ),
+    }.get(db_type, (None, None, None, None, None))
+    if tables_sql is None:
+        raise ValueError(f"Unsupported database type: {db_type}")
+    params: dict[str, Any] = {'database': database}
+    if tables is not None:
+        params['table_names'] = tables
+    for row in conn.execute(_catalog_statement(tables_sql, name_column, tables), params):
+        schema[row.table_name] = {'comment': row.table_comment or "", 'columns': []}
+    for row in conn.execute(_catalog_statement(columns_sql, name_column, tables), params):
+        table_info = schema.get(row.table_name)
+        if table_info is not None:
+            table_info['columns'].append({
+                'name': row.column_name,
+                'comment': row.column_comment or "",
+                'type': row.column_type
+            })
+    for row in conn.execute(_catalog_statement(references_sql, references_name, tables), params):
+        table_info = schema.get(row.table_name)
+        if table_info is not None:
+            table_info.setdefault('references', []).append(row.ref_table_name)
+    return schema
+
+def _group_schemas(table_counts: list[tuple[str, int]], chunk_tables: int) -> list[list[str]]:
+    """Bundle schemas into units of about chunk_tables tables, largest first so big schemas start early"""
+    units: list[list[str]] = []
+    current: list[str] = []
+    current_tables = 0
+    for schema_name, table_count in sorted(table_counts, key=lambda item: -item[1]):
+        current.append(schema_name)
+        current_tables += table_count
+        if current_tables >= chunk_tables:
+            units.append(current)
+            current, current_tables = [], 0
+    if current:
+        units.append(current)
+    return units
+
+def _fetch_schema_parallel(
+        engine: Engine,
+        db_type: str,
+        database: str = '',
+        tables: list[str] | None = None,
+        max_workers: int = INTROSPECTION_WORKERS,
+        chunk_tables: int = INTROSPECTION_CHUNK_TABLES
+) -> dict[str, Any]:
+    """
+    Read the schema like _fetch_schema_bulk, split into units fanned out over pooled connections.
+    Units are groups of schemas on PostgreSQL/Hologres, or chunks of the requested table names.
+    A unit that fails is reported and skipped, so the result only lacks the tables it covered;
+    the error is raised when every unit fails.
+    :param engine: Pooled engine of the database
+    :param max_workers: Catalog queries running at once, 1 reads everything on one connection
+    :param chunk_tables: Tables per unit
+    :return: Dictionary keyed by table name, as returned by _fetch_schema_bulk
+    """
+    if tables is not None and not tables:
+        return {}
+    with engine.connect() as conn:
+        if tables is not None:
+            names = sorted(tables)
+            units = [
+                {'tables': names[start:start + chunk_tables]}
+                for start in range(0, len(names), chunk_tables)
+            ]
+        elif db_type in ('hologres', 'postgresql') and max_workers > 1:
+            rows = conn.execute(text(PG_SCHEMAS_SQL), {'excluded_schemas': EXCLUDED_PG_SCHEMAS})
+            units = [{'schemas': group} for group in _group_schemas([tuple(row) for row in rows], chunk_tables)]
+        else:
+            # MySQL and SQL Server read a single schema, it has nothing to split by until names are known
+            units = [{}]
+        if len(units) <= 1 or max_workers <= 1:
+            annotate(units=1, workers=1)
+            return _fetch_schema_bulk(conn, db_type, database, tables)
+
+    # Workers pull units from a shared iterator, each holding one pooled connection throughout
+    pending = iter(enumerate(units))
+    parts: list[dict[str, Any]] = [{} for _ in units]
+    errors: list[SQLAlchemyError] = []
+    lock = threading.Lock()
+
+    def work() -> None:
+        with engine.connect() as conn:
+            while True:
+                with lock:
+                    index, unit = next(pending, (None, None))
+                if unit is None:
+                    return
                 try:
-                    with engine.connect() as conn:
-                        stmt = text(column_comment_sql)
-                        params = {
-                            'table_name': actual_table_name,
-                            'column_name': column['name']
-                        }
-                        # Add schema parameter for PostgreSQL/Hologres
-                        if db_type.lower() == 'hologres' or db_type.lower() == 'postgresql':
-                            params['schema_name'] = schema_name
-                            
-                        column_comment = conn.execute(stmt, params).scalar() or ""
+                    parts[index] = _fetch_schema_bulk(conn, db_type, database, unit.get('tables'), unit.get('schemas'))
                 except SQLAlchemyError as e:
-                    print(f"Warning: failed to get comment for {table_name}.{column['name']} - {e}")
-                    column_comment = ""
+                    covered = f"schemas {', '.join(unit['schemas'])}" if 'schemas' in unit else f"{len(unit['tables'])} tables"
+                    print(f"Warning: skipped metadata of {covered}: {e}")
+                    with lock:
+                        errors.append(e)
+                    # Leave the failed transaction so the connection can serve the next unit
+                    conn.rollback()
 
-                table_info['columns'].append({
-                    'name': column['name'],
-                    'comment': column_comment,
-                    'type': str(column['type'])
-                })
+    workers = min(max_workers, len(units), MAX_INTROSPECTION_THREADS)
+    futures = [_introspection_executor.submit(work) for _ in range(workers)]
+    for future in futures:
+        future.result()
+    annotate(units=len(units), workers=workers, failed_units=len(errors))
+    if len(errors) == len(units):
+        raise errors[0]
+
+    schema: dict[str, Any] = {}
+    for part in parts:
+        schema.update(part)
+    # Units finish in any order, restore the (schema, table) order of a single bulk read
+    return dict(sorted(schema.items(), key=lambda item: item[0].partition('.')[::2]))
 
-            result[table_name] = table_info
+def _probe_schema_signatures(conn: Any, db_type: str, database: str = '') -> dict[str, str]:
+    """
+    Cheap change probe returning one signature per table, used to invalidate the schema cache incrementally
+    :return: Dictionary of table name to signature, keyed like _fetch_schema_bulk
+    """
+    if db_type in ('hologres', 'postgresql'):
+        rows = conn.execute(text(PG_SIGNATURES_SQL), {
+            'excluded_schemas': EXCLUDED_PG_SCHEMAS,
+            'shard_pattern': PG_SHARD_PATTERN,
+            'min_shards': MIN_SHARD_GROUP,
+            'collapse': True
+        })
+        return {f"{row.schema_name}.{row.table_name}": row.signature for row in rows}
+    signatures_sql = {
+        'mysql': MYSQL_SIGNATURES_SQL,
+        'sqlserver': SQLSERVER_SIGNATURES_SQL,
+    }.get(db_type)
+    if signatures_sql is None:
+        raise ValueError(f"Unsupported database type: {db_type}")
+    rows = conn.execute(text(signatures_sql), {'database': database})
+    return {row.table_name: str(row.signature) for row in rows}
+
+def get_db_schema(
+        db_type: str,
+        host: str,
+        port: int,
+        database: str,
+        username: str,
+        password: str,
+        table_names: str | None = None,
+        use_cache: bool = True,
+        cache_ttl: float | None = None,
+        storage: Any = None,
+        max_workers: int = INTROSPECTION_WORKERS
+) -> dict[str, Any] | None:
+    """
+    Get database table structure information
+    :param db_type: Database type (mysql/sqlserver/hologres)
+    :param host: Host address
+    :param port: Port number
+    :param database: Database name
+    :param username: Username
+    :param password: Password
+    :param table_names: Tables to query, comma-separated string, if None, query all tables
+    :param use_cache: Whether to serve metadata from the process-wide schema cache
+    :param cache_ttl: Seconds a cached schema is trusted before the change probe runs, defaults to SCHEMA_CACHE_TTL
+    :param storage: Optional plugin storage (session.storage) used to persist the schema cache
+    :param max_workers: Catalog queries run at once when reading many schemas or tables, 1 reads serially
+    :return: Dictionary containing all table structure information, shared with the schema cache so callers must not modify it
+    """
+    result: dict[str, Any] = {}
+    actual_db_type = db_type.lower()
+    engine = _get_engine(db_type, host, port, database, username, password)
+
+    def probe() -> dict[str, str]:
+        with span('catalog_probe'), engine.connect() as conn:
+            return _probe_schema_signatures(conn, actual_db_type, database)
+
+    def fetch(tables: list[str] | None) -> dict[str, Any]:
+        with span('catalog_fetch', tables=len(tables) if tables is not None else 'all'):
+            return _fetch_schema_parallel(engine, actual_db_type, database, tables, max_workers)
+
+    try:
+        if use_cache:
+            key = connection_key(db_type, host, port, database, username, password)
+            all_schema = schema_cache.get_schema(key, probe, fetch, storage=storage, ttl=cache_ttl)
+        else:
+            all_schema = fetch(None)
+
+        if not table_names:
+            # Hand out the cached dict itself, so indexes derived from it can be reused across calls
+            annotate(tables=len(all_schema))
+            return all_schema
+
+        # If table_names is specified, filter table names
+        target_tables = [table.strip() for table in table_names.split(',') if table.strip()]
+        missing = [table for table in target_tables if table not in all_schema]
+        if missing and actual_db_type in ('hologres', 'postgresql'):
+            # Partition children and older shards are left out of the cached schema, read them by name
+            with span('catalog_fetch', tables=len(missing)), engine.connect() as conn:
+                direct = _fetch_schema_bulk(conn, actual_db_type, database, missing, collapse=False)
+        else:
+            direct = {}
+        for table_name in target_tables:
+            table_info = all_schema.get(table_name) or direct.get(table_name)
+            if table_info is not None:
+                result[table_name] = table_info
+        not_found = [table for table in target_tables if table not in result]
+        if not_found:
+            print(f"Warning: tables not found in the database: {', '.join(not_found)}")
+        annotate(tables=len(result))
         return result
     except SQLAlchemyError as e:
         raise ValueError(f"Failed to retrieve database table metadata: {str(e)}")
-    finally:
-        engine.dispose()
 
-def format_schema_dsl(schema: dict[str, Any], with_type: bool = True, with_comment: bool = False) -> str:
+# Short type names used in the schema DSL, explained to the model in base_prompt.jinja
+TYPE_ALIASES = {
+    'INTEGER': 'i', 'INT': 'i', 'BIGINT': 'i', 'SMALLINT': 'i', 'TINYINT': 'i', 'MEDIUMINT': 'i',
+    'INT2': 'i', 'INT4': 'i', 'INT8': 'i', 'SERIAL': 'i', 'BIGSERIAL': 'i',
+    'VARCHAR': 's', 'TEXT': 's', 'CHAR': 's', 'NVARCHAR': 's', 'NCHAR': 's', 'NTEXT': 's',
+    'DATETIME': 'dt', 'TIMESTAMP': 'dt', 'DATE': 'dt', 'TIMESTAMPTZ': 'dt', 'DATETIME2': 'dt', 'SMALLDATETIME': 'dt',
+    'DECIMAL': 'f', 'NUMERIC': 'f', 'FLOAT': 'f', 'DOUBLE': 'f', 'DOUBLE PRECISION': 'f', 'REAL': 'f',
+    'FLOAT4': 'f', 'FLOAT8': 'f', 'MONEY': 'f',
+    'BOOLEAN': 'b', 'BOOL': 'b', 'BIT': 'b',
+    'JSON': 'j', 'JSONB': 'j'
+}
+# Comments longer than this are cut when the compact DSL is over its token budget
+MAX_COMMENT_LENGTH = 40
+# Shards/partitions with at least this many identical siblings are written as a name range
+MIN_SHARD_GROUP = 3
+_SHARD_SUFFIX_RE = re.compile(r'^(.*?)(\d+)$')
+
+def _format_column(col: dict[str, Any], with_type: bool, with_comment: bool, max_comment_length: int | None) -> str:
+    parts = [col['name']]
+    if with_type:
+        raw_type = col['type'].split('(')[0].upper()
+        parts.append(TYPE_ALIASES.get(raw_type, raw_type.lower()))
+    if with_comment and col.get('comment'):
+        parts.append(f"# {_truncate(col['comment'], max_comment_length)}")
+    return ":".join(parts)
+
+def _truncate(comment: str, max_length: int | None) -> str:
+    comment = ' '.join(comment.split())
+    if max_length is None or len(comment) <= max_length:
+        return comment
+    return comment[:max_length] + '…'
+
+def _format_layout(table_data: dict[str, Any]) -> str:
+    """Partition or shard summary written after the column list of a table standing in for many"""
+    partition = table_data.get('partition')
+    if partition:
+        bounds = f": {partition['range']}" if partition.get('range') else ''
+        return f" PARTITION BY {partition['key']}[{partition['count']}{bounds}]"
+    shards = table_data.get('shards')
+    if shards:
+        return f" SHARDS {shards['first']}..{shards['last']}[{shards['count']}]"
+    return ''
+
+def _group_table_names(names: list[str]) -> str:
+    """Write tables sharing one column set, collapsing name_0001..name_0031 style shards into a range"""
+    if len(names) == 1:
+        return names[0]
+    by_prefix: dict[str, list[tuple[str, str]]] = {}
+    loose = []
+    for name in names:
+        match = _SHARD_SUFFIX_RE.match(name)
+        if match:
+            by_prefix.setdefault(match.group(1), []).append((match.group(2), name))
+        else:
+            loose.append(name)
+    parts = []
+    for prefix, members in by_prefix.items():
+        members.sort(key=lambda member: int(member[0]))
+        # Only runs of consecutive suffixes become a range, a range over a gap would name tables that do not exist
+        runs = [[members[0]]]
+        for member in members[1:]:
+            if int(member[0]) == int(runs[-1][-1][0]) + 1:
+                runs[-1].append(member)
+            else:
+                runs.append([member])
+        for run in runs:
+            if len(run) >= MIN_SHARD_GROUP:
+                parts.append(f"{prefix}{{{run[0][0]}..{run[-1][0]}}}[{len(run)}]")
+            else:
+                loose.extend(name for _, name in run)
+    return "|".join(parts + sorted(loose))
+
+def format_schema_dsl(
+        schema: dict[str, Any],
+        with_type: bool = True,
+        with_comment: bool = False,
+        compact: bool = False,
+        max_comment_length: int | None = None
+) -> str:
     """
     Compress database table structure into DSL format
     :param schema: Structure returned by get_db_schema
     :param with_type: Whether to keep field types
     :param with_comment: Whether to keep field comments
+    :param compact: Group tables under S:<schema> lines and write tables with identical columns once
+    :param max_comment_length: Cut comments longer than this, None keeps them whole
     :return: Compressed DSL string
     """
-    type_aliases = {
-        'INTEGER': 'i', 'INT': 'i', 'BIGINT': 'i', 'SMALLINT': 'i', 'TINYINT': 'i',
-        'VARCHAR': 's', 'TEXT': 's', 'CHAR': 's',
-        'DATETIME': 'dt', 'TIMESTAMP': 'dt', 'DATE': 'dt',
-        'DECIMAL': 'f', 'NUMERIC': 'f', 'FLOAT': 'f', 'DOUBLE': 'f',
-        'BOOLEAN': 'b', 'BOOL': 'b',
-        'JSON': 'j'
-    }
+    if compact:
+        return _format_compact_dsl(schema, with_type, with_comment, max_comment_length)
     lines = []
     for table_name, table_data in schema.items():
-        column_parts = []
-
-        for col in table_data['columns']:
-            parts = [col['name']]
-            if with_type:
-                raw_type = col['type'].split('(')[0].upper()
-                col_type = type_aliases.get(raw_type, raw_type.lower())
-                parts.append(col_type)
-            if with_comment and col.get('comment'):
-                parts.append(f"# {col['comment']}")
-            column_parts.append(":".join(parts))
+        column_parts = [
+            _format_column(col, with_type, with_comment, max_comment_length)
+            for col in table_data['columns']
+        ]
 
         # Build table comment
         if with_comment and table_data.get('comment'):
-            lines.append(f"# {table_data['comment']}")
-        lines.append(f"T:{table_name}({', '.join(column_parts)})")
+            lines.append(f"# {_truncate(table_data['comment'], max_comment_length)}")
+        lines.append(f"T:{table_name}({', '.join(column_parts)}){_format_layout(table_data)}")
 
     return "\n".join(lines)
 
-def execute_sql(
+def _format_compact_dsl(schema: dict[str, Any], with_type: bool, with_comment: bool, max_comment_length: int | None) -> str:
+    # schema name -> column text -> (table comment, table names)
+    grouped: dict[str, dict[str, tuple[str, list[str]]]] = {}
+    for table_name, table_data in schema.items():
+        schema_name, _, short_name = table_name.rpartition('.')
+        column_parts = [
+            _format_column(col, with_type, with_comment, max_comment_length)
+            for col in table_data['columns']
+        ]
+        if table_data.get('truncated_columns'):
+            column_parts.append('...')
+        # The layout summary is part of the key, only plain tables share one line
+        column_text = f"({', '.join(column_parts)}){_format_layout(table_data)}"
+        tables = grouped.setdefault(schema_name, {})
+        if column_text in tables:
+            tables[column_text][1].append(short_name)
+        else:
+            tables[column_text] = (table_data.get('comment') or '', [short_name])
+
+    lines = []
+    for schema_name, tables in grouped.items():
+        if schema_name:
+            lines.append(f"S:{schema_name}")
+        for column_text, (comment, names) in tables.items():
+            if with_comment and comment:
+                lines.append(f"# {_truncate(comment, max_comment_length)}")
+            lines.append(f"T:{_group_table_names(names)}{column_text}")
+    return "\n".join(lines)
+
+def _trim_columns(schema: dict[str, Any], max_columns: int, query: str | None) -> dict[str, Any]:
+    """Keep the max_columns columns of each table that best match the question, in their original order"""
+    query_terms = set(tokenize(query)) if query else set()
+    trimmed = {}
+    for table_name, table_data in schema.items():
+        columns = table_data['columns']
+        if len(columns) <= max_columns:
+            trimmed[table_name] = table_data
+            continue
+
+        def relevance(item: tuple[int, dict[str, Any]]) -> tuple[int, int]:
+            index, col = item
+            terms = set(tokenize(f"{col['name']} {col.get('comment') or ''}"))
+            score = 2 * len(terms & query_terms)
+            # Join keys are needed whatever the question is
+            if col['name'].lower() == 'id' or col['name'].lower().endswith('_id'):
+                score += 1
+            return (-score, index)
+
+        kept = sorted(sorted(enumerate(columns), key=relevance)[:max_columns])
+        trimmed[table_name] = dict(
+            table_data,
+            columns=[col for _, col in kept],
+            truncated_columns=len(columns) - max_columns
+        )
+    return trimmed
+
+def fit_schema_dsl(
+        schema: dict[str, Any],
+        token_budget: int,
+        with_type: bool = True,
+        with_comment: bool = False,
+        query: str | None = None
+) -> tuple[str, int]:
+    """
+    Encode the schema in compact DSL within a token budget, degrading step by step:
+    shorten comments, drop them, then types, then the columns least relevant to the question
+    :param schema: Structure returned by get_db_schema
+    :param token_budget: Target estimated token count
+    :param with_type: Whether to keep field types if they fit
+    :param with_comment: Whether to keep comments if they fit
+    :param query: Natural language question, used to rank columns when some must go
+    :return: Tuple of (DSL string, estimated token count); the smallest encoding if nothing fits
+    """
+    # Comments are only cut short once the schema with whole comments does not fit
+    attempts = [(with_type, with_comment, None)]
+    if with_comment:
+        attempts.append((with_type, True, MAX_COMMENT_LENGTH))
+    attempts += [(with_type, False, None), (False, False, None)]
+    dsl = ''
+    tokens = 0
+    for keep_type, keep_comment, max_comment_length in dict.fromkeys(attempts):
+        dsl = format_schema_dsl(schema, keep_type, keep_comment, compact=True, max_comment_length=max_comment_length)
+        tokens = estimate_tokens(dsl)
+        if tokens <= token_budget:
+            return dsl, tokens
+
+    max_columns = max((len(table_data['columns']) for table_data in schema.values()), default=0)
+    while max_columns > 1:
+        max_columns //= 2
+        dsl = format_schema_dsl(_trim_columns(schema, max_columns, query), False, False, compact=True)
+        tokens = estimate_tokens(dsl)
+        if tokens <= token_budget:
+            break
+    return dsl, tokens
+
+# Streaming defaults: rows fetched per round trip and hard caps on what one call may return.
+# The byte cap applies to the encoded output; a JSON message is decoded into Python objects
+# several times its size once complete, which has to stay well under the plugin's 256 MB
+STREAM_BATCH_SIZE = 1000
+MAX_RESULT_ROWS = 100000
+MAX_RESULT_BYTES = 8 * 1024 * 1024
+
+def _declared_scales(result: Any) -> list[int | None]:
+    """Numeric scale the cursor declares per column, None where the driver or the column type does not say"""
+    description = getattr(getattr(result, 'cursor', None), 'description', None) or []
+    return [column[5] if len(column) > 5 and isinstance(column[5], int) else None for column in description]
+
+class QueryResult:
+    """
+    Fully fetched statement result with the interface of StreamedResult, so the same formatters serve both.
+    Column names are held once and rows as plain tuples, rather than one dict per row.
+    """
+
+    def __init__(
+            self,
+            keys: list[str],
+            rows: list[tuple],
+            truncated: bool = False,
+            rowcount: int | None = None,
+            batch_size: int = STREAM_BATCH_SIZE,
+            scales: list[int | None] | None = None
+    ):
+        self.returns_rows = rowcount is None
+        self.keys = keys
+        self.rows = rows
+        # Numeric scale declared per column, None when not known
+        self.scales = scales
+        # Affected rows of a non-query statement
+        self.rowcount = rowcount
+        self.row_count = len(rows)
+        self.truncated = truncated
+        self.batch_size = batch_size
+
+    @classmethod
+    def fetch(cls, result: Any, max_rows: int | None = None) -> 'QueryResult':
+        """
+        Read an executed statement into a QueryResult
+        :param result: SQLAlchemy CursorResult
+        :param max_rows: Rows to keep, one more is read to tell whether the result was cut; None for all
+        """
+        if not result.returns_rows:
+            return cls([], [], rowcount=result.rowcount)
+        # Read before iterating, an exhausted result releases its cursor
+        scales = _declared_scales(result)
+        # Converting while iterating lets each Row object go as soon as it is read, no list of them is built
+        rows = [tuple(row) for row in itertools.islice(result, None if max_rows is None else max_rows + 1)]
+        truncated = max_rows is not None and len(rows) > max_rows
+        if truncated:
+            del rows[max_rows:]
+        return cls(list(result.keys()), rows, truncated, scales=scales)
+
+    def batches(self) -> Generator[list[tuple], None, None]:
+        for start in range(0, len(self.rows), self.batch_size):
+            yield self.rows[start:start + self.batch_size]
+
+class StreamedResult:
+    """
+    Result of a statement executed on a server-side cursor.
+    Rows are delivered by batches() in fixed-size lists, so peak memory is bounded by
+    batch_size rather than by the result size. Reading stops early once max_rows rows
+    or max_bytes bytes have been produced, and truncated is set. The bytes are those of the
+    encoded output once measure_output() is given its size, otherwise estimated from the values.
+    """
+
+    def __init__(
+            self,
+            conn: Any,
+            result: Any,
+            batch_size: int,
+            max_rows: int | None,
+            max_bytes: int | None,
+            timeout: float | None = None,
+            watch: Watch | None = None,
+            reset_sql: str | None = None
+    ):
+        self._conn = conn
+        self._result = result
+        self._timeout = timeout
+        # Watchdog entry cancelling the statement at its deadline, and the session reset it needs afterwards
+        self._watch = watch
+        self._reset_sql = reset_sql
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.returns_rows = result.returns_rows
+        self.keys: list[str] = list(result.keys()) if self.returns_rows else []
+        # Server-side cursors describe their columns once the first rows are buffered, which execute does
+        self.scales: list[int | None] = _declared_scales(result) if self.returns_rows else []
+        # Affected rows of a non-query statement
+        self.rowcount: int | None = None if self.returns_rows else result.rowcount
+        self.row_count = 0
+        self.estimated_bytes = 0
+        self.truncated = False
+        self._output_size: Callable[[], int] | None = None
+
+    def measure_output(self, size: Callable[[], int]) -> None:
+        """Apply max_bytes to the output the batches are encoded into, size returning its length so far"""
+        self._output_size = size
+
+    def batches(self) -> Generator[list[Any], None, None]:
+        """Yield lists of rows until the cursor is exhausted or a cap is reached"""
+        if not self.returns_rows:
+            return
+        row_bytes = 0
+        try:
+            for batch in self._result.partitions(self.batch_size):
+                if self._output_size is not None and self.max_bytes is not None and self._output_size() > self.max_bytes:
+                    # Earlier batches are encoded by the time the next one is asked for
+                    self.truncated = True
+                    break
+                if self.max_rows is not None and self.row_count + len(batch) > self.max_rows:
+                    batch = batch[:self.max_rows - self.row_count]
+                    self.truncated = True
+                if not row_bytes and batch:
+                    row_bytes = _estimate_row_bytes(batch)
+                if self._output_size is None and self.max_bytes is not None and self.estimated_bytes + len(batch) * row_bytes > self.max_bytes:
+                    batch = batch[:max(0, (self.max_bytes - self.estimated_bytes) // row_bytes)]
+                    self.truncated = True
+                self.row_count += len(batch)
+                self.estimated_bytes += len(batch) * row_bytes
+                if batch:
+                    yield batch
+                if self.truncated:
+                    break
+        except SQLAlchemyError as e:
+            if self.timed_out(e):
+                raise QueryTimeoutError(self._timeout)
+            raise ValueError(f"Database error: {str(e)}")
+        finally:
+            if self.truncated:
+                # Stop the server-side cursor instead of draining it
+                self._result.close()
+
+    def timed_out(self, error: BaseException) -> bool:
+        """Whether error comes from the statement timeout or the watchdog cancelling the statement"""
+        return self._timeout is not None and ((self._watch is not None and self._watch.fired) or is_timeout_error(error))
+
+    def close(self, commit: bool = True) -> None:
+        """Close the cursor and end the transaction, committing unless commit is False"""
+        if self._watch is not None:
+            # Waits for a cancel already being sent
+            self._watch.cancel()
+        try:
+            self._result.close()
+            if self._watch is not None and self._watch.fired:
+                # The server may act on the cancel request late and stop whatever runs next on this
+                # connection, so it is discarded instead of going back to the pool
+                self._conn.invalidate()
+                return
+            if commit:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+            if self._reset_sql:
+                self._conn.execute(text(self._reset_sql))
+                self._conn.commit()
+        finally:
+            self._conn.close()
+
+    def __enter__(self) -> 'StreamedResult':
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        self.close(commit=exc_type is None)
+
+def _estimate_row_bytes(rows: list[Any]) -> int:
+    """Average text size of a row, sampled from the first rows of a batch"""
+    sample = rows[:100]
+    total = sum(len(str(value)) for row in sample for value in row)
+    return max(1, total // len(sample) + len(sample[0]))
+
+def open_connection(
+        db_type: str,
+        host: str,
+        port: int,
+        database: str,
+        username: str,
+        password: str
+) -> Any:
+    """
+    Check out a pooled connection, creating the engine on first use.
+    The pool pings the connection on checkout, so the returned connection is ready to run
+    a statement without another round trip. The caller must close it.
+    """
+    engine = _get_engine(db_type, host, port, database, username, password)
+    try:
+        with span('connect'):
+            return engine.connect()
+    except SQLAlchemyError as e:
+        raise ValueError(f"Database connection failed: {str(e)}")
+
+def execute_sql_stream(
         db_type: str,
         host: str,
         port: int,
@@ -240,11 +1024,16 @@ def execute_sql(
         username: str,
         password: str,
         sql: str,
-        params: dict[str, Any] | None = None
-) -> list[dict[str, Any]] | dict[str, Any] | None:
+        params: dict[str, Any] | None = None,
+        batch_size: int = STREAM_BATCH_SIZE,
+        max_rows: int | None = MAX_RESULT_ROWS,
+        max_bytes: int | None = MAX_RESULT_BYTES,
+        conn: Any = None,
+        timeout: float | None = None
+) -> StreamedResult:
     """
-    Function to connect to different types of databases and execute SQL statements.
-    
+    Execute a SQL statement on a server-side cursor and return its rows as a stream of batches.
+
     Parameters:
         db_type: Database type, e.g., 'mysql', 'sqlserver', 'hologres'
         host: Database host address
@@ -254,48 +1043,41 @@ def execute_sql(
         password: Password
         sql: SQL statement to execute
         params: SQL parameter dictionary (optional)
+        batch_size: Rows fetched from the server per round trip
+        max_rows: Stop reading after this many rows, None for no limit
+        max_bytes: Stop reading after this many bytes of output, see StreamedResult.measure_output, None for no limit
+        conn: Connection from open_connection to run on, the result takes ownership of it
+        timeout: Seconds the statement may run, including fetching, before the server stops it
+            and a watchdog cancels it; None for no limit. Raises QueryTimeoutError when hit
 
     Returns:
-        If executing a query statement, returns a list where each element is a row dictionary;
-        If executing a non-query statement, returns a dictionary containing the number of affected rows, e.g., {"rowcount": 3}
+        A StreamedResult, to be used as a context manager so the connection goes back to the pool
     """
-    driver = {
-        'mysql': 'pymysql',
-        'sqlserver': 'pymssql',
-        'hologres': 'psycopg2'
-    }.get(db_type.lower(), '')
-
-    encoded_username = quote_plus(username)
-    encoded_password = quote_plus(password)
-    
-    # Handle Hologres type, use PostgreSQL connection method
-    actual_db_type = db_type.lower()
-    if actual_db_type == 'hologres':
-        actual_db_type = 'postgresql'
-    
-    # Create database engine
-    connection_url = f'{actual_db_type}+{driver}://{encoded_username}:{encoded_password}@{host}:{port}/{database}'
-    
-    # Add application_name parameter with version for PostgreSQL/Hologres
-    if db_type.lower() == 'hologres' or db_type.lower() == 'postgresql':
-        connection_url += f'?application_name=hologres_text2data_from_dify_v{APP_VERSION}'
-    
-    engine = create_engine(connection_url)
-    
+    if conn is None:
+        conn = open_connection(db_type, host, port, database, username, password)
+    watch = reset_sql = None
     try:
-        # Use begin() to ensure transaction auto-commit
-        with engine.begin() as conn:
-            stmt = text(sql)
-            result_proxy = conn.execute(stmt, params or {})
-            # If returning row data, it's a query statement
-            if result_proxy.returns_rows:
-                rows = result_proxy.fetchall()
-                keys = result_proxy.keys()
-                return [dict(zip(keys, row)) for row in rows]
-            else:
-                # Non-query statement returns the number of affected rows
-                return {"rowcount": result_proxy.rowcount}
+        with span('execute'):
+            if timeout is not None:
+                reset_sql = set_statement_timeout(conn, db_type, timeout)
+                dbapi_connection = conn.connection.dbapi_connection
+                watch = watchdog.watch(timeout, lambda: cancel_query(conn.engine, dbapi_connection, db_type))
+            result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(text(sql), params or {})
+        return StreamedResult(conn, result, batch_size, max_rows, max_bytes, timeout, watch, reset_sql)
     except SQLAlchemyError as e:
+        if watch is not None:
+            watch.cancel()
+            if watch.fired:
+                conn.invalidate()
+        # Closing the connection rolls back the open transaction
+        conn.close()
+        if timeout is not None and ((watch is not None and watch.fired) or is_timeout_error(e)):
+            raise QueryTimeoutError(timeout)
         raise ValueError(f"Database error: {str(e)}")
-    finally:
-        engine.dispose()
\ No newline at end of file
+    except BaseException:
+        if watch is not None:
+            watch.cancel()
+            if watch.fired:
+                conn.invalidate()
+        conn.close()
+        raise
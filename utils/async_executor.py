@@ -0,0 +1,236 @@
+# utils/async_executor.py
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from utils.alchemy_db_client import connection_key, open_connection, QueryResult, MAX_RESULT_ROWS
+from utils.deadline import Deadline, QueryTimeoutError, is_timeout_error, set_statement_timeout
+from utils.query_guard import GuardPolicy, query_guard
+
+# Statements one call runs at once, and the most any database serves across all calls;
+# the latter stays below the engine pool size so single statements still get a connection
+MAX_CONCURRENCY = 4
+DB_CONCURRENCY = 8
+# Worker threads shared by every database, each blocks on one driver call
+MAX_WORKERS = 16
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='sql-fanout')
+
+
+class DatabaseLimiter:
+    """
+    Process-wide bound on concurrently running statements per database.
+    Thread semaphores rather than asyncio ones, since each call runs its own event loop
+    and the bound must hold across simultaneous tool calls.
+    """
+
+    def __init__(self, limit: int = DB_CONCURRENCY):
+        self.limit = limit
+        self._semaphores: dict[tuple, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> threading.BoundedSemaphore:
+        with self._lock:
+            semaphore = self._semaphores.get(key)
+            if semaphore is None:
+                semaphore = self._semaphores[key] = threading.BoundedSemaphore(self.limit)
+            return semaphore
+
+
+class _Execution:
+    """One statement running in a worker thread, cancellable from the event loop"""
+
+    def __init__(self, sql: str, params: dict[str, Any] | None):
+        self.sql = sql
+        self.params = params
+        self.dbapi_connection: Any = None
+        self.cancelled = False
+        # Whether a cancel request went to the server, which may act on it after the statement finished
+        self.cancel_sent = False
+        self._lock = threading.Lock()
+
+    def cancel(self) -> None:
+        """Ask the server to stop the statement, when the driver supports it"""
+        # Held while the request is sent, so run() cannot hand the connection back in the meantime
+        with self._lock:
+            self.cancelled = True
+            connection = self.dbapi_connection
+            # psycopg2 sends a cancel request on a separate socket; other drivers finish the statement
+            if connection is not None and hasattr(connection, 'cancel'):
+                self.cancel_sent = True
+                try:
+                    connection.cancel()
+                except Exception as e:
+                    print(f"Warning: failed to cancel statement: {e}")
+
+    def run(
+            self,
+            connect: Any,
+            semaphore: threading.BoundedSemaphore,
+            db_type: str,
+            deadline: Deadline,
+            timeout: float | None,
+            max_rows: int,
+            guard_policy: GuardPolicy | None = None
+    ) -> dict[str, Any]:
+        with semaphore:
+            if self.cancelled:
+                raise ValueError("Statement cancelled before it started")
+            # Time spent waiting for the database's slot is no longer available to the statement
+            timeout = deadline.budget(timeout)
+            conn = connect()
+            reset_sql = None
+            try:
+                with self._lock:
+                    self.dbapi_connection = conn.connection.dbapi_connection
+                    cancelled = self.cancelled
+                if cancelled:
+                    raise ValueError("Statement cancelled before it started")
+                with conn.begin():
+                    # The server stops the statement too, in case the cancel request is lost
+                    reset_sql = set_statement_timeout(conn, db_type, timeout)
+                    sql = self.sql
+                    if guard_policy is not None:
+                        # Checked on the connection it runs on, a rejection fails this statement only
+                        sql, _ = query_guard.check(conn, db_type, sql, guard_policy)
+                    result = QueryResult.fetch(conn.execute(text(sql), self.params or {}), max_rows)
+                    if not result.returns_rows:
+                        return {"rowcount": result.rowcount}
+                    output = {"result": result}
+                    if sql != self.sql:
+                        output["guarded_sql"] = sql
+                    if result.truncated:
+                        output["truncated"] = True
+                    return output
+            finally:
+                with self._lock:
+                    self.dbapi_connection = None
+                try:
+                    if self.cancel_sent:
+                        # A late cancel would stop whatever runs next on it, so it does not go back to the pool
+                        conn.invalidate()
+                    elif reset_sql:
+                        conn.execute(text(reset_sql))
+                        conn.commit()
+                finally:
+                    conn.close()
+
+
+async def _run_statement(
+        execution: _Execution,
+        connect: Any,
+        semaphore: threading.BoundedSemaphore,
+        limiter: asyncio.Semaphore,
+        db_type: str,
+        deadline: Deadline,
+        timeout: float | None,
+        max_rows: int,
+        guard_policy: GuardPolicy | None
+) -> dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    async with limiter:
+        start = time.perf_counter()
+        try:
+            # Taken from the request deadline when the statement starts, so later waves get what is left
+            timeout = deadline.budget(timeout)
+            future = loop.run_in_executor(
+                _executor, execution.run, connect, semaphore, db_type, deadline, timeout, max_rows, guard_policy
+            )
+            output = await asyncio.wait_for(future, timeout)
+            status = "success"
+        except QueryTimeoutError:
+            output = {"error": "Request deadline reached before the statement started"}
+            status = "timeout"
+        except asyncio.TimeoutError:
+            # A statement still queued is dropped by wait_for, a running one is cancelled on the server
+            execution.cancel()
+            output = {"error": f"Statement timed out after {timeout:g}s"}
+            status = "timeout"
+        except asyncio.CancelledError:
+            execution.cancel()
+            raise
+        except SQLAlchemyError as e:
+            if is_timeout_error(e):
+                output = {"error": f"Statement timed out after {timeout:g}s"}
+                status = "timeout"
+            else:
+                output = {"error": f"Database error: {str(e)}"}
+                status = "error"
+        except ValueError as e:
+            output = {"error": str(e)}
+            status = "error"
+    return {
+        "sql": execution.sql,
+        "params": execution.params,
+        "status": status,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        **output
+    }
+
+
+async def execute_many_async(
+        db_type: str,
+        host: str,
+        port: int,
+        database: str,
+        username: str,
+        password: str,
+        statements: list[str],
+        param_sets: list[dict[str, Any]] | None = None,
+        max_concurrency: int = MAX_CONCURRENCY,
+        timeout: float | None = None,
+        max_rows: int = MAX_RESULT_ROWS,
+        guard_policy: GuardPolicy | None = None,
+        deadline: Deadline | None = None
+) -> list[dict[str, Any]]:
+    """
+    Run statements concurrently, each in its own transaction on its own pooled connection.
+
+    Parameters:
+        db_type, host, port, database, username, password: Same as execute_sql_stream
+        statements: SQL statements to run
+        param_sets: Parameter dictionaries, every statement runs once per set (optional)
+        max_concurrency: Statements of this call running at the same time
+        timeout: Seconds each statement may run before it is cancelled, None for no limit besides the deadline
+        max_rows: Rows kept per statement result
+        guard_policy: Cost guard every query is checked against before it runs, None for no check
+        deadline: Request deadline no statement runs past, however long it waited to start (optional)
+
+    Returns:
+        One result per statement and parameter set, in statement-major input order. Rows of a query
+        come as a QueryResult under "result", and a query the cost guard rewrote reports the SQL it
+        ran under "guarded_sql". A failed or timed out statement reports status and
+        error without affecting the others.
+    """
+    executions = [_Execution(sql, params) for sql in statements for params in (param_sets or [None])]
+    semaphore = database_limiter.get(connection_key(db_type, host, port, database, username, password))
+    limiter = asyncio.Semaphore(max(1, max_concurrency))
+    deadline = deadline or Deadline()
+
+    def connect() -> Any:
+        return open_connection(db_type, host, port, database, username, password)
+
+    tasks = [
+        asyncio.ensure_future(_run_statement(execution, connect, semaphore, limiter, db_type, deadline, timeout, max_rows, guard_policy))
+        for execution in executions
+    ]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        for execution in executions:
+            execution.cancel()
+        raise
+
+
+def execute_many(*args: Any, **kwargs: Any) -> list[dict[str, Any]]:
+    """Blocking entry point of execute_many_async for synchronous callers such as tool invocations"""
+    return asyncio.run(execute_many_async(*args, **kwargs))
+
+
+# Shared by every tool invocation within the plugin process
+database_limiter = DatabaseLimiter()
@@ -0,0 +1,156 @@
+# utils/deadline.py
+import heapq
+import itertools
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+from sqlalchemy import text
+
+# Dify abandons a tool request after this many seconds, main.py passes it to the plugin runtime
+REQUEST_TIMEOUT = 300
+# Budget kept back from every statement so the timeout can still be reported in time
+RESPONSE_MARGIN = 5
+# SQLSTATE / driver error codes of a statement stopped by its timeout or a cancel request
+_TIMEOUT_CODES = ('57014', '3024', '1317')
+
+
+class QueryTimeoutError(ValueError):
+    """Raised when a statement is stopped for running past its deadline"""
+
+    def __init__(self, seconds: float):
+        super().__init__(f"Query timed out after {seconds:g}s and was cancelled, narrow the query or raise statement_timeout")
+        self.seconds = seconds
+
+
+class Deadline:
+    """Point in time by which a tool request must have answered"""
+
+    def __init__(self, seconds: float = REQUEST_TIMEOUT - RESPONSE_MARGIN):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def budget(self, limit: float | None = None) -> float:
+        """
+        Seconds a statement may run
+        :param limit: Optional caller-side cap, such as the statement_timeout parameter
+        :raise QueryTimeoutError: When nothing of the request budget is left
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise QueryTimeoutError(0)
+        return min(remaining, limit) if limit else remaining
+
+
+def set_statement_timeout(conn: Any, db_type: str, seconds: float) -> str | None:
+    """
+    Have the server stop statements of this connection after seconds
+    :return: Statement restoring the session default once the connection goes back to the pool, or None
+    """
+    milliseconds = max(1, int(seconds * 1000))
+    db_type = db_type.lower()
+    if db_type in ('hologres', 'postgresql'):
+        # LOCAL ends with the transaction, so the pooled connection needs no reset
+        conn.execute(text(f"SET LOCAL statement_timeout = {milliseconds}"))
+    elif db_type == 'mysql':
+        # Applies to SELECT only; other statements rely on the watchdog
+        conn.execute(text(f"SET SESSION max_execution_time = {milliseconds}"))
+        return "SET SESSION max_execution_time = DEFAULT"
+    # SQL Server has no server-side statement timeout, the watchdog cancels instead
+    return None
+
+
+def cancel_query(engine: Any, dbapi_connection: Any, db_type: str) -> None:
+    """Stop the statement running on dbapi_connection from another thread"""
+    db_type = db_type.lower()
+    try:
+        if db_type == 'sqlserver':
+            # pymssql.Connection has no cancel(), its _mssql connection sends the TDS attention signal
+            dbapi_connection._conn.cancel()
+        elif hasattr(dbapi_connection, 'cancel'):
+            # psycopg2 sends an out-of-band cancel, the equivalent of pg_cancel_backend
+            dbapi_connection.cancel()
+        elif db_type == 'mysql':
+            with engine.connect() as conn:
+                conn.execute(text(f"KILL QUERY {int(dbapi_connection.thread_id())}"))
+    except Exception as e:
+        print(f"Warning: failed to cancel the timed out query: {e}")
+
+
+def is_timeout_error(error: BaseException) -> bool:
+    """Whether a driver error reports a statement stopped by a timeout or cancel"""
+    original = getattr(error, 'orig', error)
+    code = getattr(original, 'pgcode', None) or (original.args[0] if getattr(original, 'args', None) else None)
+    return str(code) in _TIMEOUT_CODES
+
+
+class Watch:
+    """
+    Pending cancel callback of one statement. The callback runs under the watch's lock, so
+    cancel() waits for one already running: once cancel() returns, the callback has either
+    finished (fired is set) or will never run, and the connection can safely be reused.
+    """
+
+    def __init__(self, callback: Callable[[], None]):
+        self.callback = callback
+        self.fired = False
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+
+    def fire(self) -> None:
+        with self._lock:
+            if self.cancelled:
+                return
+            self.fired = True
+            self.callback()
+
+
+class Watchdog:
+    """
+    One background thread firing cancel callbacks of statements that outlive their deadline.
+    A heap orders the pending deadlines, so watching is O(log n), unwatching only marks the
+    entry and it is dropped once it reaches the top.
+    """
+
+    def __init__(self):
+        self._heap: list[tuple[float, int, Watch]] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    def watch(self, seconds: float, callback: Callable[[], None]) -> Watch:
+        """Call callback after seconds unless the returned watch is cancelled first"""
+        watch = Watch(callback)
+        with self._condition:
+            heapq.heappush(self._heap, (time.monotonic() + seconds, next(self._counter), watch))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='query-watchdog', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return watch
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while self._heap and self._heap[0][2].cancelled:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                delay = self._heap[0][0] - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                _, _, watch = heapq.heappop(self._heap)
+            # Outside the condition, a slow cancel must not hold up other statements' watches
+            watch.fire()
+
+
+# Shared by every tool invocation within the plugin process
+watchdog = Watchdog()
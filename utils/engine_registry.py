@@ -0,0 +1,121 @@
+# utils/engine_registry.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from utils.tracing import register_stats
+
+# Registry defaults, sized for the plugin's 256 MB memory limit
+MAX_ENGINES = 16
+IDLE_TIMEOUT = 600  # Seconds an engine may stay unused before it is disposed
+POOL_SIZE = 5
+MAX_OVERFLOW = 5
+POOL_RECYCLE = 1800  # Seconds before a pooled connection is reopened
+
+
+class EngineRegistry:
+    """
+    Process-wide registry of SQLAlchemy engines so repeated tool calls against
+    the same database reuse warm pooled connections instead of reconnecting.
+    Engines are keyed by connection identity, bounded in number, disposed in
+    LRU order and evicted after staying idle for idle_timeout seconds.
+    """
+
+    def __init__(
+        self,
+        max_engines: int = MAX_ENGINES,
+        idle_timeout: float = IDLE_TIMEOUT,
+        pool_size: int = POOL_SIZE,
+        max_overflow: int = MAX_OVERFLOW,
+        pool_recycle: int = POOL_RECYCLE
+    ):
+        self.max_engines = max_engines
+        self.idle_timeout = idle_timeout
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_recycle = pool_recycle
+        self._engines: OrderedDict[tuple, tuple[Engine, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_engine(self, key: tuple, connection_url: str, **engine_kwargs: Any) -> Engine:
+        """
+        Return the pooled engine for key, creating it on first use
+        :param key: Connection identity, e.g. (db_type, host, port, database, username, credential hash)
+        :param connection_url: SQLAlchemy URL used when the engine has to be created
+        :param engine_kwargs: Extra create_engine arguments, only used on creation
+        :return: Shared SQLAlchemy engine
+        """
+        now = time.monotonic()
+        stale: list[Engine] = []
+        with self._lock:
+            stale.extend(self._evict_idle(now))
+            entry = self._engines.get(key)
+            if entry is not None:
+                self.hits += 1
+                engine = entry[0]
+                self._engines[key] = (engine, now)
+                self._engines.move_to_end(key)
+            else:
+                self.misses += 1
+                engine = create_engine(
+                    connection_url,
+                    pool_pre_ping=True,
+                    pool_size=self.pool_size,
+                    max_overflow=self.max_overflow,
+                    pool_recycle=self.pool_recycle,
+                    **engine_kwargs
+                )
+                self._engines[key] = (engine, now)
+                while len(self._engines) > self.max_engines:
+                    _, (lru_engine, _) = self._engines.popitem(last=False)
+                    self.evictions += 1
+                    stale.append(lru_engine)
+        # Dispose outside the lock, closing sockets may block
+        for old_engine in stale:
+            old_engine.dispose()
+        return engine
+
+    def _evict_idle(self, now: float) -> list[Engine]:
+        """Drop engines unused for longer than idle_timeout, caller must hold the lock"""
+        expired = [k for k, (_, last_used) in self._engines.items() if now - last_used > self.idle_timeout]
+        self.evictions += len(expired)
+        return [self._engines.pop(k)[0] for k in expired]
+
+    def dispose_all(self) -> None:
+        """Dispose every registered engine, e.g. at plugin shutdown"""
+        with self._lock:
+            engines = [engine for engine, _ in self._engines.values()]
+            self._engines.clear()
+        for engine in engines:
+            engine.dispose()
+
+    def stats(self) -> dict[str, Any]:
+        """Counters describing registry effectiveness and pool usage"""
+        with self._lock:
+            engines = [engine for engine, _ in self._engines.values()]
+            hits, misses, evictions = self.hits, self.misses, self.evictions
+        checked_out = checked_in = 0
+        for engine in engines:
+            pool = engine.pool
+            checked_out += getattr(pool, 'checkedout', lambda: 0)()
+            checked_in += getattr(pool, 'checkedin', lambda: 0)()
+        total = hits + misses
+        return {
+            'engines': len(engines),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+            'evictions': evictions,
+            'open_connections': checked_out + checked_in,
+            'checked_out_connections': checked_out
+        }
+
+
+# Shared by execute_sql_stream, open_connection and get_db_schema within the plugin process
+engine_registry = EngineRegistry()
+register_stats('engine_registry', engine_registry.stats)
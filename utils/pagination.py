@@ -0,0 +1,228 @@
+# utils/pagination.py
+import base64
+import binascii
+import json
+import re
+import zlib
+from collections.abc import Generator
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any
+from uuid import UUID
+from utils.sql_analyzer import split_statements
+
+# Rows per page when pagination is asked for without a page size
+PAGE_SIZE = 1000
+TOKEN_VERSION = 1
+# Key columns are written into the page query, so only plain identifiers are accepted
+_IDENTIFIER_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class PageTokenError(ValueError):
+    """Raised for a continuation token that is malformed or belongs to another query"""
+
+
+def parse_page_key(spec: str) -> list[tuple[str, bool]]:
+    """
+    Parse the page_key parameter, such as "id" or "created_at desc, id desc"
+    :param spec: Comma-separated columns of the query result, each optionally followed by asc or desc;
+                 together they must be unique and never NULL
+    :return: List of (column, descending)
+    """
+    key = []
+    for part in (spec or '').split(','):
+        words = part.split()
+        if not words:
+            continue
+        direction = words[1].lower() if len(words) > 1 else 'asc'
+        if len(words) > 2 or direction not in ('asc', 'desc') or not _IDENTIFIER_RE.match(words[0]):
+            raise ValueError(f"Invalid page_key column: {part.strip()}")
+        key.append((words[0], direction == 'desc'))
+    if not key:
+        raise ValueError("page_key is required for pagination, name the unique column(s) to page by")
+    return key
+
+
+def _keyset_predicate(key: list[tuple[str, bool]], after: list[Any], db_type: str, params: dict[str, Any]) -> str:
+    """Rows strictly after the last row of the previous page, in key order"""
+    for index, value in enumerate(after):
+        params[f'page_after_{index}'] = value
+    directions = {descending for _, descending in key}
+    if len(directions) == 1 and db_type != 'sqlserver':
+        # A row comparison can be served by a matching index
+        operator = '<' if directions.pop() else '>'
+        columns = ', '.join(name for name, _ in key)
+        values = ', '.join(f':page_after_{index}' for index in range(len(key)))
+        return f"({columns}) {operator} ({values})"
+    # Mixed directions, and SQL Server, which has no row constructors: expand into OR terms
+    terms = []
+    for index, (name, descending) in enumerate(key):
+        equal = [f"{key[i][0]} = :page_after_{i}" for i in range(index)]
+        terms.append('(' + ' AND '.join(equal + [f"{name} {'<' if descending else '>'} :page_after_{index}"]) + ')')
+    return '(' + ' OR '.join(terms) + ')'
+
+
+def build_page_sql(
+        sql: str,
+        db_type: str,
+        key: list[tuple[str, bool]],
+        page_size: int,
+        after: list[Any] | None = None
+) -> tuple[str, dict[str, Any]]:
+    """
+    Wrap a query so it returns one page in key order.
+    Pages continue from the key values of the previous page's last row instead of skipping
+    rows with OFFSET, so every page costs about as much as the first.
+    :param sql: Read-only query whose result holds the key columns
+    :param db_type: Database type, decides the row limit syntax
+    :param key: Ordering key from parse_page_key
+    :param page_size: Rows per page, one more is fetched to tell whether another page follows
+    :param after: Key values of the last row already returned, None for the first page
+    :return: Tuple of (page SQL, bind parameters)
+    """
+    db_type = db_type.lower()
+    params: dict[str, Any] = {}
+    # The tokenizer drops a terminator followed only by comments, which a plain rstrip would keep
+    statements = split_statements(sql, db_type)
+    if len(statements) != 1:
+        raise ValueError("Pagination needs a single query")
+    inner = statements[0]
+    where = f" WHERE {_keyset_predicate(key, after, db_type, params)}" if after is not None else ''
+    order_by = ', '.join(f"{name} {'DESC' if descending else 'ASC'}" for name, descending in key)
+    limit = int(page_size) + 1
+    # Newlines keep a trailing line comment from swallowing the closing parenthesis
+    if db_type == 'sqlserver':
+        return f"SELECT * FROM (\n{inner}\n) AS page_rows{where} ORDER BY {order_by} OFFSET 0 ROWS FETCH NEXT {limit} ROWS ONLY", params
+    return f"SELECT * FROM (\n{inner}\n) AS page_rows{where} ORDER BY {order_by} LIMIT {limit}", params
+
+
+def _encode_value(value: Any) -> Any:
+    """Tag key values JSON cannot hold, so they are bound with their original type on the next page"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, Decimal):
+        return {'decimal': str(value)}
+    if isinstance(value, datetime):
+        return {'datetime': value.isoformat()}
+    if isinstance(value, date):
+        return {'date': value.isoformat()}
+    if isinstance(value, time):
+        return {'time': value.isoformat()}
+    if isinstance(value, timedelta):
+        return {'timedelta': value.total_seconds()}
+    if isinstance(value, UUID):
+        return {'uuid': str(value)}
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {'bytes': base64.b64encode(bytes(value)).decode('ascii')}
+    raise ValueError(f"Unsupported page_key value type: {type(value).__name__}")
+
+
+_DECODERS = {
+    'decimal': Decimal,
+    'datetime': datetime.fromisoformat,
+    'date': date.fromisoformat,
+    'time': time.fromisoformat,
+    'timedelta': lambda seconds: timedelta(seconds=seconds),
+    'uuid': UUID,
+    'bytes': base64.b64decode,
+}
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        (tag, raw), = value.items()
+        return _DECODERS[tag](raw)
+    return value
+
+
+class PageToken:
+    """
+    Opaque continuation token of a paginated query: the digest of the normalized SQL, the
+    ordering key and the key values of the last row returned. The SQL itself stays with the
+    caller, who sends it again with the token, so a token can never change what runs.
+    """
+
+    def __init__(self, digest: str, key: list[tuple[str, bool]], after: list[Any], page: int):
+        self.digest = digest
+        self.key = key
+        self.after = after
+        self.page = page
+
+    def encode(self) -> str:
+        payload = {
+            'v': TOKEN_VERSION,
+            'd': self.digest,
+            'k': [[name, descending] for name, descending in self.key],
+            'a': [_encode_value(value) for value in self.after],
+            'p': self.page
+        }
+        data = zlib.compress(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+        return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+    @classmethod
+    def decode(cls, token: str, digest: str) -> 'PageToken':
+        """
+        Parse a token and check it was issued for the query with this digest
+        :raise PageTokenError: When the token is malformed, outdated or belongs to another query
+        """
+        try:
+            data = base64.urlsafe_b64decode(token.strip() + '=' * (-len(token.strip()) % 4))
+            payload = json.loads(zlib.decompress(data).decode('utf-8'))
+            if payload['v'] != TOKEN_VERSION:
+                raise PageTokenError("page_token was issued by an older version, start again from the first page")
+            token_digest = payload['d']
+            key = [(str(name), bool(descending)) for name, descending in payload['k']]
+            after = [_decode_value(value) for value in payload['a']]
+            page = int(payload['p'])
+        except PageTokenError:
+            raise
+        except (binascii.Error, zlib.error, KeyError, TypeError, ValueError) as e:
+            raise PageTokenError(f"page_token is not valid: {str(e)}")
+        if token_digest != digest:
+            raise PageTokenError("page_token belongs to a different SQL statement")
+        if len(after) != len(key) or not all(_IDENTIFIER_RE.match(name) for name, _ in key):
+            raise PageTokenError("page_token is not valid: key does not match its values")
+        return cls(token_digest, key, after, page)
+
+
+class PageTracker:
+    """
+    Passes a result's batches through while remembering the last row, from which the
+    token of the next page is built. Another page follows when the result was cut at
+    the page size, which build_page_sql guarantees by fetching one extra row.
+    """
+
+    def __init__(self, result: Any, digest: str, key: list[tuple[str, bool]], page: int):
+        self.result = result
+        self.digest = digest
+        self.key = key
+        self.page = page
+        self.last_row: Any = None
+
+    def batches(self) -> Generator[list[Any], None, None]:
+        for batch in self.result.batches():
+            if batch:
+                self.last_row = batch[-1]
+            yield batch
+
+    def next_token(self) -> str | None:
+        """Token of the following page, None on the last page"""
+        if not self.result.truncated or self.last_row is None:
+            return None
+        positions = {name.lower(): index for index, name in enumerate(self.result.keys)}
+        after = []
+        for name, _ in self.key:
+            index = positions.get(name.lower())
+            if index is None:
+                raise ValueError(f"page_key column {name} is not in the query result")
+            value = self.last_row[index]
+            if value is None:
+                raise ValueError(f"page_key column {name} is NULL, page by columns that never are")
+            after.append(value)
+        return PageToken(self.digest, self.key, after, self.page + 1).encode()
+
+    def info(self) -> dict[str, Any]:
+        return {'page': self.page, 'rows': self.result.row_count, 'next_page_token': self.next_token()}
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.result, name)
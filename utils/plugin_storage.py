@@ -0,0 +1,78 @@
+# utils/plugin_storage.py
+import json
+import threading
+import time
+from typing import Any
+
+# Storage size requested in manifest.yaml, shared by every cache that persists snapshots
+STORAGE_LIMIT = 1048576
+# Bytes the snapshots may take together, the rest is headroom for the index
+STORAGE_BUDGET = 896 * 1024
+# Largest single snapshot, so one big database cannot push out every other cache
+SNAPSHOT_LIMIT = 256 * 1024
+INDEX_KEY = 'storage:index'
+
+
+class StorageBudget:
+    """
+    Keeps the snapshots the caches persist to Dify plugin storage within one combined budget.
+    Plugin storage cannot list its keys, so an index of key -> [size, written_at] is stored
+    next to them; writing a snapshot evicts the least recently written ones until it fits.
+    """
+
+    def __init__(self, budget: int = STORAGE_BUDGET, snapshot_limit: int = SNAPSHOT_LIMIT):
+        self.budget = budget
+        self.snapshot_limit = min(snapshot_limit, budget)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def set(self, storage: Any, key: str, data: bytes) -> bool:
+        """
+        Store a snapshot, evicting older ones to make room
+        :param storage: Plugin storage (session.storage)
+        :param key: Storage key of the snapshot
+        :param data: Snapshot bytes
+        :return: False when the snapshot is larger than snapshot_limit and was not stored
+        """
+        if len(data) > self.snapshot_limit:
+            return False
+        with self._lock:
+            index = self._read_index(storage)
+            index.pop(key, None)
+            used = sum(size for size, _ in index.values())
+            for old_key, (size, _) in sorted(index.items(), key=lambda item: item[1][1]):
+                if used + len(data) <= self.budget:
+                    break
+                try:
+                    storage.delete(old_key)
+                except Exception as e:
+                    print(f"Warning: failed to evict storage snapshot {old_key}: {e}")
+                del index[old_key]
+                used -= size
+                self.evictions += 1
+            storage.set(key, data)
+            index[key] = [len(data), time.time()]
+            storage.set(INDEX_KEY, json.dumps(index).encode('utf-8'))
+        return True
+
+    def usage(self, storage: Any) -> int:
+        """Bytes the indexed snapshots take"""
+        with self._lock:
+            return sum(size for size, _ in self._read_index(storage).values())
+
+    @staticmethod
+    def _read_index(storage: Any) -> dict[str, list]:
+        try:
+            data = storage.get(INDEX_KEY)
+        except Exception:
+            # Nothing persisted yet
+            return {}
+        try:
+            return json.loads(data.decode('utf-8')) if data else {}
+        except ValueError as e:
+            print(f"Warning: ignoring unreadable storage index: {e}")
+            return {}
+
+
+# Shared by every cache persisting to plugin storage within the plugin process
+storage_budget = StorageBudget()
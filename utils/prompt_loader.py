@@ -1,36 +1,109 @@
 # utils/prompt_loader.py
+import hashlib
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from jinja2 import Environment, FileSystemLoader, TemplateNotFound
+from typing import TYPE_CHECKING
+from utils.tracing import register_stats
+
+if TYPE_CHECKING:
+    from jinja2 import Template
+
+TEMPLATE_DIR = Path(__file__).parent.parent / 'prompt_templates/sql_generation'
+# Rendered system prompts kept per process
+PROMPT_CACHE_SIZE = 128
 
 class PromptLoader:
-    def __init__(self):
+    def __init__(self, bytecode_cache_dir: str | Path | None = None, cache_size: int = PROMPT_CACHE_SIZE):
+        # Imported on first use, so only processes that generate SQL pay for Jinja
+        from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+        bytecode_cache = None
+        if bytecode_cache_dir:
+            Path(bytecode_cache_dir).mkdir(parents=True, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(str(bytecode_cache_dir))
         self.env = Environment(
-            loader=FileSystemLoader(Path(__file__).parent.parent / 'prompt_templates/sql_generation'),
+            loader=FileSystemLoader(TEMPLATE_DIR),
             trim_blocks=True,
-            lstrip_blocks=True
+            lstrip_blocks=True,
+            bytecode_cache=bytecode_cache,
+            # Templates ship with the plugin and never change at runtime
+            auto_reload=False
         )
-    
+        self.cache_size = cache_size
+        self._templates: dict[str, 'Template'] = {}
+        self._rendered: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def precompile(self) -> None:
+        """Compile every template up front so no request pays for it"""
+        for name in self.env.list_templates(extensions=['jinja']):
+            self.env.get_template(name)
+
     def get_prompt(
-        self, 
-        db_type: str, 
+        self,
+        db_type: str,
         context: dict,
         limit: int = 100,
         user_custom_prompt: str | None = None  # New Custom Parameters
     ) -> str:
-        try:
-            template = self.env.get_template(f"{db_type.lower()}_prompt.jinja")
-        except TemplateNotFound:
-            template = self.env.get_template("base_prompt.jinja")
-        
         # Inject custom prompts into the context
         context.update({
             'limit_clause': self._get_limit_clause(db_type),
             'optimization_rules': self._get_optimization_rules(db_type),
-            'user_custom_prompt': user_custom_prompt,  
+            'user_custom_prompt': user_custom_prompt,
             'limit': limit
         })
-        return template.render(context)
-    
+        key = self._cache_key(db_type, context)
+        with self._lock:
+            prompt = self._rendered.get(key)
+            if prompt is not None:
+                self.hits += 1
+                self._rendered.move_to_end(key)
+                return prompt
+            self.misses += 1
+
+        prompt = self._get_template(db_type).render(context)
+        with self._lock:
+            self._rendered[key] = prompt
+            while len(self._rendered) > self.cache_size:
+                self._rendered.popitem(last=False)
+        return prompt
+
+    def _get_template(self, db_type: str) -> 'Template':
+        from jinja2 import TemplateNotFound
+
+        name = f"{db_type.lower()}_prompt.jinja"
+        template = self._templates.get(name)
+        if template is None:
+            try:
+                template = self.env.get_template(name)
+            except TemplateNotFound:
+                template = self.env.get_template("base_prompt.jinja")
+            self._templates[name] = template
+        return template
+
+    def _cache_key(self, db_type: str, context: dict) -> str:
+        """Digest of everything the rendered prompt depends on (schema DSL, limit, custom prompt, ...)"""
+        digest = hashlib.sha256(db_type.lower().encode('utf-8'))
+        for name in sorted(context):
+            value = context[name]
+            digest.update(f"\x00{name}\x00{type(value).__name__}\x00".encode('utf-8'))
+            digest.update(str(value).encode('utf-8'))
+        return digest.hexdigest()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'cached_prompts': len(self._rendered),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
     def _get_limit_clause(self, db_type: str) -> str:
         clauses = {
             'mysql': "LIMIT n",
@@ -38,25 +111,45 @@ class PromptLoader:
             'hologres': "LIMIT n"
         }
         return clauses.get(db_type.lower(), "LIMIT 100")
-    
+
     def _get_optimization_rules(self, db_type: str) -> str:
         rules = {
             'hologres': "- 分析使用EXPLAIN ANALYZE获得的执行计划"
         }
         return rules.get(db_type.lower(), "")
 
+_prompt_loader: PromptLoader | None = None
+_prompt_loader_lock = threading.Lock()
+
+def get_prompt_loader(bytecode_cache_dir: str | Path | None = None) -> PromptLoader:
+    """
+    Process-wide PromptLoader with precompiled templates and a rendered-prompt cache.
+    bytecode_cache_dir only takes effect on the first call, which creates the loader.
+    """
+    global _prompt_loader
+    if _prompt_loader is None:
+        with _prompt_loader_lock:
+            if _prompt_loader is None:
+                loader = PromptLoader(bytecode_cache_dir=bytecode_cache_dir)
+                loader.precompile()
+                register_stats('prompt_loader', loader.stats)
+                _prompt_loader = loader
+    return _prompt_loader
+
 def test_prompt_loading():
-    loader = PromptLoader()
-    
+    loader = get_prompt_loader()
+
     # TEST MySQL
     mysql_context = {
         'meta_data': 'mock_metadata',
         'query': 'mock_query',
-        'db_type': 'hologres'  
+        'db_type': 'hologres'
     }
     mysql_prompt = loader.get_prompt('mysql', mysql_context)
     print("MySQL Prompt Output:\n", mysql_prompt)
     assert "LIMIT n" in mysql_prompt
+    assert loader.get_prompt('mysql', dict(mysql_context)) == mysql_prompt
+    assert loader.stats()['hits'] == 1
 
 if __name__ == '__main__':
-    test_prompt_loading()
\ No newline at end of file
+    test_prompt_loading()
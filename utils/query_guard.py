@@ -0,0 +1,232 @@
+# utils/query_guard.py
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from utils.sql_analyzer import analyze_sql
+from utils.tracing import register_stats
+
+# Default thresholds, far above what an interactive question should need
+MAX_ESTIMATED_COST = 1e7
+MAX_ESTIMATED_ROWS = 100000
+MAX_SCAN_ROWS = 1e8
+# A nested loop is only a problem when its outer side is large
+NESTED_LOOP_ROWS = 10000
+# Parsed plans are reused for this long, table statistics drift slowly
+PLAN_CACHE_TTL = 600
+PLAN_CACHE_SIZE = 512
+
+GUARD_MODES = ('off', 'reject', 'rewrite')
+# A LIMIT bounds both of these, so only they can be fixed by a rewrite
+REWRITABLE_VIOLATIONS = {'rows', 'cost'}
+# Dialects whose EXPLAIN prints PostgreSQL-style "(cost=a..b rows=n width=w)" nodes
+EXPLAIN_DB_TYPES = ('hologres',)
+
+_NODE_RE = re.compile(r'^(?P<indent>\s*)(?:->\s*)?(?P<node>[A-Za-z][^(]*?)\s*\(cost=(?P<startup>[\d.]+)\.\.(?P<total>[\d.]+)\s+rows=(?P<rows>\d+)')
+_PARTITIONS_RE = re.compile(r'Partitions selected:\s*(?P<selected>\d+)\s*\(?out of\s*(?P<total>\d+)', re.IGNORECASE)
+_TRAILING_LIMIT_RE = re.compile(r'\bLIMIT\s+(?P<limit>\d+)(?P<offset>\s+OFFSET\s+\d+)?\s*$', re.IGNORECASE)
+
+
+def _strip_terminator(sql: str) -> str:
+    return sql.strip().rstrip(';').rstrip()
+
+
+class PlanSummary:
+    """Figures the guard needs from an EXPLAIN plan"""
+
+    def __init__(self):
+        self.total_cost = 0.0
+        self.estimated_rows = 0
+        self.max_scan_rows = 0
+        # Largest estimated outer input of a nested loop join, 0 if there is none
+        self.nested_loop_rows = 0
+        # (selected, total) partitions of scans that did not prune any partition
+        self.unpruned_partitions: list[tuple[int, int]] = []
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'total_cost': self.total_cost,
+            'estimated_rows': self.estimated_rows,
+            'max_scan_rows': self.max_scan_rows,
+            'nested_loop_rows': self.nested_loop_rows,
+            'unpruned_partitions': self.unpruned_partitions
+        }
+
+
+def parse_plan(lines: list[str]) -> PlanSummary:
+    """
+    Summarize a text EXPLAIN plan
+    :param lines: One plan line per element, as returned by EXPLAIN
+    :return: PlanSummary with cost and row estimates of the root node and the worst scans and joins
+    """
+    summary = PlanSummary()
+    root_seen = False
+    # Nested loops waiting for their first (outer) child, as indentation levels
+    open_loops: list[int] = []
+    for line in lines:
+        partitions = _PARTITIONS_RE.search(line)
+        if partitions:
+            selected, total = int(partitions.group('selected')), int(partitions.group('total'))
+            if total > 1 and selected == total:
+                summary.unpruned_partitions.append((selected, total))
+            continue
+        match = _NODE_RE.match(line)
+        if not match:
+            continue
+        node = match.group('node').strip().lower()
+        rows = int(match.group('rows'))
+        indent = len(match.group('indent'))
+        if not root_seen:
+            summary.total_cost = float(match.group('total'))
+            summary.estimated_rows = rows
+            root_seen = True
+        if open_loops and indent > open_loops[-1]:
+            summary.nested_loop_rows = max(summary.nested_loop_rows, rows)
+            open_loops.pop()
+        if 'scan' in node:
+            summary.max_scan_rows = max(summary.max_scan_rows, rows)
+        if node.startswith('nested loop'):
+            open_loops.append(indent)
+    return summary
+
+
+class GuardPolicy:
+    def __init__(
+        self,
+        mode: str = 'reject',
+        max_cost: float = MAX_ESTIMATED_COST,
+        max_rows: int = MAX_ESTIMATED_ROWS,
+        max_scan_rows: float = MAX_SCAN_ROWS,
+        nested_loop_rows: int = NESTED_LOOP_ROWS,
+        require_partition_pruning: bool = True
+    ):
+        if mode not in GUARD_MODES:
+            raise ValueError(f"Unsupported cost guard mode: {mode}")
+        self.mode = mode
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.max_scan_rows = max_scan_rows
+        self.nested_loop_rows = nested_loop_rows
+        self.require_partition_pruning = require_partition_pruning
+
+    def violations(self, plan: PlanSummary) -> dict[str, str]:
+        """Violated thresholds of the plan, by kind, with a human readable reason"""
+        problems = {}
+        if plan.total_cost > self.max_cost:
+            problems['cost'] = f"estimated cost {plan.total_cost:.0f} exceeds {self.max_cost:.0f}"
+        if plan.estimated_rows > self.max_rows:
+            problems['rows'] = f"estimated {plan.estimated_rows} result rows exceed {self.max_rows}"
+        if plan.max_scan_rows > self.max_scan_rows:
+            problems['scan'] = f"a scan reads an estimated {plan.max_scan_rows} rows, more than {self.max_scan_rows:.0f}"
+        if plan.nested_loop_rows > self.nested_loop_rows:
+            problems['nested_loop'] = f"nested loop join over an estimated {plan.nested_loop_rows} outer rows"
+        if self.require_partition_pruning and plan.unpruned_partitions:
+            total = plan.unpruned_partitions[0][1]
+            problems['partitions'] = f"no partition pruning, all {total} partitions are scanned; filter on the partition key"
+        return problems
+
+
+def limit_sql(sql: str, max_rows: int) -> str:
+    """Lower a trailing LIMIT to max_rows, or wrap the statement in one"""
+    sql = _strip_terminator(sql)
+    match = _TRAILING_LIMIT_RE.search(sql)
+    if match:
+        if int(match.group('limit')) <= max_rows:
+            return sql
+        return f"{sql[:match.start('limit')]}{max_rows}{sql[match.end('limit'):]}"
+    # Newlines keep a trailing line comment from swallowing the closing parenthesis
+    return f"SELECT * FROM (\n{sql}\n) AS guarded_query LIMIT {max_rows}"
+
+
+class QueryGuard:
+    """
+    Pre-execution check of generated SQL against a cost policy.
+    Runs a plain EXPLAIN (never ANALYZE) on the connection the statement will use, and
+    caches the parsed plan by the normalized SQL digest so a repeated query skips that round trip.
+    In rewrite mode a plan whose only problems are too many rows or too high a cost
+    gets a LIMIT and is checked again; every other violation rejects the statement.
+    """
+
+    def __init__(self, ttl: float = PLAN_CACHE_TTL, max_entries: int = PLAN_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._plans: OrderedDict[tuple[str, str], tuple[PlanSummary, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejections = 0
+        self.rewrites = 0
+
+    def check(self, conn: Any, db_type: str, sql: str, policy: GuardPolicy) -> tuple[str, PlanSummary | None]:
+        """
+        Validate a statement before it runs
+        :param conn: Open connection the statement will run on
+        :param db_type: Database type, only Hologres plans are checked
+        :param sql: Statement to check, only queries are explained
+        :param policy: Thresholds and mode
+        :return: Tuple of (statement to execute, possibly rewritten; plan summary or None when not checked)
+        """
+        if policy.mode == 'off' or db_type.lower() not in EXPLAIN_DB_TYPES:
+            return sql, None
+        analysis = analyze_sql(sql, db_type)
+        if not analysis.read_only or len(analysis.statements) != 1:
+            return sql, None
+        plan = self._plan(conn, db_type, sql)
+        problems = policy.violations(plan)
+        if not problems:
+            return sql, plan
+        if policy.mode == 'rewrite' and set(problems) <= REWRITABLE_VIOLATIONS:
+            rewritten = limit_sql(sql, policy.max_rows)
+            rewritten_plan = self._plan(conn, db_type, rewritten)
+            if not policy.violations(rewritten_plan):
+                with self._lock:
+                    self.rewrites += 1
+                print(f"Cost guard added LIMIT {policy.max_rows}: {'; '.join(problems.values())}")
+                return rewritten, rewritten_plan
+        with self._lock:
+            self.rejections += 1
+        raise ValueError(f"Query rejected by cost guard: {'; '.join(problems.values())}")
+
+    def _plan(self, conn: Any, db_type: str, sql: str) -> PlanSummary:
+        key = (conn.engine.url.render_as_string(hide_password=True), analyze_sql(sql, db_type).digest)
+        now = time.time()
+        with self._lock:
+            cached = self._plans.get(key)
+            if cached is not None and now - cached[1] <= self.ttl:
+                self.hits += 1
+                self._plans.move_to_end(key)
+                return cached[0]
+            self.misses += 1
+        try:
+            lines = [str(row[0]) for row in conn.execute(text(f"EXPLAIN {_strip_terminator(sql)}"))]
+        except SQLAlchemyError as e:
+            # A failed statement aborts the transaction on PostgreSQL-compatible servers
+            conn.rollback()
+            raise ValueError(f"Failed to explain the query: {str(e)}")
+        plan = parse_plan(lines)
+        with self._lock:
+            self._plans[key] = (plan, now)
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.max_entries:
+                self._plans.popitem(last=False)
+        return plan
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'cached_plans': len(self._plans),
+                'hits': self.hits,
+                'misses': self.misses,
+                'rejections': self.rejections,
+                'rewrites': self.rewrites,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+# Shared by every tool invocation within the plugin process
+query_guard = QueryGuard()
+register_stats('query_guard', query_guard.stats)
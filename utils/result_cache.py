@@ -0,0 +1,163 @@
+# utils/result_cache.py
+import json
+import pickle
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from collections.abc import Generator
+from typing import Any
+from utils.alchemy_db_client import QueryResult
+from utils.tracing import register_stats
+
+# Memory all cached results may take together, and the largest single result worth keeping
+RESULT_CACHE_BYTES = 32 * 1024 * 1024
+MAX_ENTRY_BYTES = 4 * 1024 * 1024
+# Rows handed out per batch when a cached result is replayed
+REPLAY_BATCH_SIZE = 1000
+# Results smaller than this are stored without compression
+COMPRESS_MIN_BYTES = 4096
+
+
+def _pack(keys: list[str], rows: list[Any]) -> bytes:
+    """Serialize rows column by column, one tuple per column compresses and pickles far smaller than row dicts"""
+    columns = list(zip(*rows)) if rows else [() for _ in keys]
+    payload = pickle.dumps((keys, columns), protocol=pickle.HIGHEST_PROTOCOL)
+    if len(payload) >= COMPRESS_MIN_BYTES:
+        return b'z' + zlib.compress(payload, 1)
+    return b'p' + payload
+
+
+def _unpack(blob: bytes) -> tuple[list[str], list[tuple]]:
+    payload = zlib.decompress(blob[1:]) if blob[:1] == b'z' else blob[1:]
+    keys, columns = pickle.loads(payload)
+    return keys, list(zip(*columns)) if columns else []
+
+
+class CachedResult(QueryResult):
+    """Replay of a cached query result, a QueryResult that also reports the entry's age"""
+
+    def __init__(self, keys: list[str], rows: list[tuple], truncated: bool, age: float):
+        super().__init__(keys, rows, truncated, batch_size=REPLAY_BATCH_SIZE)
+        self.age = age
+
+
+class ResultCacheEntry:
+    def __init__(self, blob: bytes, truncated: bool, created_at: float, ttl: float):
+        self.blob = blob
+        self.truncated = truncated
+        self.created_at = created_at
+        # Each entry keeps the TTL it was stored with, callers choose how stale a result may be
+        self.ttl = ttl
+
+
+class ResultRecorder:
+    """
+    Copies batches of a StreamedResult as they are formatted, so a miss fills the cache
+    without running the query twice. Recording gives up once the result outgrows max_bytes.
+    """
+
+    def __init__(self, result: Any, max_bytes: int = MAX_ENTRY_BYTES):
+        self.result = result
+        self.max_bytes = max_bytes
+        self.rows: list[Any] | None = []
+        self.complete = False
+
+    def batches(self) -> Generator[list[Any], None, None]:
+        for batch in self.result.batches():
+            if self.rows is not None:
+                if self.result.estimated_bytes > self.max_bytes:
+                    self.rows = None
+                else:
+                    self.rows.extend(tuple(row) for row in batch)
+            yield batch
+        self.complete = True
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.result, name)
+
+
+class ResultCache:
+    """
+    Opt-in cache of read-only query results for execute_sql.
+    Entries are keyed by connection identity, the normalized SQL digest and the statement
+    parameters plus any option that changes the result, and stored as compressed columnar
+    bytes. Memory is bounded by the total size of those bytes, evicting in LRU order.
+    """
+
+    def __init__(self, max_bytes: int = RESULT_CACHE_BYTES, max_entry_bytes: int = MAX_ENTRY_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: OrderedDict[tuple, ResultCacheEntry] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(connection: tuple, digest: str, params: dict[str, Any] | None, *options: Any) -> tuple:
+        """
+        Build a cache key
+        :param connection: connection_key() of the database
+        :param digest: Normalized SQL digest from analyze_sql, literals included
+        :param params: Statement parameters
+        :param options: Anything else that shapes the result, such as the row cap
+        """
+        return (connection, digest, json.dumps(params or {}, sort_keys=True, default=str), options)
+
+    def get(self, key: tuple) -> CachedResult | None:
+        """Return the cached result for key, or None when it is missing or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.created_at > entry.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+        keys, rows = _unpack(entry.blob)
+        return CachedResult(keys, rows, entry.truncated, now - entry.created_at)
+
+    def put(self, key: tuple, keys: list[str], rows: list[Any], truncated: bool, ttl: float) -> bool:
+        """
+        Store a complete query result
+        :return: False when the result is too large to cache
+        """
+        blob = _pack(keys, rows)
+        if len(blob) > self.max_entry_bytes:
+            return False
+        entry = ResultCacheEntry(blob, truncated, time.time(), ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += len(blob)
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def _remove(self, key: tuple) -> None:
+        """Drop one entry, caller must hold the lock"""
+        self._bytes -= len(self._entries.pop(key).blob)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+# Shared by every tool invocation within the plugin process
+result_cache = ResultCache()
+register_stats('result_cache', result_cache.stats)
@@ -0,0 +1,412 @@
+# utils/result_encoders.py
+import codecs
+import csv
+import io
+import json
+from collections.abc import Callable, Iterable, Sequence
+from datetime import date, datetime, time
+from decimal import Context, Decimal, InvalidOperation
+from html import escape
+from typing import Any
+
+try:
+    # Optional, several times faster than the json module on large results
+    import orjson
+except ImportError:
+    orjson = None
+
+Converter = Callable[[Any], Any]
+
+
+def _sample_values(batch: Sequence[Sequence[Any]], width: int) -> list[Any]:
+    """First non-null value of every column in the batch, None when a column is all null"""
+    samples: list[Any] = [None] * width
+    missing = set(range(width))
+    for row in batch:
+        for index in list(missing):
+            if row[index] is not None:
+                samples[index] = row[index]
+                missing.discard(index)
+        if not missing:
+            break
+    return samples
+
+
+def pick_converters(batch: Sequence[Sequence[Any]], width: int, converter_for: Callable[[Any], Converter | None]) -> list[Converter | None]:
+    """
+    Choose one converter per column from the value types in the first batch,
+    so the per-cell work afterwards is a plain function call without type checks
+    :param batch: First batch of rows
+    :param width: Number of columns
+    :param converter_for: Maps a sample value (None for an all-null column) to a converter, None means pass through
+    :return: List of converters, one per column
+    """
+    return [converter_for(sample) for sample in _sample_values(batch, width)]
+
+
+def _null_safe(convert: Converter, null: Any = None) -> Converter:
+    return lambda value: null if value is None else convert(value)
+
+
+def _isoformat(value: Any) -> str:
+    return value.isoformat()
+
+
+def _to_text(value: Any) -> str:
+    """Fallback used when a column's type could not be decided from the first batch"""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, memoryview):
+        return value.hex()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return str(value)
+
+
+def _csv_converter(sample: Any) -> Converter | None:
+    if sample is None:
+        return _null_safe(_to_text)
+    if isinstance(sample, (str, int, float, Decimal)):
+        # csv.writer formats these itself
+        return None
+    if isinstance(sample, (datetime, date, time)):
+        return _null_safe(_isoformat)
+    return _null_safe(_to_text)
+
+
+def _html_converter(sample: Any) -> Converter | None:
+    if isinstance(sample, (int, float, Decimal)) and not isinstance(sample, bool):
+        # Numbers never contain markup, skip escaping
+        return _null_safe(str, '')
+    if isinstance(sample, (datetime, date, time)):
+        return _null_safe(_isoformat, '')
+    if isinstance(sample, str):
+        return _null_safe(escape, '')
+    return _null_safe(lambda value: escape(_to_text(value)), '')
+
+
+def _convert_columns(batch: Sequence[Sequence[Any]], converters: list[Converter | None]) -> Iterable[tuple]:
+    """Apply the converters column by column and hand the rows back"""
+    columns = [
+        column if convert is None else map(convert, column)
+        for convert, column in zip(converters, zip(*batch))
+    ]
+    return zip(*columns)
+
+
+class CsvEncoder:
+    """
+    Incremental CSV encoder. Row batches are written straight into a single
+    UTF-8 bytes buffer that starts with a BOM, so the result exists once, as bytes.
+    size reports the bytes written so far.
+    """
+
+    def __init__(self, keys: Sequence[str]):
+        self._width = len(keys)
+        self._buffer = io.BytesIO()
+        self._buffer.write(codecs.BOM_UTF8)
+        self._text = io.TextIOWrapper(self._buffer, encoding='utf-8', newline='', write_through=True)
+        self._writer = csv.writer(self._text)
+        self._writer.writerow(keys)
+        self._converters: list[Converter | None] | None = None
+
+    def write(self, batch: Sequence[Sequence[Any]]) -> None:
+        if not batch:
+            return
+        if self._converters is None:
+            self._converters = pick_converters(batch, self._width, _csv_converter)
+        self._writer.writerows(_convert_columns(batch, self._converters))
+
+    @property
+    def size(self) -> int:
+        return self._buffer.tell()
+
+    def getvalue(self) -> bytes:
+        self._text.flush()
+        # Detach so closing the wrapper later does not close the buffer
+        self._text.detach()
+        return self._buffer.getvalue()
+
+
+class HtmlEncoder:
+    """Incremental HTML table encoder writing escaped UTF-8 bytes into a single buffer"""
+
+    def __init__(self, keys: Sequence[str]):
+        self._width = len(keys)
+        self._buffer = bytearray(b"<table border='1'>")
+        self._buffer += ("<tr>" + "".join(f"<th>{escape(str(col))}</th>" for col in keys) + "</tr>").encode('utf-8')
+        self._converters: list[Converter | None] | None = None
+
+    def write(self, batch: Sequence[Sequence[Any]]) -> None:
+        if not batch:
+            return
+        if self._converters is None:
+            self._converters = pick_converters(batch, self._width, _html_converter)
+        self._buffer += "".join(
+            "<tr><td>" + "</td><td>".join(cells) + "</td></tr>"
+            for cells in _convert_columns(batch, self._converters)
+        ).encode('utf-8')
+
+    @property
+    def size(self) -> int:
+        return len(self._buffer)
+
+    def getvalue(self) -> bytes:
+        return bytes(self._buffer) + b"</table>"
+
+
+JSON_LAYOUTS = ('objects', 'rows')
+# float keeps numbers as JSON numbers, string keeps every digit of a Decimal
+DECIMAL_MODES = ('float', 'string')
+
+
+def _to_json_value(value: Any) -> Any:
+    """Fallback used when a column's type could not be decided from the first batch"""
+    if value is None or isinstance(value, (str, int, float, dict, list)):
+        return value
+    if isinstance(value, Decimal):
+        return float(value)
+    return _to_text(value)
+
+
+def _json_converter(sample: Any, decimal_mode: str) -> Converter | None:
+    if isinstance(sample, (str, int, float)):
+        # bool is an int, both pass through unchanged
+        return None
+    if isinstance(sample, Decimal):
+        return _null_safe(str if decimal_mode == 'string' else float)
+    if isinstance(sample, (datetime, date, time)):
+        return _null_safe(_isoformat)
+    if isinstance(sample, (bytes, bytearray, memoryview)):
+        return _null_safe(lambda value: bytes(value).hex())
+    if isinstance(sample, (dict, list)):
+        return None
+    if decimal_mode == 'string':
+        return lambda value: str(value) if isinstance(value, Decimal) else _to_json_value(value)
+    return _to_json_value
+
+
+class JsonEncoder:
+    """
+    Incremental JSON encoder. Cell converters are chosen once per column from the first batch,
+    so serialization itself needs no per-cell callback and runs in orjson when installed.
+    Rows come out as objects keyed by column (objects) or as {"columns": [...], "rows": [[...]]},
+    which repeats no keys (rows). Each batch is serialized as it arrives and only its bytes are
+    kept, so size is the exact length of the encoded rows rather than an estimate.
+    """
+
+    def __init__(self, keys: Sequence[str], layout: str = 'objects', decimal_mode: str = 'float'):
+        if layout not in JSON_LAYOUTS:
+            raise ValueError(f"Unsupported JSON layout: {layout}")
+        if decimal_mode not in DECIMAL_MODES:
+            raise ValueError(f"Unsupported decimal mode: {decimal_mode}")
+        self._keys = list(keys)
+        self.layout = layout
+        self.decimal_mode = decimal_mode
+        # Encoded rows of each batch, without the enclosing brackets
+        self._chunks: list[bytes] = []
+        self.size = 0
+        # Set once orjson met a value it cannot encode, from then on the json module is used both ways
+        self._plain_json = orjson is None
+        self._converters: list[Converter | None] | None = None
+
+    def write(self, batch: Sequence[Sequence[Any]]) -> None:
+        if not batch:
+            return
+        if self._converters is None:
+            self._converters = pick_converters(
+                batch, len(self._keys), lambda sample: _json_converter(sample, self.decimal_mode)
+            )
+        rows = _convert_columns(batch, self._converters)
+        if self.layout == 'rows':
+            encoded = self._dumps(list(map(list, rows)))
+        else:
+            keys = self._keys
+            encoded = self._dumps([dict(zip(keys, row)) for row in rows])
+        self._chunks.append(encoded[1:-1])
+        # Brackets of the batch's array stand in for the comma joining it to the previous one
+        self.size += len(encoded) - 1
+
+    def _dumps(self, value: Any) -> bytes:
+        if not self._plain_json:
+            try:
+                return orjson.dumps(value)
+            except TypeError:
+                # Integers beyond 64 bits, which orjson would also read back as floats
+                self._plain_json = True
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def payload(self) -> Any:
+        """The result as JSON-ready Python values, for create_json_message"""
+        data = self.getvalue()
+        return json.loads(data) if self._plain_json else orjson.loads(data)
+
+    def getvalue(self) -> bytes:
+        rows = b'[' + b','.join(self._chunks) + b']'
+        if self.layout == 'rows':
+            return b'{"columns":' + self._dumps(self._keys) + b',"rows":' + rows + b'}'
+        return rows
+
+
+def encode_batches(encoder: Any, batches: Iterable[Sequence[Sequence[Any]]]) -> bytes:
+    """Feed every batch to the encoder and return the encoded bytes"""
+    for batch in batches:
+        encoder.write(batch)
+    return encoder.getvalue()
+
+
+# Blob metadata of the columnar formats
+COLUMNAR_FORMATS = {
+    'arrow': {'mime_type': 'application/vnd.apache.arrow.stream', 'filename': 'result.arrow'},
+    'parquet': {'mime_type': 'application/vnd.apache.parquet', 'filename': 'result.parquet'},
+}
+PARQUET_ROW_GROUP_ROWS = 65536
+# Scale of decimal columns whose scale the cursor does not declare, such as avg() over unconstrained
+# numeric: later batches may hold more fractional digits than the first, so leave room for them
+DECIMAL_SCALE = 18
+DECIMAL_PRECISION = 38
+
+
+def _arrow_type(sample: Any, column: Sequence[Any], scale: int | None = None) -> tuple[Any, Converter | None]:
+    """
+    Arrow type and optional value converter for a column, decided from its first batch
+    :param scale: Numeric scale the cursor declares for the column, None when unknown
+    """
+    import pyarrow as pa
+
+    if sample is None:
+        # Type unknown from the first batch, carry it as text
+        return pa.string(), _null_safe(_to_text)
+    if isinstance(sample, Decimal):
+        if scale is None:
+            # Fixed scale for the whole stream: at least the widest value seen, widened up to
+            # DECIMAL_SCALE as far as the integer digits seen leave room
+            finite = [value for value in column if isinstance(value, Decimal) and value.is_finite()]
+            seen = max((-value.as_tuple().exponent for value in finite), default=0)
+            integer_digits = max((value.adjusted() + 1 for value in finite if value), default=1)
+            scale = max(seen, min(DECIMAL_SCALE, DECIMAL_PRECISION - integer_digits))
+        return pa.decimal128(DECIMAL_PRECISION, max(0, min(scale, DECIMAL_PRECISION))), None
+    if isinstance(sample, (dict, list)):
+        return pa.string(), _null_safe(_to_text)
+    if isinstance(sample, memoryview):
+        return pa.binary(), _null_safe(bytes)
+    try:
+        # Infer over the whole first batch so e.g. mixed int/float widens to double
+        return pa.array(column).type, None
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.string(), _null_safe(_to_text)
+
+
+def _to_array(values: Sequence[Any], arrow_type: Any) -> Any:
+    """Typed array of a column, rounding decimals that carry more fractional digits than the stream's scale"""
+    import pyarrow as pa
+
+    try:
+        return pa.array(values, type=arrow_type)
+    except pa.ArrowInvalid:
+        if not pa.types.is_decimal(arrow_type):
+            raise
+    quantum = Decimal(1).scaleb(-arrow_type.scale)
+    context = Context(prec=arrow_type.precision)
+    try:
+        return pa.array(
+            [value.quantize(quantum, context=context) if isinstance(value, Decimal) else value for value in values],
+            type=arrow_type
+        )
+    except (InvalidOperation, pa.ArrowInvalid):
+        raise ValueError(f"Decimal value does not fit {arrow_type}, use the csv or json result format")
+
+
+class ArrowEncoder:
+    """
+    Columnar encoder producing an Arrow IPC stream or a Parquet file.
+    Each row batch is transposed into typed column arrays and written as one
+    record batch (gathered into row groups for Parquet), so numbers and timestamps travel as compact
+    typed buffers instead of per-row JSON objects. Requires pyarrow.
+    """
+
+    def __init__(self, keys: Sequence[str], result_format: str = 'arrow', scales: Sequence[int | None] | None = None):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError(f"The {result_format} result format requires the pyarrow package")
+        if result_format not in COLUMNAR_FORMATS:
+            raise ValueError(f"Unsupported columnar format: {result_format}")
+        self.result_format = result_format
+        self._keys = list(keys)
+        # Declared numeric scale per column, fixes the decimal128 scale before any value is seen
+        self._scales = list(scales) if scales else [None] * len(self._keys)
+        self._sink = io.BytesIO()
+        self._writer: Any = None
+        self._schema: Any = None
+        self._converters: list[Converter | None] = []
+        self._pending: list[Any] = []
+        self._pending_rows = 0
+        self._pending_bytes = 0
+
+    def _open(self, columns: list[Sequence[Any]]) -> None:
+        import pyarrow as pa
+
+        samples = [next((value for value in column if value is not None), None) for column in columns]
+        types = []
+        for sample, column, scale in zip(samples, columns, self._scales):
+            arrow_type, convert = _arrow_type(sample, column, scale)
+            types.append(arrow_type)
+            self._converters.append(convert)
+        self._start(pa.schema(list(zip(self._keys, types))))
+
+    def _start(self, schema: Any) -> None:
+        import pyarrow as pa
+
+        self._schema = schema
+        if self.result_format == 'parquet':
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(self._sink, schema, compression='zstd')
+        else:
+            self._writer = pa.ipc.new_stream(self._sink, schema)
+
+    def write(self, batch: Sequence[Sequence[Any]]) -> None:
+        if not batch:
+            return
+        import pyarrow as pa
+
+        columns = list(zip(*batch))
+        if self._writer is None:
+            self._open(columns)
+        arrays = [
+            _to_array(column if convert is None else [convert(value) for value in column], field.type)
+            for column, convert, field in zip(columns, self._converters, self._schema)
+        ]
+        record_batch = pa.RecordBatch.from_arrays(arrays, schema=self._schema)
+        if self.result_format == 'parquet':
+            # Every Parquet write is a row group, so gather batches into reasonably sized groups
+            self._pending.append(record_batch)
+            self._pending_rows += record_batch.num_rows
+            self._pending_bytes += record_batch.nbytes
+            if self._pending_rows >= PARQUET_ROW_GROUP_ROWS:
+                self._flush()
+        else:
+            self._writer.write_batch(record_batch)
+
+    def _flush(self) -> None:
+        import pyarrow as pa
+
+        if self._pending:
+            self._writer.write_table(pa.Table.from_batches(self._pending, schema=self._schema))
+            self._pending = []
+            self._pending_rows = 0
+            self._pending_bytes = 0
+
+    @property
+    def size(self) -> int:
+        """Bytes written, plus the in-memory size of record batches still gathered for a Parquet row group"""
+        return self._sink.tell() + self._pending_bytes
+
+    def getvalue(self) -> bytes:
+        if self._writer is None:
+            import pyarrow as pa
+            # No rows: emit a valid file with every column typed as text
+            self._start(pa.schema([(key, pa.string()) for key in self._keys]))
+        self._flush()
+        self._writer.close()
+        return self._sink.getvalue()
@@ -0,0 +1,160 @@
+# utils/schema_cache.py
+import hashlib
+import json
+import threading
+import time
+import zlib
+from collections.abc import Callable
+from typing import Any
+from utils.plugin_storage import storage_budget
+from utils.tracing import register_stats
+
+# Seconds a cached schema is served without running the change probe
+SCHEMA_CACHE_TTL = 300
+STORAGE_KEY_PREFIX = 'schema:'
+
+
+class SchemaEntry:
+    """Cached schema of one database with a change signature per table"""
+
+    def __init__(self, tables: dict[str, Any], signatures: dict[str, str], checked_at: float):
+        self.tables = tables
+        self.signatures = signatures
+        self.checked_at = checked_at
+
+    def to_bytes(self) -> bytes:
+        payload = {'tables': self.tables, 'signatures': self.signatures, 'checked_at': self.checked_at}
+        return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), 9)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'SchemaEntry':
+        payload = json.loads(zlib.decompress(data).decode('utf-8'))
+        return cls(payload['tables'], payload['signatures'], payload['checked_at'])
+
+
+class SchemaCache:
+    """
+    In-memory schema metadata cache, optionally persisted to Dify plugin storage.
+    Entries younger than ttl are served as-is. Older entries are validated with
+    a cheap probe returning one signature per table, and only tables whose
+    signature changed are fetched again.
+    """
+
+    def __init__(self, ttl: float = SCHEMA_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: dict[tuple, SchemaEntry] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.refreshes = 0
+        self.loads = 0
+
+    def get_schema(
+        self,
+        key: tuple,
+        probe: Callable[[], dict[str, str]],
+        fetch: Callable[[list[str] | None], dict[str, Any]],
+        storage: Any = None,
+        ttl: float | None = None
+    ) -> dict[str, Any]:
+        """
+        Return the schema of the database identified by key
+        :param key: Connection identity of the database
+        :param probe: Returns {table_name: signature} for every table
+        :param fetch: Returns table metadata for the given table names, or for all tables when None
+        :param storage: Optional plugin storage (session.storage) used to persist snapshots
+        :param ttl: Override of the cache TTL in seconds
+        :return: Dictionary keyed by table name, as returned by get_db_schema
+        """
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None and storage is not None:
+            entry = self._load(key, storage)
+
+        if entry is not None and now - entry.checked_at < ttl:
+            with self._lock:
+                self.hits += 1
+                self._entries[key] = entry
+            return entry.tables
+
+        signatures = probe()
+        if entry is None:
+            tables = fetch(None)
+            # A fetch that skipped tables after a partial failure leaves them unsigned, so the next probe retries them
+            signatures = {name: sig for name, sig in signatures.items() if name in tables}
+            entry = SchemaEntry(tables, signatures, now)
+            changed = True
+            with self._lock:
+                self.loads += 1
+        else:
+            stale = [name for name, sig in signatures.items() if entry.signatures.get(name) != sig]
+            removed = entry.tables.keys() - signatures.keys()
+            if not stale and not removed:
+                # Keep the same tables dict, indexes built on it are cached by its identity
+                tables = entry.tables
+            else:
+                tables = {name: info for name, info in entry.tables.items() if name not in removed}
+            if stale:
+                fetched = fetch(stale)
+                tables.update(fetched)
+                skipped = set(stale) - fetched.keys()
+                if skipped:
+                    signatures = {name: sig for name, sig in signatures.items() if name not in skipped}
+            # Swap in a new entry so concurrent readers never see a half-updated one
+            entry = SchemaEntry(tables, signatures, now)
+            changed = bool(stale or removed)
+            with self._lock:
+                self.refreshes += 1
+        with self._lock:
+            self._entries[key] = entry
+        # A probe that found no change only moves checked_at, not worth a storage write
+        if storage is not None and changed:
+            self._save(key, entry, storage)
+        return entry.tables
+
+    def invalidate(self, key: tuple | None = None) -> None:
+        """Drop one database, or every database when key is None, from memory"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                'databases': len(self._entries),
+                'hits': self.hits,
+                'refreshes': self.refreshes,
+                'loads': self.loads
+            }
+
+    def _storage_key(self, key: tuple) -> str:
+        return STORAGE_KEY_PREFIX + hashlib.sha256(repr(key).encode('utf-8')).hexdigest()[:32]
+
+    def _load(self, key: tuple, storage: Any) -> SchemaEntry | None:
+        try:
+            data = storage.get(self._storage_key(key))
+        except Exception:
+            # Nothing persisted yet for this database
+            return None
+        try:
+            return SchemaEntry.from_bytes(data) if data else None
+        except (ValueError, KeyError, zlib.error) as e:
+            print(f"Warning: ignoring unreadable schema cache snapshot: {e}")
+            return None
+
+    def _save(self, key: tuple, entry: SchemaEntry, storage: Any) -> None:
+        data = entry.to_bytes()
+        try:
+            # Shares the storage quota with the SQL cache, older snapshots are evicted to make room
+            if not storage_budget.set(storage, self._storage_key(key), data):
+                print(f"Warning: schema cache snapshot of {len(data)} bytes exceeds the snapshot limit, keeping it in memory only")
+        except Exception as e:
+            print(f"Warning: failed to persist schema cache snapshot: {e}")
+
+
+# Shared by every text2data invocation within the plugin process
+schema_cache = SchemaCache()
+register_stats('schema_cache', schema_cache.stats)
@@ -0,0 +1,212 @@
+# utils/schema_retriever.py
+import math
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any
+
+# Tables kept in the prompt when the schema does not fit the token budget
+DEFAULT_TOP_K = 20
+# Rough prompt budget for the schema DSL
+DEFAULT_TOKEN_BUDGET = 6000
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Field weights: a hit on the table name counts more than one on a column
+TABLE_NAME_WEIGHT = 3
+TABLE_COMMENT_WEIGHT = 2
+INDEX_CACHE_SIZE = 8
+
+_WORD_RE = re.compile(r'[A-Za-z]+|[0-9]+|[一-鿿]+')
+_CAMEL_RE = re.compile(r'(?<=[a-z])(?=[A-Z])')
+_CJK_RE = re.compile(r'[一-鿿]')
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate: about four ASCII characters per token, one token per CJK character"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split identifiers, comments and questions into index terms.
+    ASCII words are split on underscores and camelCase, lowercased and lightly
+    de-pluralized; Chinese runs become character unigrams and bigrams, so the
+    index works without a word segmenter or any embedding service.
+    """
+    terms = []
+    for word in _WORD_RE.findall(_CAMEL_RE.sub(' ', text)):
+        if _CJK_RE.match(word):
+            terms.extend(word)
+            terms.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            word = word.lower()
+            if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+                word = word[:-1]
+            terms.append(word)
+    return terms
+
+
+def _short_name(table_name: str) -> str:
+    return table_name.rsplit('.', 1)[-1].lower()
+
+
+class SchemaIndex:
+    """
+    BM25 index over table names, column names and comments of one schema.
+    Built once per cached schema; a search is a few dictionary lookups per query term.
+    """
+
+    def __init__(self, schema: dict[str, Any]):
+        self.table_names = list(schema.keys())
+        self._postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        self._doc_lengths: list[int] = []
+        # Estimated DSL tokens of each table with and without comments
+        self.tokens_with_comment: list[int] = []
+        self.tokens_without_comment: list[int] = []
+        self._neighbors: dict[str, set[str]] = defaultdict(set)
+
+        by_short_name: dict[str, list[str]] = defaultdict(list)
+        for name in self.table_names:
+            by_short_name[_short_name(name)].append(name)
+
+        for doc_id, (name, info) in enumerate(schema.items()):
+            terms = tokenize(name) * TABLE_NAME_WEIGHT + tokenize(info.get('comment') or '') * TABLE_COMMENT_WEIGHT
+            plain_text = name
+            comment_text = info.get('comment') or ''
+            for col in info['columns']:
+                terms.extend(tokenize(col['name']))
+                if col.get('comment'):
+                    terms.extend(tokenize(col['comment']))
+                    comment_text += col['comment']
+                plain_text += col['name'] + col['type']
+                self._link_by_column(name, col['name'], by_short_name)
+            for ref in info.get('references', []):
+                if ref in schema and ref != name:
+                    self._neighbors[name].add(ref)
+                    self._neighbors[ref].add(name)
+
+            frequencies: dict[str, int] = defaultdict(int)
+            for term in terms:
+                frequencies[term] += 1
+            for term, freq in frequencies.items():
+                self._postings[term].append((doc_id, freq))
+            self._doc_lengths.append(len(terms))
+            # Each column adds separators and a short type alias on top of its name
+            base = estimate_tokens(plain_text) + 2 * len(info['columns']) + 4
+            self.tokens_without_comment.append(base)
+            self.tokens_with_comment.append(base + estimate_tokens(comment_text))
+
+        self._avg_length = sum(self._doc_lengths) / len(self._doc_lengths) if self._doc_lengths else 0.0
+
+    def _link_by_column(self, table_name: str, column_name: str, by_short_name: dict[str, list[str]]) -> None:
+        """Treat a column like user_id as a join to a table named user or users"""
+        column_name = column_name.lower()
+        if not column_name.endswith('_id') or len(column_name) <= 3:
+            return
+        stem = column_name[:-3]
+        for candidate in (stem, stem + 's', stem + 'es'):
+            for target in by_short_name.get(candidate, []):
+                if target != table_name:
+                    self._neighbors[table_name].add(target)
+                    self._neighbors[target].add(table_name)
+
+    def search(self, query: str) -> list[tuple[str, float]]:
+        """Return (table_name, score) pairs with a positive score, best first"""
+        doc_count = len(self.table_names)
+        scores: dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, freq in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[doc_id] / self._avg_length)
+                scores[doc_id] += idf * freq * (BM25_K1 + 1) / (freq + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [(self.table_names[doc_id], score) for doc_id, score in ranked]
+
+    def neighbors(self, table_name: str) -> set[str]:
+        """Tables joined to table_name by a declared foreign key or a <table>_id column"""
+        return self._neighbors.get(table_name, set())
+
+
+_index_cache: OrderedDict[int, tuple[dict[str, Any], SchemaIndex]] = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def get_schema_index(schema: dict[str, Any]) -> SchemaIndex:
+    """
+    Return the index of a schema dict, building it on first use.
+    Indexes are cached by the identity of the dict, which get_db_schema keeps
+    stable for as long as the schema cache entry is unchanged.
+    """
+    key = id(schema)
+    with _index_lock:
+        cached = _index_cache.get(key)
+        if cached is not None and cached[0] is schema:
+            _index_cache.move_to_end(key)
+            return cached[1]
+    index = SchemaIndex(schema)
+    with _index_lock:
+        # Holding a reference to the schema keeps its id from being reused while cached
+        _index_cache[key] = (schema, index)
+        _index_cache.move_to_end(key)
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def prune_schema(
+        schema: dict[str, Any],
+        query: str,
+        top_k: int = DEFAULT_TOP_K,
+        token_budget: int = DEFAULT_TOKEN_BUDGET,
+        with_comment: bool = False
+) -> dict[str, Any]:
+    """
+    Keep only the tables relevant to a question
+    :param schema: Structure returned by get_db_schema
+    :param query: Natural language question
+    :param top_k: Maximum number of ranked tables to keep, 0 disables pruning
+    :param token_budget: Estimated token budget for the tables kept
+    :param with_comment: Whether comments will be rendered, they count against the budget
+    :return: Schema restricted to the best matching tables plus their join neighbors
+    """
+    if top_k <= 0 or not schema:
+        return schema
+    index = get_schema_index(schema)
+    costs = index.tokens_with_comment if with_comment else index.tokens_without_comment
+    if len(schema) <= top_k and sum(costs) <= token_budget:
+        return schema
+
+    position = {name: i for i, name in enumerate(index.table_names)}
+    selected: list[str] = []
+    used = 0
+
+    def take(name: str) -> bool:
+        nonlocal used
+        cost = costs[position[name]]
+        if name in selected or used + cost > token_budget:
+            return False
+        selected.append(name)
+        used += cost
+        return True
+
+    ranked = [name for name, _ in index.search(query)]
+    for name in ranked:
+        if len(selected) >= top_k:
+            break
+        take(name)
+    # Related tables are needed to write the joins, add them while the budget allows
+    for name in list(selected):
+        for neighbor in sorted(index.neighbors(name)):
+            take(neighbor)
+    if not selected:
+        # Nothing matched the question, fall back to catalog order within the budget
+        for name in index.table_names:
+            if len(selected) >= top_k:
+                break
+            take(name)
+    return {name: schema[name] for name in selected}
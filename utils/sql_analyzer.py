@@ -0,0 +1,359 @@
+# utils/sql_analyzer.py
+import hashlib
+import re
+from functools import lru_cache
+
+# Token kinds produced by the tokenizer
+STRING = 'string'
+QUOTED = 'quoted'
+NUMBER = 'number'
+PARAM = 'param'
+WORD = 'word'
+OP = 'op'
+
+# Whitespace and comments are skipped in front of each token by the pattern itself,
+# atomically so a comment is never re-read as tokens; at the end an empty match remains
+_COMMENTS = r'--[^\n]*|/\*.*?(?:\*/|\Z){extra}'
+_NUMBER = r'(?P<number>0[xX][0-9A-Fa-f]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)'
+_WORD = r'(?P<word>[^\W\d][\w$]*)'
+_OP = r'(?P<op>::|<>|!=|<=|>=|\|\||->>|->|#>>|#>|@>|<@|&&|\S)'
+_DIALECT_PATTERNS = {
+    'postgresql': (
+        _COMMENTS.format(extra=''),
+        r"(?P<string>[Ee]'(?:[^'\\]|\\.|'')*(?:'|\Z)|(?:[BbXxNn]|[Uu]&)?'(?:[^']|'')*(?:'|\Z)"
+        r"|\$(?P<tag>(?:[^\W\d]\w*)?)\$.*?(?:\$(?P=tag)\$|\Z))",
+        r'(?P<quoted>(?:[Uu]&)?"(?:[^"]|"")*(?:"|\Z))',
+        r'(?P<param>%\(\w+\)s|%s|\$\d+|(?<!:):\w+|\?)',
+    ),
+    'mysql': (
+        _COMMENTS.format(extra=r'|#[^\n]*'),
+        r"(?P<string>(?:[Nn]|_\w+)?'(?:[^'\\]|\\.|'')*(?:'|\Z)|\"(?:[^\"\\]|\\.|\"\")*(?:\"|\Z))",
+        r'(?P<quoted>`(?:[^`]|``)*(?:`|\Z))',
+        r'(?P<param>%\(\w+\)s|%s|(?<!:):\w+|@@?\w+|\?)',
+    ),
+    'sqlserver': (
+        _COMMENTS.format(extra=''),
+        r"(?P<string>[Nn]?'(?:[^']|'')*(?:'|\Z))",
+        r'(?P<quoted>\[(?:[^\]]|\]\])*(?:\]|\Z)|"(?:[^"]|"")*(?:"|\Z))',
+        r'(?P<param>%\(\w+\)s|%s|(?<!:):\w+|@@?\w+|\?)',
+    ),
+}
+DIALECTS = {'hologres': 'postgresql', 'postgresql': 'postgresql', 'mysql': 'mysql', 'sqlserver': 'sqlserver'}
+_TOKEN_RES = {
+    dialect: re.compile(
+        rf'(?>(?:\s+|{comments})*)(?:(?P<end>\Z)|' + '|'.join((string, quoted, _NUMBER, param, _WORD, _OP)) + ')',
+        re.DOTALL
+    )
+    for dialect, (comments, string, quoted, param) in _DIALECT_PATTERNS.items()
+}
+
+# Statements that only read, by first keyword
+READ_ONLY_COMMANDS = frozenset({'select', 'with', 'values', 'table', 'show', 'explain', 'describe', 'desc'})
+# Keywords that start a data or schema changing statement wherever a statement may start
+WRITE_COMMANDS = frozenset({
+    'insert', 'update', 'delete', 'merge', 'upsert', 'replace', 'truncate', 'drop', 'alter', 'create',
+    'rename', 'comment', 'grant', 'revoke', 'copy', 'load', 'import', 'call', 'exec', 'execute', 'do',
+    'set', 'reset', 'lock', 'vacuum', 'reindex', 'cluster', 'refresh', 'handler', 'discard', 'prepare'
+})
+# Writes that change or destroy existing data, as reported in StatementInfo.writes
+DATA_CHANGING_WRITES = frozenset({
+    'insert', 'update', 'delete', 'merge', 'upsert', 'replace', 'truncate', 'drop', 'alter', 'select into'
+})
+# Functions that change state, block or reach outside the database, even inside a SELECT
+SIDE_EFFECT_FUNCTIONS = frozenset({
+    'nextval', 'setval', 'set_config', 'pg_terminate_backend', 'pg_cancel_backend', 'pg_reload_conf',
+    'pg_advisory_lock', 'pg_advisory_xact_lock', 'lo_import', 'lo_export', 'lo_unlink', 'dblink_exec',
+    'pg_file_write', 'pg_read_file', 'pg_sleep', 'sleep', 'benchmark', 'get_lock', 'xp_cmdshell'
+})
+# Keywords after which a write keyword starts a nested statement
+_COMMAND_PREFIXES = frozenset({'explain', 'analyze', 'analyse', 'verbose'})
+# Keywords followed by a table reference
+_TABLE_KEYWORDS = frozenset({'from', 'join', 'into', 'update', 'table', 'truncate'})
+# Keywords between a table keyword and the table name
+_TABLE_MODIFIERS = frozenset({'only', 'lateral', 'if', 'exists', 'not', 'ignore', 'low_priority', 'quick', 'temporary', 'temp', 'unlogged'})
+# Keywords that end a FROM list
+_CLAUSE_KEYWORDS = frozenset({
+    'where', 'group', 'order', 'having', 'limit', 'offset', 'fetch', 'union', 'intersect', 'except',
+    'window', 'on', 'using', 'for', 'returning', 'set', 'values', 'select', 'into', 'top', 'qualify'
+})
+# Words that can never be a table name, so they end a pending table reference
+RESERVED_WORDS = frozenset({
+    'select', 'from', 'where', 'group', 'order', 'by', 'having', 'limit', 'offset', 'union', 'intersect',
+    'except', 'all', 'distinct', 'as', 'on', 'using', 'join', 'inner', 'outer', 'left', 'right', 'full',
+    'cross', 'natural', 'and', 'or', 'not', 'in', 'is', 'null', 'like', 'between', 'case', 'when', 'then',
+    'else', 'end', 'with', 'values', 'set', 'into', 'for', 'of', 'nowait', 'skip', 'share', 'update',
+    'delete', 'insert', 'returning', 'window', 'fetch', 'default', 'true', 'false'
+})
+# Keywords, lowercased in normalized text on case-sensitive dialects and never taken for function names
+_KEYWORDS = (
+    READ_ONLY_COMMANDS | WRITE_COMMANDS | RESERVED_WORDS | _CLAUSE_KEYWORDS | _TABLE_MODIFIERS | _TABLE_KEYWORDS
+    | frozenset({'exists', 'any', 'some', 'array', 'over', 'filter', 'within', 'top'})
+)
+_QUERY_STARTS = frozenset({'select', 'with', 'values', 'table'})
+
+
+# A token is a (kind, text, lowercased text) tuple
+Token = tuple[str, str, str]
+
+
+def tokenize_sql(sql: str, dialect: str = 'postgresql') -> list[Token]:
+    """
+    Split SQL into significant tokens in one regex pass, whitespace and comments dropped
+    :param sql: SQL text, possibly several statements
+    :param dialect: Database type or dialect name, see DIALECTS
+    """
+    token_re = _TOKEN_RES[DIALECTS.get(dialect.lower(), 'postgresql')]
+    tokens = []
+    for match in token_re.finditer(sql):
+        kind = match.lastgroup
+        if kind != 'end':
+            text = match.group(kind)
+            tokens.append((kind, text, text.lower()))
+    return tokens
+
+
+def split_statements(sql: str, dialect: str = 'postgresql') -> list[str]:
+    """
+    Split SQL into its statements on top-level ';', which quoting and comments cannot fake
+    :return: Statement texts without terminators, empty statements dropped
+    """
+    token_re = _TOKEN_RES[DIALECTS.get(dialect.lower(), 'postgresql')]
+    statements = []
+    start = 0
+    depth = 0
+    for match in token_re.finditer(sql):
+        if match.lastgroup != OP:
+            continue
+        text = match.group(OP)
+        if text == '(':
+            depth += 1
+        elif text == ')' and depth > 0:
+            depth -= 1
+        elif text == ';' and depth == 0:
+            statements.append(sql[start:match.start(OP)])
+            start = match.end(OP)
+    statements.append(sql[start:])
+    return [statement.strip() for statement in statements if tokenize_sql(statement, dialect)]
+
+
+class StatementInfo:
+    """Classification of one statement"""
+
+    def __init__(self, command: str, writes: frozenset[str], tables: tuple[str, ...]):
+        # First keyword, e.g. 'select'
+        self.command = command
+        # Writing operations found anywhere in the statement, e.g. {'delete'} or {'select into'}
+        self.writes = writes
+        self.tables = tables
+
+    @property
+    def read_only(self) -> bool:
+        return self.command in READ_ONLY_COMMANDS and not self.writes
+
+
+class SqlAnalysis:
+    """
+    Result of analyze_sql.
+    normalized has comments and insignificant whitespace removed and keywords lowercased;
+    parameterized additionally replaces literals by ? and collapses literal lists.
+    digest identifies the exact query, fingerprint its shape regardless of literal values.
+    """
+
+    def __init__(self, statements: tuple[StatementInfo, ...], normalized: str, parameterized: str):
+        self.statements = statements
+        self.normalized = normalized
+        self.parameterized = parameterized
+        self.digest = hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:16]
+        self.fingerprint = hashlib.sha256(parameterized.encode('utf-8')).hexdigest()[:16]
+
+    @property
+    def read_only(self) -> bool:
+        return bool(self.statements) and all(statement.read_only for statement in self.statements)
+
+    @property
+    def writes(self) -> frozenset[str]:
+        return frozenset().union(*(statement.writes for statement in self.statements))
+
+    @property
+    def tables(self) -> tuple[str, ...]:
+        seen: dict[str, None] = {}
+        for statement in self.statements:
+            seen.update(dict.fromkeys(statement.tables))
+        return tuple(seen)
+
+
+def _identifier(token: Token, fold_case: bool) -> str:
+    """Name of an identifier token: quotes removed, unquoted names folded like the server does"""
+    kind, text, lower = token
+    if kind == QUOTED:
+        if text[:2] in ('U&', 'u&'):
+            text = text[2:]
+        closing = ']' if text[0] == '[' else text[0]
+        return text[1:-1].replace(closing * 2, closing) if text.endswith(closing) and len(text) > 1 else text[1:]
+    return lower if fold_case else text
+
+
+def _scan_statement(tokens: list[Token], fold_case: bool) -> StatementInfo:
+    """Single forward scan over the tokens of one statement"""
+    command = next((lower for kind, _, lower in tokens if kind == WORD), '')
+    writes: set[str] = set()
+    tables: dict[str, None] = {}
+    cte_names: set[str] = set()
+    # FROM lists open per parenthesis depth, so a comma there starts another table
+    from_lists: set[int] = set()
+    # Per open parenthesis, whether it holds function arguments, where FROM is no table keyword
+    calls: list[bool] = []
+    depth = 0
+    table_keyword = None
+    previous: Token | None = None
+    count = len(tokens)
+    i = 0
+    while i < count:
+        token = tokens[i]
+        kind, text, lower = token
+        following = tokens[i + 1][2] if i + 1 < count else None
+
+        if kind == OP:
+            if text == '(':
+                depth += 1
+                calls.append(
+                    previous is not None and previous[0] == WORD and previous[2] not in _KEYWORDS
+                    and following not in _QUERY_STARTS
+                )
+            elif text == ')':
+                from_lists.discard(depth)
+                depth = max(0, depth - 1)
+                if calls:
+                    calls.pop()
+            elif text == ',' and depth in from_lists:
+                table_keyword = 'from'
+                previous = token
+                i += 1
+                continue
+            if text == '(' and table_keyword in ('from', 'join') and following not in _QUERY_STARTS:
+                # FROM (a JOIN b ON ...) nests table references, not a subquery
+                from_lists.add(depth)
+            elif text != '.':
+                table_keyword = None
+        elif kind == WORD:
+            at_command_position = (
+                previous is None
+                or previous[1] == '('
+                # The main statement after a CTE list, or after EXPLAIN (options)
+                or (previous[1] == ')' and depth == 0 and command in ('with', 'explain'))
+                or (previous[0] == WORD and previous[2] in _COMMAND_PREFIXES)
+            )
+            is_call = following == '('
+            if lower in WRITE_COMMANDS and at_command_position and not is_call:
+                writes.add(lower)
+            elif lower in SIDE_EFFECT_FUNCTIONS and is_call:
+                writes.add(f"function {lower}")
+            elif lower == 'into' and command in READ_ONLY_COMMANDS and not writes:
+                writes.add('select into')
+            elif lower in ('update', 'share') and previous is not None and previous[2] in ('for', 'key', 'no'):
+                writes.add(f"for {lower}")
+                table_keyword = None
+                previous = token
+                i += 1
+                continue
+            elif command == 'with' and following == 'as' and depth == 0:
+                after = tokens[i + 2][2] if i + 2 < count else None
+                if after in ('(', 'materialized', 'not'):
+                    cte_names.add(_identifier(token, fold_case))
+
+            if lower in _CLAUSE_KEYWORDS:
+                from_lists.discard(depth)
+            if lower in _TABLE_KEYWORDS and not (calls and calls[-1]):
+                table_keyword = lower
+                if lower == 'from':
+                    from_lists.add(depth)
+                previous = token
+                i += 1
+                continue
+            if table_keyword is not None and lower in _TABLE_MODIFIERS:
+                previous = token
+                i += 1
+                continue
+
+        if table_keyword is not None and (kind == QUOTED or (kind == WORD and lower not in RESERVED_WORDS)):
+            # Qualified name: ident(.ident)*
+            parts = [_identifier(token, fold_case)]
+            j = i + 1
+            while j + 1 < count and tokens[j][1] == '.' and tokens[j + 1][0] in (WORD, QUOTED):
+                parts.append(_identifier(tokens[j + 1], fold_case))
+                j += 2
+            # FROM f(...) is a table function, INTO t(...) a column list
+            if not (j < count and tokens[j][1] == '(' and table_keyword != 'into'):
+                tables['.'.join(parts)] = None
+            table_keyword = None
+            previous = tokens[j - 1]
+            i = j
+            continue
+        if kind != OP:
+            table_keyword = None
+        previous = token
+        i += 1
+
+    names = tuple(name for name in tables if name not in cte_names)
+    return StatementInfo(command, frozenset(writes), names)
+
+
+# Tokens written without a space before them in normalized text, neither can merge with a neighbour
+_NO_SPACE_BEFORE = frozenset({')', ','})
+_LITERAL_LIST_RE = re.compile(r'\(\?(?:, \?)+\)')
+
+
+@lru_cache(maxsize=512)
+def analyze_sql(sql: str, dialect: str = 'postgresql') -> SqlAnalysis:
+    """
+    Classify, normalize and fingerprint SQL without a database round trip
+    :param sql: SQL text, possibly several statements separated by ';'
+    :param dialect: Database type (hologres, mysql, sqlserver) or dialect name
+    :return: SqlAnalysis with per-statement read-only classification and referenced tables
+    """
+    dialect = DIALECTS.get(dialect.lower(), 'postgresql')
+    # Unquoted identifiers are case-insensitive on PostgreSQL; elsewhere only keywords are
+    fold_case = dialect == 'postgresql'
+    tokens = tokenize_sql(sql, dialect)
+    statements: list[StatementInfo] = []
+    normalized: list[str] = []
+    parameterized: list[str] = []
+    start = 0
+    depth = 0
+    # Whether the next token is written without a leading space
+    glue = True
+    previous_kind = None
+    for i, (kind, text, lower) in enumerate(tokens):
+        if kind == OP:
+            if text == ';' and depth == 0:
+                # Terminators are written only between statements, so empty statements vanish
+                if i > start:
+                    statements.append(_scan_statement(tokens[start:i], fold_case))
+                start = i + 1
+                continue
+            if text == '(':
+                depth += 1
+            elif text == ')' and depth > 0:
+                depth -= 1
+        elif kind == WORD and (fold_case or lower in _KEYWORDS):
+            text = lower
+        if i == start and statements:
+            normalized.append('; ')
+            parameterized.append('; ')
+            glue = True
+        # Qualified names are kept together; a dot next to a number would lex differently
+        dotted_name = text == '.' and previous_kind in (WORD, QUOTED)
+        if not (glue or dotted_name or text in _NO_SPACE_BEFORE):
+            normalized.append(' ')
+            parameterized.append(' ')
+        glue = text == '(' or (dotted_name and i + 1 < len(tokens) and (tokens[i + 1][0] in (WORD, QUOTED) or tokens[i + 1][1] == '*'))
+        previous_kind = kind
+        normalized.append(text)
+        parameterized.append('?' if kind == STRING or kind == NUMBER else text)
+    if start < len(tokens):
+        statements.append(_scan_statement(tokens[start:], fold_case))
+    return SqlAnalysis(
+        tuple(statements),
+        ''.join(normalized),
+        _LITERAL_LIST_RE.sub('(?)', ''.join(parameterized))
+    )
@@ -0,0 +1,245 @@
+# utils/sql_cache.py
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from typing import Any
+from utils.plugin_storage import storage_budget
+from utils.tracing import register_stats
+
+# Generated SQL is reused for a day unless a referenced table changes earlier
+SQL_CACHE_TTL = 86400
+# Entries kept per process across all scopes, and per persisted scope
+SQL_CACHE_SIZE = 1000
+SQL_CACHE_SCOPE_SIZE = 200
+# Words a fuzzy hit may add or drop, none of them changes what is asked. Negations and
+# prepositions are deliberately absent: "not shipped" or "from A to B" need different SQL
+STOPWORDS = frozenset({
+    'a', 'an', 'the', 'please', 'kindly', 'me', 'us', 'i', 'we', 'you', 'can', 'could', 'would',
+    'show', 'give', 'tell', 'what', 'is', 'are', 'was', 'were', 'do', 'does',
+    '的', '了', '吗', '呢', '吧', '啊', '请',
+})
+STORAGE_KEY_PREFIX = 'sqlcache:'
+
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+# Chinese characters one by one, other words whole
+_WORD_RE = re.compile(r'[一-鿿]|[^\W一-鿿]+')
+
+
+def normalize_question(question: str) -> str:
+    """Case-, width- and punctuation-insensitive form of a question"""
+    text = unicodedata.normalize('NFKC', question).lower()
+    text = _PUNCTUATION_RE.sub(' ', text)
+    return ' '.join(text.split())
+
+
+def content_words(normalized: str) -> tuple[str, ...]:
+    """Words and numbers of a normalized question that carry meaning, in order"""
+    return tuple(word for word in _WORD_RE.findall(normalized) if word not in STOPWORDS)
+
+
+def table_digest(table_info: dict[str, Any]) -> str:
+    """Digest of one table's metadata, changes whenever its columns, types or comments do"""
+    return hashlib.sha256(json.dumps(table_info, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+
+def referenced_tables(sql: str, schema: dict[str, Any]) -> list[str]:
+    """Tables of the schema whose name appears in the SQL as an identifier"""
+    words = set(re.findall(r'[\w$]+', sql.lower()))
+    return [name for name in schema if name.rsplit('.', 1)[-1].lower() in words]
+
+
+class SqlCacheEntry:
+    def __init__(self, question: str, sql: str, tables: dict[str, str], created_at: float):
+        self.question = question
+        self.sql = sql
+        # Referenced table name -> table_digest at generation time
+        self.tables = tables
+        self.created_at = created_at
+        self.words = content_words(question)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {'question': self.question, 'sql': self.sql, 'tables': self.tables, 'created_at': self.created_at}
+
+
+class SqlCache:
+    """
+    Question-to-SQL memoization for text2data.
+    Entries live in a scope describing everything besides the question that shapes
+    the generated SQL (database, model config, prompt and schema options). Lookups match the
+    normalized question; opt-in fuzzy lookups also accept a cached question with the same
+    words and numbers in the same order, differing only in STOPWORDS. A hit is dropped when
+    a table it references changed since the SQL was generated, and skipped while one is not
+    in the schema of the lookup.
+    """
+
+    def __init__(self, ttl: float = SQL_CACHE_TTL, max_entries: int = SQL_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # scope -> normalized question -> entry, scopes and entries both in LRU order
+        self._scopes: OrderedDict[str, OrderedDict[str, SqlCacheEntry]] = OrderedDict()
+        self._loaded_scopes: set[str] = set()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def scope_key(*parts: Any) -> str:
+        """Digest of the parts that must match for a cached SQL to be reusable"""
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, scope: str, question: str, schema: dict[str, Any], storage: Any = None, fuzzy: bool = False) -> str | None:
+        """
+        Return cached SQL for the question, or None
+        :param scope: Result of scope_key()
+        :param question: Natural language question
+        :param schema: Current schema from get_db_schema, used to validate referenced tables
+        :param storage: Optional plugin storage to load persisted entries from
+        :param fuzzy: Also accept a near-identical cached question, see _most_similar
+        """
+        if storage is not None:
+            self._load(scope, storage)
+        normalized = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            entries = self._scopes.get(scope)
+            entry = entries.get(normalized) if entries else None
+            fuzzy_hit = False
+            if entry is None and entries and fuzzy:
+                entry = self._most_similar(entries, normalized)
+                fuzzy_hit = entry is not None
+            if entry is None:
+                self.misses += 1
+                return None
+            tables = self._table_state(entry, schema)
+            if now - entry.created_at > self.ttl or tables == 'changed':
+                del entries[entry.question]
+                self._size -= 1
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            if tables == 'unknown':
+                # Not validated against this schema, the entry stays for calls that see its tables
+                self.misses += 1
+                return None
+            entries.move_to_end(entry.question)
+            self._scopes.move_to_end(scope)
+            if fuzzy_hit:
+                self.fuzzy_hits += 1
+            else:
+                self.hits += 1
+            return entry.sql
+
+    def put(self, scope: str, question: str, sql: str, schema: dict[str, Any], storage: Any = None) -> None:
+        """Remember the SQL generated for a question together with digests of the tables it uses"""
+        normalized = normalize_question(question)
+        tables = {name: table_digest(schema[name]) for name in referenced_tables(sql, schema)}
+        entry = SqlCacheEntry(normalized, sql, tables, time.time())
+        with self._lock:
+            entries = self._scopes.setdefault(scope, OrderedDict())
+            if normalized not in entries:
+                self._size += 1
+            entries[normalized] = entry
+            entries.move_to_end(normalized)
+            self._scopes.move_to_end(scope)
+            self._evict()
+            snapshot = [e.to_dict() for e in list(entries.values())[-SQL_CACHE_SCOPE_SIZE:]]
+        if storage is not None:
+            self._save(scope, snapshot, storage)
+
+    def _most_similar(self, entries: OrderedDict[str, SqlCacheEntry], normalized: str) -> SqlCacheEntry | None:
+        """
+        Most recently used cached question differing only in stopwords, spacing and punctuation.
+        Character similarity is no guide here: "active users" and "inactive users", or "shipped"
+        and "not shipped", look alike but need different SQL, as do questions differing in a
+        number (year, top-N, id). So every other word must match, in order.
+        """
+        words = content_words(normalized)
+        for entry in reversed(entries.values()):
+            if entry.words == words:
+                return entry
+        return None
+
+    @staticmethod
+    def _table_state(entry: SqlCacheEntry, schema: dict[str, Any]) -> str:
+        """
+        'unchanged' when every table the entry references has its digest, 'changed' when one differs,
+        'unknown' when one is missing from the schema, e.g. one restricted by table_names
+        """
+        state = 'unchanged'
+        for name, digest in entry.tables.items():
+            table_info = schema.get(name)
+            if table_info is None:
+                state = 'unknown'
+            elif table_digest(table_info) != digest:
+                return 'changed'
+        return state
+
+    def _evict(self) -> None:
+        """Drop least recently used entries beyond max_entries, caller must hold the lock"""
+        while self._size > self.max_entries and self._scopes:
+            scope, entries = next(iter(self._scopes.items()))
+            if entries:
+                entries.popitem(last=False)
+                self._size -= 1
+            if not entries:
+                del self._scopes[scope]
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.fuzzy_hits + self.misses
+            return {
+                'entries': self._size,
+                'hits': self.hits,
+                'fuzzy_hits': self.fuzzy_hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': (self.hits + self.fuzzy_hits) / lookups if lookups else 0.0
+            }
+
+    def _storage_key(self, scope: str) -> str:
+        return STORAGE_KEY_PREFIX + scope[:32]
+
+    def _load(self, scope: str, storage: Any) -> None:
+        with self._lock:
+            if scope in self._loaded_scopes:
+                return
+            self._loaded_scopes.add(scope)
+        try:
+            data = storage.get(self._storage_key(scope))
+        except Exception:
+            # Nothing persisted yet for this scope
+            return
+        try:
+            items = json.loads(zlib.decompress(data).decode('utf-8')) if data else []
+        except (ValueError, zlib.error) as e:
+            print(f"Warning: ignoring unreadable SQL cache snapshot: {e}")
+            return
+        with self._lock:
+            entries = self._scopes.setdefault(scope, OrderedDict())
+            for item in items:
+                if item['question'] not in entries:
+                    entries[item['question']] = SqlCacheEntry(item['question'], item['sql'], item['tables'], item['created_at'])
+                    self._size += 1
+            self._evict()
+
+    def _save(self, scope: str, snapshot: list[dict[str, Any]], storage: Any) -> None:
+        data = zlib.compress(json.dumps(snapshot, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), 9)
+        try:
+            if not storage_budget.set(storage, self._storage_key(scope), data):
+                print(f"Warning: SQL cache snapshot of {len(data)} bytes exceeds the snapshot limit, keeping it in memory only")
+        except Exception as e:
+            print(f"Warning: failed to persist SQL cache: {e}")
+
+
+# Shared by every text2data invocation within the plugin process
+sql_cache = SqlCache()
+register_stats('sql_cache', sql_cache.stats)
@@ -0,0 +1,252 @@
+# utils/sql_stream.py
+import re
+from collections.abc import Iterable
+
+from utils.sql_analyzer import OP, QUOTED, WORD, Token, tokenize_sql
+
+_FENCE = '```'
+_STATEMENT_KEYWORDS = ('SELECT', 'WITH')
+# Language tag of a code fence, taken up to the first whitespace
+_FENCE_TAG_RE = re.compile(r'[\w+-]*(?=\s)')
+# Opening $tag$ of a dollar-quoted body, and a possibly incomplete one at the end of the buffer
+_DOLLAR_RE = re.compile(r'\$(?:[^\W\d]\w*)?\$')
+_PARTIAL_DOLLAR_RE = re.compile(r'\$(?:[^\W\d]\w*)?\Z')
+# Words after SELECT that always begin a select list
+_SELECT_LEADS = frozenset({'distinct', 'all', 'top', 'case', 'not', 'exists'})
+# Leading tokens an unfenced answer is judged on; only the first few decide
+_HEAD_CHARS = 256
+
+
+def _statement_follows(tokens: list[Token], complete: bool) -> bool | None:
+    """
+    Whether the tokens after a leading SELECT or WITH read as SQL rather than prose
+    :param tokens: Tokens of the text, the first one being SELECT or WITH
+    :param complete: No more tokens will arrive; otherwise None is returned until enough have
+    """
+    def token(index: int) -> Token | None:
+        if index < len(tokens):
+            return tokens[index]
+        if complete:
+            return None
+        raise IndexError
+
+    try:
+        keyword = tokens[0][2]
+        first = token(1)
+        if first is None:
+            return False
+        kind, text, lower = first
+        if keyword == 'select':
+            # SELECT *, SELECT 1, SELECT 'a', SELECT (...), SELECT DISTINCT ...; a lone $ is an unfinished $$ body
+            if kind != WORD:
+                return kind != OP or text in ('*', '(', '-', '$')
+            if lower in _SELECT_LEADS:
+                return True
+            # A select list item is followed by an operator, a comma, FROM or AS, not by more prose
+            second = token(2)
+            return second is None or second[0] == OP or second[2] in ('from', 'as')
+        # WITH [RECURSIVE] name [(columns)] AS [[NOT] MATERIALIZED] (
+        if lower == 'recursive':
+            return True
+        if kind not in (WORD, QUOTED):
+            return False
+        second = token(2)
+        if second is None or second[1] == '(':
+            return second is not None
+        if second[2] != 'as':
+            return False
+        third = token(3)
+        return third is not None and (third[1] == '(' or third[2] in ('materialized', 'not'))
+    except IndexError:
+        return None
+
+
+def starts_with_query(sql: str, dialect: str = 'postgresql') -> bool:
+    """Whether text begins with a SELECT or WITH query rather than prose that opens with those words"""
+    tokens = tokenize_sql(sql, dialect)
+    if not tokens or tokens[0][0] != WORD or tokens[0][1].upper() not in _STATEMENT_KEYWORDS:
+        return False
+    return bool(_statement_follows(tokens, True))
+
+
+class IncrementalSqlExtractor:
+    """
+    Detects the first complete SQL statement in a streamed LLM answer.
+    Text is fed chunk by chunk; feed() returns the statement as soon as the
+    closing code fence arrives or, for an unfenced answer, the terminating
+    semicolon outside quotes, dollar-quoted bodies and comments. An unfenced
+    answer counts as SQL only when SELECT or WITH is followed by SQL tokens.
+    Each character is scanned once.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        # Offset of the statement in the buffer once known, and of the next character to scan
+        self._sql_start: int | None = None
+        self._fenced = False
+        self._pos = 0
+        # Lexer state of the unfenced scan
+        self._quote: str | None = None
+        # Closing $tag$ while inside a dollar-quoted body
+        self._dollar: str | None = None
+        self._line_comment = False
+        self._block_comment = False
+        self.sql: str | None = None
+
+    @property
+    def text(self) -> str:
+        """Everything received so far"""
+        return self._buffer
+
+    def feed(self, chunk: str) -> str | None:
+        """Add a chunk of model output, return the SQL once a complete statement is available"""
+        if self.sql is not None:
+            return self.sql
+        self._buffer += chunk
+        if self._sql_start is None and not self._find_start():
+            return None
+        if self._fenced:
+            end = self._buffer.find(_FENCE, max(self._sql_start, self._pos - len(_FENCE) + 1))
+            if end < 0:
+                self._pos = len(self._buffer)
+                return None
+            self.sql = self._buffer[self._sql_start:end].strip()
+        else:
+            end = self._scan_terminator()
+            if end is None:
+                return None
+            self.sql = self._buffer[self._sql_start:end + 1].strip()
+        return self.sql
+
+    def finish(self) -> str:
+        """SQL from the whole answer, for a stream that ended without a detected terminator"""
+        if self.sql is not None:
+            return self.sql
+        if self._sql_start is None:
+            self._find_start(complete=True)
+        if self._sql_start is not None:
+            sql = self._buffer[self._sql_start:]
+            if self._fenced and sql.rstrip().endswith(_FENCE):
+                sql = sql.rstrip()[:-len(_FENCE)]
+            return sql.strip()
+        return self._buffer.strip()
+
+    def _find_start(self, complete: bool = False) -> bool:
+        """
+        Locate the beginning of the statement: inside the first code fence, or the answer itself
+        :param complete: The stream has ended, decide with what has arrived
+        """
+        fence = self._buffer.find(_FENCE, max(0, self._pos - len(_FENCE) + 1))
+        if fence >= 0:
+            start = fence + len(_FENCE)
+            tag = _FENCE_TAG_RE.match(self._buffer, start)
+            if tag is None:
+                if not complete:
+                    # Language tag of the fence not complete yet
+                    self._pos = fence
+                    return False
+            elif self._buffer[tag.end()] == '\n' or tag.group().lower() == 'sql':
+                # "```sql\n...", "```postgresql\n..." and the one-line "```sql SELECT 1```"
+                start = tag.end()
+            self._sql_start = self._pos = start
+            self._fenced = True
+            return True
+        if self._pos > 0:
+            # Prose before a code block, only a fence can start the statement now
+            return False
+        head = self._buffer.lstrip()
+        tokens = tokenize_sql(head[:_HEAD_CHARS])
+        if not tokens:
+            return False
+        word = tokens[0][1].upper() if tokens[0][0] == WORD else ''
+        decided = len(tokens) > 1 or complete or len(head) > _HEAD_CHARS
+        if word in _STATEMENT_KEYWORDS:
+            # The last token may still be growing, it only counts once the stream has ended
+            follows = _statement_follows(tokens if complete else tokens[:-1], complete)
+            if follows:
+                self._sql_start = self._pos = len(self._buffer) - len(head)
+                return True
+            if follows is None:
+                return False
+        elif not decided and word and any(keyword.startswith(word) for keyword in _STATEMENT_KEYWORDS):
+            # "SEL" may become SELECT with the next chunk
+            return False
+        self._pos = len(self._buffer)
+        return False
+
+    def _scan_terminator(self) -> int | None:
+        """Advance the lexer over new text, return the offset of a top-level ';' if one arrived"""
+        buffer = self._buffer
+        length = len(buffer)
+        i = self._pos
+        while i < length:
+            char = buffer[i]
+            if self._line_comment:
+                if char == '\n':
+                    self._line_comment = False
+            elif self._block_comment:
+                if char == '*':
+                    if i + 1 == length:
+                        # The next chunk decides whether the comment ends here
+                        break
+                    if buffer[i + 1] == '/':
+                        self._block_comment = False
+                        i += 1
+            elif self._dollar is not None:
+                end = buffer.find(self._dollar, i)
+                if end < 0:
+                    # Keep a partially received closing tag for the next chunk
+                    i = max(i, length - len(self._dollar) + 1)
+                    break
+                i = end + len(self._dollar)
+                self._dollar = None
+                continue
+            elif self._quote is not None:
+                # A doubled quote closes and reopens, which leaves the state unchanged
+                if char == self._quote:
+                    self._quote = None
+            elif char in ("'", '"', '`'):
+                self._quote = char
+            elif char == '$' and (i == 0 or not (buffer[i - 1].isalnum() or buffer[i - 1] in '_$')):
+                # $tag$ opens a body only where it cannot be part of an identifier or a $1 parameter
+                tag = _DOLLAR_RE.match(buffer, i)
+                if tag is not None:
+                    self._dollar = tag.group()
+                    i = tag.end()
+                    continue
+                if _PARTIAL_DOLLAR_RE.match(buffer, i):
+                    break
+            elif char in ('-', '/'):
+                if i + 1 == length:
+                    break
+                if char == '-' and buffer[i + 1] == '-':
+                    self._line_comment = True
+                    i += 1
+                elif char == '/' and buffer[i + 1] == '*':
+                    self._block_comment = True
+                    i += 1
+            elif char == ';':
+                self._pos = i + 1
+                return i
+            i += 1
+        self._pos = i
+        return None
+
+
+def extract_sql_from_stream(chunks: Iterable[str]) -> tuple[str, bool]:
+    """
+    Consume streamed text until the first complete SQL statement has arrived
+    :param chunks: Text deltas; a generator is closed as soon as the statement is complete
+    :return: Tuple of (SQL, or the whole answer when no terminator was seen; whether the stream was cut short)
+    """
+    extractor = IncrementalSqlExtractor()
+    iterator = iter(chunks)
+    try:
+        for chunk in iterator:
+            if extractor.feed(chunk) is not None:
+                return extractor.sql, True
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            close()
+    return extractor.finish(), False
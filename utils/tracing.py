@@ -0,0 +1,180 @@
+# utils/tracing.py
+import cProfile
+import io
+import json
+import pstats
+import time
+from collections.abc import Callable, Generator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+# off: spans are not recorded; log: one JSON line per invocation; output: also returned to the caller
+TRACE_MODES = ('off', 'log', 'output')
+# Functions listed in the profile of a slow invocation
+PROFILE_TOP_FUNCTIONS = 25
+# Counters of the process-wide caches, by name, reported with every recorded trace
+_stats_providers: dict[str, Callable[[], dict[str, Any]]] = {}
+
+
+def register_stats(name: str, provider: Callable[[], dict[str, Any]]) -> None:
+    """Report the counters provider() returns under name in the stats of every trace"""
+    _stats_providers[name] = provider
+
+
+class Span:
+    __slots__ = ('name', 'start', 'duration', 'depth', 'attrs')
+
+    def __init__(self, name: str, start: float, depth: int, attrs: dict[str, Any]):
+        self.name = name
+        self.start = start
+        self.duration = 0.0
+        self.depth = depth
+        self.attrs = attrs
+
+    def to_dict(self) -> dict[str, Any]:
+        span = {'name': self.name, 'start_ms': round(self.start * 1000, 2), 'duration_ms': round(self.duration * 1000, 2)}
+        if self.depth:
+            span['depth'] = self.depth
+        if self.attrs:
+            span['attrs'] = self.attrs
+        return span
+
+
+class _NullSpan:
+    """Stand-in returned while tracing is off, entering and annotating it does nothing"""
+    __slots__ = ()
+    attrs: dict[str, Any] = {}
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """
+    Named, nested timing spans of one tool invocation.
+    Spans are opened with the module-level span() so code deep in utils needs no tracer
+    argument; the active trace is found through a context variable.
+    """
+
+    def __init__(self, name: str, mode: str = 'log'):
+        if mode not in TRACE_MODES:
+            raise ValueError(f"Unsupported trace mode: {mode}")
+        self.name = name
+        self.mode = mode
+        self.spans: list[Span] = []
+        self.profile: str | None = None
+        # Cache counters at the end of the invocation, see register_stats
+        self.stats: dict[str, Any] | None = None
+        self._stack: list[Span] = []
+        self._origin = time.perf_counter()
+        self.duration = 0.0
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any) -> Generator[Span, None, None]:
+        span = Span(name, time.perf_counter() - self._origin, len(self._stack), attrs)
+        self.spans.append(span)
+        self._stack.append(span)
+        try:
+            yield span
+        finally:
+            span.duration = time.perf_counter() - self._origin - span.start
+            self._stack.pop()
+
+    def annotate(self, **attrs: Any) -> None:
+        """Attach attributes to the innermost open span"""
+        if self._stack:
+            self._stack[-1].attrs.update(attrs)
+
+    def durations(self) -> dict[str, float]:
+        """Milliseconds per top-level stage, repeated stages summed"""
+        totals: dict[str, float] = {}
+        for span in self.spans:
+            if span.depth == 0:
+                totals[span.name] = totals.get(span.name, 0.0) + span.duration * 1000
+        return {name: round(ms, 1) for name, ms in totals.items()}
+
+    def to_dict(self) -> dict[str, Any]:
+        trace = {
+            'name': self.name,
+            'duration_ms': round(self.duration * 1000, 1),
+            'spans': [span.to_dict() for span in self.spans]
+        }
+        if self.stats:
+            trace['stats'] = self.stats
+        if self.profile:
+            trace['profile'] = self.profile
+        return trace
+
+
+_current_trace: ContextVar[Trace | None] = ContextVar('current_trace', default=None)
+
+
+def span(name: str, **attrs: Any) -> Any:
+    """Context manager timing a stage of the active trace, a shared no-op while tracing is off"""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NULL_SPAN
+    return trace.span(name, **attrs)
+
+
+def annotate(**attrs: Any) -> None:
+    """Attach attributes to the innermost open span of the active trace, if any"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.annotate(**attrs)
+
+
+@contextmanager
+def start_trace(name: str, tool_parameters: dict[str, Any], collect: bool = False) -> Generator[Trace | None, None, None]:
+    """
+    Trace one tool invocation as configured by its parameters
+    :param name: Tool name, reported with the trace
+    :param tool_parameters: Reads trace (see TRACE_MODES) and profile_slow_ms, the profiling threshold, 0 for off
+    :param collect: Record spans even when trace is off, for callers that report stage timings themselves
+    :return: The active Trace, or None when nothing is recorded
+    """
+    mode = tool_parameters.get('trace') or 'off'
+    profile_slow_ms = float(tool_parameters.get('profile_slow_ms') or 0)
+    if mode == 'off' and not collect and profile_slow_ms <= 0:
+        yield None
+        return
+    trace = Trace(name, mode)
+    token = _current_trace.set(trace)
+    profiler = _start_profiler() if profile_slow_ms > 0 else None
+    try:
+        yield trace
+    finally:
+        trace.duration = time.perf_counter() - trace._origin
+        if profiler is not None:
+            profiler.disable()
+            if trace.duration * 1000 >= profile_slow_ms:
+                trace.profile = _format_profile(profiler)
+        _current_trace.reset(token)
+        if trace.mode != 'off':
+            trace.stats = {name: provider() for name, provider in _stats_providers.items()}
+        if trace.mode != 'off' or trace.profile:
+            print(json.dumps({'event': 'trace', **trace.to_dict()}, ensure_ascii=False, default=str))
+
+
+def _start_profiler() -> cProfile.Profile | None:
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # Only one profiler may be active per thread
+        print(f"Warning: profiling disabled: {e}")
+        return None
+    return profiler
+
+
+def _format_profile(profiler: cProfile.Profile) -> str:
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+    return output.getvalue()
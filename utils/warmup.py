@@ -0,0 +1,115 @@
+# utils/warmup.py
+import importlib
+import json
+import os
+import threading
+import time
+from typing import Any
+
+# Environment variables configuring the startup warm-up, read by start_warmup()
+# HOLOGRES_WARMUP=1 turns it on
+WARMUP_ENV = 'HOLOGRES_WARMUP'
+# Comma-separated database types whose dialect and driver are imported, default hologres
+WARMUP_DB_TYPES_ENV = 'HOLOGRES_WARMUP_DB_TYPES'
+# JSON array of default connections whose pools are opened:
+# [{"db_type": "hologres", "host": "...", "port": 80, "db_name": "...", "username": "...", "password": "..."}]
+WARMUP_CONNECTIONS_ENV = 'HOLOGRES_WARMUP_CONNECTIONS'
+# Pooled connections opened per default connection, below the engine pool size
+WARMUP_POOL_CONNECTIONS = 2
+
+# Modules create_engine imports on first use of a database type: SQLAlchemy dialect, then DB-API driver
+DIALECT_MODULES = {
+    'hologres': ('sqlalchemy.dialects.postgresql.psycopg2', 'psycopg2'),
+    'postgresql': ('sqlalchemy.dialects.postgresql.psycopg2', 'psycopg2'),
+    'mysql': ('sqlalchemy.dialects.mysql.pymysql', 'pymysql'),
+    'sqlserver': ('sqlalchemy.dialects.mssql.pymssql', 'pymssql'),
+}
+
+
+def preload_dialect(db_type: str) -> None:
+    """Import the SQLAlchemy dialect and driver of db_type, which nothing loads before its first connection"""
+    modules = DIALECT_MODULES.get(db_type.lower())
+    if modules is None:
+        raise ValueError(f"Unsupported database type: {db_type}")
+    for module in modules:
+        importlib.import_module(module)
+
+
+def open_pool(connection: dict[str, Any], connections: int = WARMUP_POOL_CONNECTIONS) -> None:
+    """Create the shared engine of a connection and fill its pool, so the first call skips connect and handshake"""
+    from utils.alchemy_db_client import _get_engine
+
+    engine = _get_engine(
+        connection['db_type'], connection['host'], int(connection['port']),
+        connection['db_name'], connection['username'], connection['password']
+    )
+    opened = []
+    try:
+        for _ in range(connections):
+            opened.append(engine.connect())
+    finally:
+        for conn in opened:
+            conn.close()
+
+
+def warm_up(db_types: list[str] | None = None, connections: list[dict[str, Any]] | None = None) -> dict[str, Any]:
+    """
+    Do the one-off work of first tool calls ahead of time: compile the prompt templates,
+    import dialects and drivers, and open pools of default connections.
+    A failing step is reported and the others still run.
+    :param db_types: Database types to preload, default hologres
+    :param connections: Default connections whose pools are opened
+    :return: Milliseconds per step, plus the errors of failed steps
+    """
+    steps: list[tuple[str, Any]] = [('templates', _compile_templates)]
+    for db_type in db_types or ['hologres']:
+        steps.append((f"dialect:{db_type}", lambda db_type=db_type: preload_dialect(db_type)))
+    for connection in connections or []:
+        name = f"pool:{connection.get('db_type')}://{connection.get('host')}/{connection.get('db_name')}"
+        steps.append((name, lambda connection=connection: open_pool(connection)))
+
+    report: dict[str, Any] = {'steps_ms': {}, 'errors': {}}
+    started = time.perf_counter()
+    for name, step in steps:
+        step_started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            print(f"Warning: warm-up step {name} failed: {e}")
+            report['errors'][name] = str(e)
+        report['steps_ms'][name] = round((time.perf_counter() - step_started) * 1000, 1)
+    report['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return report
+
+
+def _compile_templates() -> None:
+    from utils.prompt_loader import get_prompt_loader
+
+    get_prompt_loader()
+
+
+def start_warmup(environ: dict[str, str] | None = None) -> threading.Thread | None:
+    """
+    Run warm_up() in the background as configured by the HOLOGRES_WARMUP* environment variables,
+    so the plugin starts serving at once and the first calls find the work done
+    :return: The warm-up thread, or None when warm-up is off
+    """
+    environ = os.environ if environ is None else environ
+    if environ.get(WARMUP_ENV, '').lower() not in ('1', 'true', 'yes', 'on'):
+        return None
+    db_types = [db_type.strip() for db_type in environ.get(WARMUP_DB_TYPES_ENV, '').split(',') if db_type.strip()]
+    try:
+        connections = json.loads(environ.get(WARMUP_CONNECTIONS_ENV) or '[]')
+        if not isinstance(connections, list) or not all(isinstance(item, dict) for item in connections):
+            raise ValueError("expected a JSON array of objects")
+    except ValueError as e:
+        print(f"Warning: {WARMUP_CONNECTIONS_ENV} ignored: {e}")
+        connections = []
+
+    def run() -> None:
+        report = warm_up(db_types, connections)
+        print(json.dumps({'event': 'warmup', **report}, ensure_ascii=False))
+
+    thread = threading.Thread(target=run, name='plugin-warmup', daemon=True)
+    thread.start()
+    return thread